@@ -22,32 +22,249 @@ Dans ce format (très peu documenté à ma connaissance) :
     * les cellules contenant des fins de ligne sont mises entre double quotes 
     * les doubles quotes sont échappées en double-double-quotes ("").
 
-Note : mon implémentation parseTSV(tsv) n’est pas parfaite non plus, mais elle
-est meilleure :
-    * elle produira des erreurs si les cellules contiennent des
-      double-double-quotes
-    * elle produira des erreurs si les cellules contiennent les chaînes de
-      caractères arbitraires utilisées ici comme tokens : 
-      "[DOUBLEDOUBLEQUOTETOKEN]" et "[EOLTOKEN]".
-"""
-import re
+Note : parseTSV(tsv) lit la chaîne en une seule passe (automate à états, à la
+manière de la RFC 4180) :
+    * une cellule qui commence par un double quote se termine au double quote
+      suivi d’un séparateur ou d’une fin de ligne ; entre les deux, les
+      séparateurs et les fins de ligne font partie de la cellule et "" vaut " ;
+    * les autres cellules sont prises telles quelles (y compris leurs
+      éventuels double quotes) ;
+    * les lignes vides sont ignorées.
 
-RE_EMPTY_ROW = re.compile(r'^\s*$')
-DBL2_TOKEN = '[DOUBLEDOUBLEQUOTETOKEN]'
-EOL_TOKEN = '[EOLTOKEN]'
+Pour les très gros dumps, TSVParser lit les données morceau par morceau
+(feed) et iterTSV produit les lignes au fur et à mesure, sans garder toute la
+chaîne en mémoire :
+>>> with open('dump.tsv', newline='') as f:  # doctest: +SKIP
+...     for row in iterTSV(f):
+...         print(row)
+"""
+import itertools
+import sys
+# re n’est importé que par les fonctions qui s’en servent : importer TSV doit rester quasi
+# instantané pour les petits scripts qui ne s’en servent qu’une fois
 
 def parseTSV(tsv, sep='\t'):
-    RE_INSIDE_DOUBLE_QUOTES = re.compile('"([^%s]*?)"'%sep)
-    def cb(m):
-        return m.group(1).replace('\n', EOL_TOKEN)
-    tsv = tsv.replace('\r\n', '\n').replace('""', DBL2_TOKEN)
-    tsv = RE_INSIDE_DOUBLE_QUOTES.sub(cb, tsv)
-    tsv = tsv.replace(DBL2_TOKEN, '"')
-    ret = [ row.replace(EOL_TOKEN, '\n').split(sep) for row in tsv.split('\n') if not RE_EMPTY_ROW.match(row) ]
-    return ret
-
-def exportTSV(rows_of_cells, sep='\t'):
-    ret = []
+    return list(iterTSV((tsv,), sep))
+
+def iterTSV(chunks, sep='\t'):
+    '''
+    Générateur : lignes (listes de cellules) des données TSV découpées en
+    morceaux quelconques (ex : un fichier texte ouvert, lu ligne à ligne).
+    '''
+    parser = TSVParser(sep)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+class TSVParser:
+    '''
+    Automate de lecture TSV incrémental : feed(morceau) retourne les lignes
+    terminées dans ce morceau, close() retourne la dernière ligne. Une cellule ou
+    un "" peuvent être coupés n’importe où entre deux morceaux.
+    '''
+    def __init__(self, sep='\t'):
+        import re
+        self.sep = sep
+        # fin de la cellule non quotée en cours
+        self.RE_END_OF_CELL = re.compile('[{}\n]'.format(re.escape(sep)))
+        self.row = []
+        self.cell = []
+        self.row_started = False
+        self.row_has_quotes = False
+        self.at_cell_start = True
+        self.in_quotes = False
+        # un double quote vient de terminer le morceau précédent : fin de
+        # cellule ou premier caractère d’un "" ? On le saura au morceau suivant.
+        self.quote_pending = False
+        self.pending_cr = False
+
+    def feed(self, chunk):
+        if self.pending_cr:
+            chunk = '\r' + chunk
+            self.pending_cr = False
+        if chunk.endswith('\r'):
+            chunk = chunk[:-1]
+            self.pending_cr = True
+        chunk = chunk.replace('\r\n', '\n')
+        rows = []
+        # l’état de l’automate est recopié dans des variables locales le temps du
+        # morceau (bien plus rapides d’accès que les attributs)
+        sep = self.sep
+        re_end_of_cell = self.RE_END_OF_CELL
+        # une ligne qui ne contient que des blancs est ignorée (comme avant)
+        blank_if_no_text = self.sep.isspace()
+        row, cell = self.row, self.cell
+        at_cell_start, in_quotes = self.at_cell_start, self.in_quotes
+        row_has_quotes = self.row_has_quotes
+        i = 0
+        n = len(chunk)
+        if self.quote_pending and n:
+            self.quote_pending = False
+            if chunk[0] == '"':
+                cell.append('"')
+                i = 1
+            else:
+                in_quotes = False
+        row_started = self.row_started
+        while i < n:
+            row_started = True
+            if in_quotes:
+                j = chunk.find('"', i)
+                if j < 0:
+                    cell.append(chunk[i:])
+                    break
+                cell.append(chunk[i:j])
+                if j + 1 == n:
+                    self.quote_pending = True
+                    break
+                if chunk[j + 1] == '"':
+                    cell.append('"')
+                    i = j + 2
+                else:
+                    in_quotes = False
+                    i = j + 1
+                continue
+            if at_cell_start and chunk[i] == '"':
+                at_cell_start = False
+                in_quotes = True
+                row_has_quotes = True
+                i += 1
+                continue
+            # cas le plus fréquent : toutes les lignes complètes d’ici le prochain
+            # double quote se découpent d’un coup, sans passer par l’automate
+            q = chunk.find('"', i)
+            j = chunk.rfind('\n', i, n if q < 0 else q)
+            if j >= 0:
+                lines = chunk[i:j].split('\n')
+                cells = lines[0].split(sep)
+                cell.append(cells[0])
+                row.append(''.join(cell))
+                row.extend(cells[1:])
+                if row_has_quotes or not (blank_if_no_text or len(row) == 1) or ''.join(row).strip():
+                    rows.append(row)
+                # sans double quote, une ligne vide est une ligne sans texte
+                rows.extend([line.split(sep) for line in lines[1:] if line.strip()])
+                row, cell = [], []
+                at_cell_start = True
+                row_started = row_has_quotes = False
+                i = j + 1
+                continue
+            # sinon : pas de double quote d’ici la fin de la ligne (ou d’ici le
+            # dernier séparateur avant un double quote), on découpe toutes ces
+            # cellules d’un coup
+            j = chunk.find('\n', i)
+            q = chunk.find('"', i, n if j < 0 else j)
+            if q >= 0:
+                k = chunk.rfind(sep, i, q)
+                if k >= 0:
+                    cells = chunk[i:k].split(sep)
+                    cell.append(cells[0])
+                    row.append(''.join(cell))
+                    row.extend(cells[1:])
+                    cell = []
+                    at_cell_start = True
+                    i = k + 1
+                    continue
+                # le double quote est dans la cellule en cours : elle se termine au
+                # prochain séparateur ou à la prochaine fin de ligne
+                m = re_end_of_cell.search(chunk, i)
+                j = -1 if m is None else m.start()
+            if j < 0:
+                # la ligne continue dans le morceau suivant
+                cells = chunk[i:].split(sep)
+                cell.append(cells[0])
+                if len(cells) > 1:
+                    row.append(''.join(cell))
+                    row.extend(cells[1:-1])
+                    cell = [cells[-1]]
+                at_cell_start = not cell[-1]
+                break
+            cells = chunk[i:j].split(sep)
+            cell.append(cells[0])
+            row.append(''.join(cell))
+            row.extend(cells[1:])
+            cell = []
+            at_cell_start = True
+            if chunk[j] == '\n':
+                if row_has_quotes or not (blank_if_no_text or len(row) == 1) or ''.join(row).strip():
+                    rows.append(row)
+                row = []
+                row_started = row_has_quotes = False
+            i = j + 1
+        self.row, self.cell, self.row_started = row, cell, row_started
+        self.row_has_quotes = row_has_quotes
+        self.at_cell_start, self.in_quotes = at_cell_start, in_quotes
+        return rows
+
+    def close(self):
+        '''
+        Termine la lecture : retourne la dernière ligne si elle n’est pas vide
+        (une cellule quotée non refermée va jusqu’à la fin des données).
+        '''
+        rows = []
+        if self.pending_cr:
+            self.cell.append('\r')
+            self.pending_cr = False
+            self.row_started = True
+        self.quote_pending = False
+        self.in_quotes = False
+        if self.row_started:
+            row = self.row
+            row.append(''.join(self.cell))
+            if self.row_has_quotes or not (self.sep.isspace() or len(row) == 1) or ''.join(row).strip():
+                rows.append(row)
+        self.row, self.cell = [], []
+        self.row_started = self.row_has_quotes = False
+        self.at_cell_start = True
+        return rows
+
+def exportTSV(rows_of_cells, sep='\t', quote_all=True):
+    return '\n'.join(exportTSVLines(rows_of_cells, sep, quote_all))
+
+def exportTSVLines(rows_of_cells, sep='\t', quote_all=False):
+    '''
+    Générateur : les lignes TSV (sans fin de ligne) des données, une par une.
+
+    Les cellules peuvent être de n’importe quel type : None donne une cellule
+    vide, les autres valeurs non textuelles passent par str(). Sauf avec
+    quote_all, seules les cellules qui le nécessitent sont mises entre double
+    quotes (séparateur, fin de ligne ou double quote dans la cellule, ou ligne
+    qui serait prise pour une ligne vide à la relecture).
+    '''
+    import re
+    needs_quotes = re.compile('[{}\r\n"]'.format(re.escape(sep))).search
     for row in rows_of_cells:
-        ret.append(sep.join(('"%s"'%cell.replace('"', '""') for cell in row)))
-    return '\n'.join(ret)
+        cells = [cell if type(cell) is str else '' if cell is None else str(cell) for cell in row]
+        if quote_all:
+            yield sep.join(['"%s"'%cell.replace('"', '""') for cell in cells])
+            continue
+        line = sep.join(cells)
+        if not needs_quotes(line) and line.strip():
+            # cas le plus fréquent : aucune cellule à quoter
+            yield line
+        elif not line.strip():
+            yield sep.join(['"%s"'%cell for cell in cells])
+        else:
+            yield sep.join([
+                '"%s"'%cell.replace('"', '""') if needs_quotes(cell) else cell
+                for cell in cells
+            ])
+
+def writeTSV(rows_of_cells, stream=None, sep='\t', quote_all=False, rows_per_write=10000):
+    '''
+    Écrit les données TSV dans stream (un fichier texte ouvert, sys.stdout par
+    défaut) au fur et à mesure, par paquets de rows_per_write lignes : la
+    mémoire utilisée ne dépend pas du nombre de lignes (rows_of_cells peut être
+    un générateur). Retourne le nombre de lignes écrites.
+    '''
+    if stream is None:
+        stream = sys.stdout
+    nb_rows = 0
+    lines = exportTSVLines(rows_of_cells, sep, quote_all)
+    while True:
+        chunk = list(itertools.islice(lines, rows_per_write))
+        if not chunk:
+            return nb_rows
+        chunk.append('')
+        stream.write('\n'.join(chunk))
+        nb_rows += len(chunk) - 1
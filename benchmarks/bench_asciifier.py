@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare l’ancienne fonction asciifier (série de str.replace, sans cache) avec
+normalisation.asciifier (str.translate + cache) et normalisation.asciifier_colonne
+(par lot) sur un corpus de noms synthétique, après avoir vérifié qu’elles donnent
+les mêmes résultats.
+
+    python3 benchmarks/bench_asciifier.py [nombre_de_noms] [nombre_de_noms_distincts]
+"""
+import os
+import sys
+import random
+import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+import normalisation
+from bench_nettoyage import chronometrer
+
+NOMS = ['APREMONT', 'BENOîT', 'VAN DER BRŒCK', 'Petrovitch', 'Lætitia', 'D’Artagnan',
+        'Strauß', 'Ĳsselmeer', 'Müller-Lüdenscheidt', 'Çelik', 'O\'Neil', 'Dupont']
+PRENOMS = ['Christophe', 'Jean-Paul', 'Anne Carole', 'Zoé', 'Hélène', 'Ænor',
+           'François', 'Jérôme', 'Gaëlle', 'Noël', 'Anne Marie', 'Loïc']
+
+def asciifier_historique(chaine):
+    # implémentation d’origine (nettoyage-exemple.py, décembre 2018)
+    return (
+        unicodedata.normalize(
+            'NFKD',
+            (
+                chaine.lower()
+                .replace('œ', 'oe').replace('æ', 'ae').replace('ĳ', 'ij').replace('ß', 'ss')
+                .replace('ǉ', 'lj').replace('ǌ', 'nj').replace('ﬆ', 'st').replace('ﬅ', 'ft')
+                .replace('ǳ', 'dz').replace('ﬀ', 'ff').replace('ſ', 's')
+                .replace(' ', ' ').replace('\xa0', ' ').replace('\t', ' ').replace(' ', '')
+                .replace('—', '').replace('–', '').replace('-', '')
+                .replace('’', '').replace("'", '')
+            ))
+        .encode('ascii', 'ignore')
+        .decode('ascii')
+    )
+
+def generer_corpus(nombre, distincts, graine=0):
+    alea = random.Random(graine)
+    def bruiter(nom):
+        # variantes de saisie : casse, espaces doubles
+        return alea.choice((str.upper, str.lower, str.title, str))(nom).replace(' ', alea.choice((' ', '  ')))
+    references = ['{} {}{}'.format(bruiter(alea.choice(NOMS)), bruiter(alea.choice(PRENOMS)), n)
+                  for n in range(distincts)]
+    return [alea.choice(references) for _ in range(nombre)]
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    distincts = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    corpus = generer_corpus(nombre, distincts)
+    print('{} noms, {} distincts'.format(nombre, len(set(corpus))))
+
+    normalisation.asciifier.cache_clear()
+    reference, attendu = chronometrer('asciifier historique', lambda: [asciifier_historique(c) for c in corpus])
+    chronometrer('asciifier sans cache (translate)', lambda: [normalisation._asciifier(c) for c in corpus], reference)
+    _, avec_cache = chronometrer('asciifier avec cache', lambda: [normalisation.asciifier(c) for c in corpus], reference)
+    _, par_lot = chronometrer('asciifier_colonne', lambda: normalisation.asciifier_colonne(corpus), reference)
+    print(normalisation.asciifier.cache_info())
+    assert avec_cache == attendu and par_lot == attendu, 'résultats différents de la fonction historique'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare l’ancienne conversion de bijnum (Bij.n2aaa_iterative, en O(longueur²)
+par nombre) avec les tables de AZ, la formule directe (Bij sans tables) et
+AZ.range, sur toutes les colonnes d’Excel, après avoir vérifié qu’elles donnent
+les mêmes résultats.
+
+    python3 benchmarks/bench_bijnum.py [nombre_de_répétitions]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from bijnum import AZ, Bij, EXCEL_MAX_COLUMNS
+from bench_nettoyage import chronometrer
+
+def repeter(fonction, repetitions):
+    # fonction() répétée pour que la durée soit mesurable ; retourne le dernier résultat
+    def repetee():
+        for _ in range(repetitions):
+            resultat = fonction()
+        return resultat
+    return repetee
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    sans_tables = Bij()
+    colonnes = range(1, EXCEL_MAX_COLUMNS + 1)
+    print('{} x {} colonnes'.format(repetitions, EXCEL_MAX_COLUMNS))
+
+    debut = time.perf_counter()
+    AZ.n2aaa(1)
+    print('{:<40} {:8.3f} s'.format('construction des tables de AZ', time.perf_counter() - debut))
+
+    reference, attendu = chronometrer('n2aaa historique', repeter(
+        lambda: [sans_tables.n2aaa_iterative(n) for n in colonnes], repetitions))
+    _, directe = chronometrer('n2aaa formule directe', repeter(
+        lambda: [sans_tables.n2aaa(n) for n in colonnes], repetitions), reference)
+    _, tables = chronometrer('AZ.n2aaa (tables)', repeter(lambda: [AZ.n2aaa(n) for n in colonnes], repetitions),
+                             reference)
+    _, plage = chronometrer('AZ.range', repeter(lambda: AZ.range(1, EXCEL_MAX_COLUMNS + 1), repetitions), reference)
+    assert directe == attendu and tables == attendu and plage == attendu, 'résultats différents de n2aaa historique'
+
+    reference, _ = chronometrer('aaa2n sans tables', repeter(
+        lambda: [sans_tables.aaa2n(aaa) for aaa in attendu], repetitions))
+    _, nombres = chronometrer('AZ.aaa2n (tables)', repeter(lambda: [AZ.aaa2n(aaa) for aaa in attendu], repetitions),
+                              reference)
+    assert nombres == list(colonnes), 'aaa2n(n2aaa(n)) != n'
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Mesure la construction d’un correspondance.IndexNoms et le temps moyen d’une
+recherche (exacte, nom et prénom inversés, avec une faute de frappe) sur des
+noms de référence synthétiques.
+
+    python3 benchmarks/bench_correspondance.py [nombre_de_references] [nombre_de_recherches]
+"""
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from correspondance import IndexNoms
+
+CONSONNES = 'bcdfghjklmnpqrstvwxzç'
+VOYELLES = 'aeiouyéèêëïô'
+
+def generer_references(nombre, nombre_prenoms=2000, graine=0):
+    '''
+    Noms et prénoms pseudo-aléatoires (syllabes consonne-voyelle), les prénoms étant
+    beaucoup moins variés que les noms, comme dans la réalité.
+    '''
+    alea = random.Random(graine)
+    def mot(min_syllabes, max_syllabes):
+        return ''.join(alea.choice(CONSONNES) + alea.choice(VOYELLES) + (alea.choice('nrsl') if alea.random() < 0.3 else '')
+                       for _ in range(alea.randint(min_syllabes, max_syllabes)))
+    prenoms = [mot(2, 3).capitalize() for _ in range(nombre_prenoms)]
+    references = set()
+    while len(references) < nombre:
+        references.add((mot(2, 4).upper(), alea.choice(prenoms)))
+    return sorted(references)
+
+def faute_de_frappe(alea, chaine):
+    i = alea.randrange(len(chaine))
+    return chaine[:i] + alea.choice('aeiourst') + chaine[i+1:]
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    recherches = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    references = generer_references(nombre)
+    alea = random.Random(1)
+
+    debut = time.perf_counter()
+    index = IndexNoms(references)
+    index.preparer_recherche_approchee()
+    print('{} références indexées en {:.1f} s ({} 4-grammes)'.format(
+        len(index), time.perf_counter() - debut, len(index.index_ngrammes)))
+
+    echantillon = [alea.choice(references) for _ in range(recherches)]
+    variantes = (
+        ('exacte', lambda nom, prenom: '{} {}'.format(nom, prenom)),
+        ('inversée', lambda nom, prenom: '{} {}'.format(prenom, nom.lower())),
+        ('faute de frappe', lambda nom, prenom: '{} {}'.format(faute_de_frappe(alea, nom), prenom)),
+    )
+    for libelle, saisir in variantes:
+        saisies = [(nom_prenom, saisir(*nom_prenom)) for nom_prenom in echantillon]
+        debut = time.perf_counter()
+        resultats = [index.chercher(saisie) for _, saisie in saisies]
+        duree = time.perf_counter() - debut
+        trouves = sum(resultat.nom_prenom == attendu for (attendu, _), resultat in zip(saisies, resultats))
+        print('recherche {:<16} {:8.3f} ms/recherche, {:5.1f} % retrouvés'.format(
+            libelle, 1000 * duree / len(saisies), 100.0 * trouves / len(saisies)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Mesure le temps de démarrage, chaque fois dans un processus python neuf (meilleur
+temps sur plusieurs essais) :
+- l’import de chaque module du dossier (python -X importtime) ;
+- le lancement de nettoyage-exemple.py avec --help, puis sur un lot déjà à jour
+  (rien à nettoyer : le cas courant quand le script est lancé régulièrement),
+  comparé au démarrage de python seul.
+
+Vérifie au passage qu’openpyxl n’est importé ni par ces modules ni au lancement
+du script (elle n’est importée qu’au premier usage) : code de sortie 1 sinon.
+Avec --json, les résultats sont ajoutés (une ligne JSON) à un fichier, pour
+comparer les versions entre elles.
+
+    python3 benchmarks/bench_demarrage.py [--essais N] [--json resultats.jsonl]
+"""
+import os
+import sys
+import argparse
+import json
+import subprocess
+import tempfile
+import time
+
+from bench_nettoyage import RACINE
+
+MODULES = ('bijnum', 'TSV', 'normalisation', 'correspondance', 'jointure', 'lignes', 'mesures', 'cache',
+           'sorties', 'lecture_rapide')
+SCRIPT = os.path.join(RACINE, 'nettoyage-exemple.py')
+# modules qui ne doivent pas être importés au démarrage
+MODULES_LOURDS = ('openpyxl', 'numpy', 'pyarrow')
+
+def modules_lourds(modules):
+    # importtime liste aussi les imports qui échouent (ex : numpy s’il n’est pas installé) :
+    # un module est importé si au moins un de ses sous-modules l’est
+    return [lourd for lourd in MODULES_LOURDS if any(nom.startswith(lourd + '.') for nom in modules)]
+
+def importtime(arguments):
+    '''
+    Lance python -X importtime avec ces arguments.
+    retourne: durée totale (s) et {module: durée cumulée de son import (s)}
+    '''
+    debut = time.perf_counter()
+    processus = subprocess.run([sys.executable, '-X', 'importtime'] + arguments, cwd=RACINE,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    duree = time.perf_counter() - debut
+    modules = {}
+    for ligne in processus.stderr.splitlines():
+        if ligne.startswith('import time:'):
+            _, cumul, nom = ligne.split('|')
+            if cumul.strip().isdigit(): # (sauf la ligne d’en-tête)
+                modules[nom.strip()] = int(cumul) / 1e6
+    return duree, modules
+
+def meilleur(essais, arguments):
+    resultats = [importtime(arguments) for _ in range(essais)]
+    return min(resultats, key=lambda resultat: resultat[0])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--essais', type=int, default=10)
+    parser.add_argument('--json', help='fichier auquel ajouter les résultats (une ligne JSON)')
+    args = parser.parse_args()
+
+    mesures = {}
+    lourds = {}
+    print('{:<40} {:>10}'.format('import', 'ms'))
+    for module in MODULES:
+        _, modules = meilleur(args.essais, ['-c', 'import ' + module])
+        mesures[module] = modules[module]
+        lourds[module] = modules_lourds(modules)
+        print('{:<40} {:10.1f}'.format(module, modules[module] * 1000))
+
+    python_seul, _ = meilleur(args.essais, ['-c', 'pass'])
+    with tempfile.TemporaryDirectory() as dossier:
+        lot = [SCRIPT, os.path.join(RACINE, 'exemple-source.xlsx'), '--sortie', dossier, '--lecture-rapide',
+               '--format', 'csv']
+        # 1er passage : nettoie le classeur ; les suivants n’ont plus rien à faire
+        subprocess.run([sys.executable] + lot, cwd=RACINE, stderr=subprocess.DEVNULL, check=True)
+        lancements = (('nettoyage-exemple.py --help', [SCRIPT, '--help']), ('lot déjà à jour', lot))
+        print('\n{:<40} {:>10}'.format('lancement (python seul : {:.1f} ms)'.format(python_seul * 1000), 'ms'))
+        for libelle, arguments in lancements:
+            duree, modules = meilleur(args.essais, arguments)
+            mesures[libelle] = duree
+            lourds[libelle] = modules_lourds(modules)
+            print('{:<40} {:10.1f}'.format(libelle, duree * 1000))
+    mesures['python seul'] = python_seul
+
+    if args.json:
+        with open(args.json, 'a', encoding='utf-8') as fichier:
+            fichier.write(json.dumps(dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), mesures=mesures,
+                                          lourds=lourds), ensure_ascii=False) + '\n')
+    fautifs = {nom: modules for nom, modules in lourds.items() if modules}
+    for nom, modules in fautifs.items():
+        print('{} importe {} au démarrage'.format(nom, ', '.join(modules)), file=sys.stderr)
+    return 1 if fautifs else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare analyser_et_corriger sans cache avec le mode incrémental (cf. cache.py)
+sur un classeur sale synthétique (cf. bench_nettoyage.py), dont une partie des
+'Nom Prénom' ont une faute de frappe (ce que le cache évite de chercher à
+nouveau, cf. correspondance.py) : 1re exécution (cache
+vide), 2e exécution sur les mêmes données, exécution après l’arrivée et le départ
+d’un utilisateur (un nom de référence ajouté, un autre retiré), puis après
+modification d’une partie des lignes de 'Droits utilisateurs' et de
+'Utilisateurs'. Vérifie à chaque fois que le résultat est le même que sans cache.
+
+    python3 benchmarks/bench_incremental.py [nombre_de_lignes] [--modifiees 0.02]
+        [--fautes 0.2] [--processus N] [--moteur colonnes]
+"""
+import os
+import argparse
+import random
+import tempfile
+
+from bench_nettoyage import charger_nettoyage, chronometrer, classeur_sale, espaces_en_trop, INDICES
+from normalisation import asciifier
+
+def ajouter_fautes(utilisateurs, proportion, alea):
+    '''
+    Copie de 'Utilisateurs' où une proportion des 'Nom Prénom' ont une lettre remplacée.
+    '''
+    def faute(nom_prenom):
+        position = alea.randrange(1, len(nom_prenom) - 1)
+        return nom_prenom[:position] + alea.choice('aeiou') + nom_prenom[position + 1:]
+    return [(user_id, faute(nom_prenom)) if alea.random() < proportion else (user_id, nom_prenom)
+            for user_id, nom_prenom in utilisateurs]
+
+def modifier(utilisateurs, droits_utilisateurs, proportion, alea):
+    '''
+    Copie des données dont une proportion des lignes a changé (indice du droit dans
+    'Droits utilisateurs', espaces dans 'Utilisateurs'), comme d’une extraction à l’autre.
+    '''
+    droits_utilisateurs = [
+        (nom, prenom, num_droit, alea.choice(INDICES)) if alea.random() < proportion else (nom, prenom, num_droit, indice)
+        for nom, prenom, num_droit, indice in droits_utilisateurs]
+    utilisateurs = [
+        (user_id, espaces_en_trop(alea, nom_prenom + ' ')) if alea.random() < proportion else (user_id, nom_prenom)
+        for user_id, nom_prenom in utilisateurs]
+    return utilisateurs, droits_utilisateurs
+
+def arrivee_et_depart(utilisateurs, droits_utilisateurs):
+    '''
+    Copie des données où un utilisateur est arrivé (nouvelle ligne dans 'Utilisateurs' et
+    nouveau nom dans 'Droits utilisateurs') et où le 1er est parti (ses lignes ont disparu).
+    '''
+    parti = tuple(valeur.strip() for valeur in droits_utilisateurs[0][:2])
+    droits_utilisateurs = [ligne for ligne in droits_utilisateurs if (ligne[0].strip(), ligne[1].strip()) != parti]
+    droits_utilisateurs += [('NOUVEAU', 'Arrivant', 1, 1), ('NOUVEAU', 'Arrivant', 2, '0,5')]
+    utilisateurs = list(utilisateurs)[1:] + [('U9999999', 'Nouveau Arrivant')]
+    return utilisateurs, droits_utilisateurs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('nombre_lignes', nargs='?', type=int, default=100000)
+    parser.add_argument('--modifiees', type=float, default=0.02, help='proportion de lignes modifiées')
+    parser.add_argument('--fautes', type=float, default=0.2,
+                        help='proportion de \'Nom Prénom\' avec une faute de frappe')
+    parser.add_argument('--processus', type=int, default=1)
+    parser.add_argument('--moteur', default='cellules')
+    args = parser.parse_args()
+
+    nettoyage = charger_nettoyage()
+    import openpyxl
+    utilisateurs, droits, droits_utilisateurs = nettoyage.recuperer_donnees(
+        openpyxl.load_workbook(classeur_sale(args.nombre_lignes)))
+    utilisateurs = ajouter_fautes(utilisateurs, args.fautes, random.Random(0))
+    arrivee = arrivee_et_depart(utilisateurs, droits_utilisateurs)
+    modifiees = modifier(utilisateurs, droits_utilisateurs, args.modifiees, random.Random(1))
+    options = dict(processus=args.processus, moteur=args.moteur)
+    print('{} lignes, {:.0%} modifiées, {:.0%} de fautes, {}'.format(args.nombre_lignes, args.modifiees, args.fautes,
+                                                                 options))
+
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'cache.sqlite')
+        def avec_cache(utilisateurs, droits_utilisateurs):
+            with nettoyage.CacheLignes(chemin) as cache:
+                return nettoyage.analyser_et_corriger(utilisateurs, droits, droits_utilisateurs, cache=cache, **options)
+
+        # 1re exécution non chronométrée : elle est plus lente que les suivantes (allocations
+        # de mémoire, etc.), ce qui fausserait la comparaison
+        nettoyage.analyser_et_corriger(utilisateurs, droits, droits_utilisateurs, **options)
+        # chaque exécution part, comme en ligne de commande, d’un cache d’asciifier vide
+        a_froid = dict(avant=asciifier.cache_clear)
+        reference, attendu = chronometrer('sans cache', lambda: nettoyage.analyser_et_corriger(
+            utilisateurs, droits, droits_utilisateurs, **options), **a_froid)
+        _, resultat = chronometrer('cache vide', lambda: avec_cache(utilisateurs, droits_utilisateurs), reference,
+                                   **a_froid)
+        assert resultat == attendu, 'résultats différents avec le cache vide'
+        _, resultat = chronometrer('mêmes données', lambda: avec_cache(utilisateurs, droits_utilisateurs), reference,
+                                   **a_froid)
+        assert resultat == attendu, 'résultats différents avec le cache'
+
+        reference, attendu = chronometrer('arrivée et départ, sans cache', lambda: nettoyage.analyser_et_corriger(
+            arrivee[0], droits, arrivee[1], **options), **a_froid)
+        _, resultat = chronometrer('arrivée et départ, avec cache', lambda: avec_cache(*arrivee), reference, **a_froid)
+        assert resultat == attendu, 'résultats différents avec le cache, après une arrivée et un départ'
+
+        reference, attendu = chronometrer('données modifiées, sans cache', lambda: nettoyage.analyser_et_corriger(
+            modifiees[0], droits, modifiees[1], **options), **a_froid)
+        _, resultat = chronometrer('données modifiées, avec cache', lambda: avec_cache(*modifiees), reference,
+                                   **a_froid)
+        assert resultat == attendu, 'résultats différents avec le cache, après modification'
+        print('{:<40} {:8.1f} Mo'.format('taille du cache', os.path.getsize(chemin) / 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Mesure jointure.JointureDroits (construction des index, jointure de toutes les lignes
+de 'Droits utilisateurs', rapport des doublons, orphelins et codes inconnus) sur des
+données synthétiques de plusieurs tailles, avec quelques doublons, orphelins et codes
+inconnus, pour vérifier que la durée par ligne ne croît pas avec le nombre de lignes.
+
+    python3 benchmarks/bench_jointure.py [nombre_de_lignes ...]
+"""
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from jointure import JointureDroits
+
+# nombre moyen de droits par utilisateur dans 'Droits utilisateurs' (cf. bench_nettoyage.py)
+DROITS_PAR_UTILISATEUR = 5
+NOMBRE_DROITS = 500
+
+def generer(nombre_lignes, graine=0):
+    alea = random.Random(graine)
+    nb_utilisateurs = max(1, nombre_lignes // DROITS_PAR_UTILISATEUR)
+    utilisateurs = [('U{:07d}'.format(n), 'NOM{}'.format(n), 'Prénom{}'.format(n)) for n in range(nb_utilisateurs)]
+    # ~1 ‰ de doublons de nom et prénom
+    utilisateurs += [('U{:07d}'.format(nb_utilisateurs + n), nom, prenom)
+                     for n, (_, nom, prenom) in enumerate(alea.sample(utilisateurs, nb_utilisateurs // 1000))]
+    droits = [('D{:03d}'.format(n), 'Droit {}'.format(n)) for n in range(NOMBRE_DROITS)]
+    # ~1 ‰ d’orphelins et de codes inconnus
+    droits_utilisateurs = []
+    for _ in range(nombre_lignes):
+        n = alea.randrange(nb_utilisateurs + nb_utilisateurs // 1000 + 1)
+        code = 'D{:03d}'.format(alea.randrange(NOMBRE_DROITS + NOMBRE_DROITS // 1000 + 1))
+        droits_utilisateurs.append(('NOM{}'.format(n), 'Prénom{}'.format(n), code, alea.random()))
+    return utilisateurs, droits, droits_utilisateurs
+
+def main():
+    tailles = [int(taille) for taille in sys.argv[1:]] or [100000, 1000000, 3000000]
+    print('{:>10} {:>10} {:>12} {:>10} {:>10} {:>10}'.format(
+        'lignes', 'durée (s)', 'µs par ligne', 'doublons', 'orphelins', 'inconnus'))
+    for nombre_lignes in tailles:
+        utilisateurs, droits, droits_utilisateurs = generer(nombre_lignes)
+        debut = time.perf_counter()
+        jointure = JointureDroits(utilisateurs, droits)
+        jointes = sum(1 for _ in jointure.joindre(droits_utilisateurs))
+        doublons = jointure.doublons()
+        orphelins = jointure.orphelins({(nom, prenom) for nom, prenom, _, _ in droits_utilisateurs})
+        inconnus = jointure.codes_inconnus({code for _, _, code, _ in droits_utilisateurs})
+        duree = time.perf_counter() - debut
+        assert jointes == nombre_lignes
+        print('{:>10} {:10.2f} {:12.2f} {:>10} {:>10} {:>10}'.format(
+            nombre_lignes, duree, duree / nombre_lignes * 1e6, len(doublons), len(orphelins), len(inconnus)))
+
+if __name__ == '__main__':
+    main()
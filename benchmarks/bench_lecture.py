@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare la lecture des 3 feuilles d’un classeur sale synthétique (cf.
+bench_nettoyage.py) par recuperer_donnees : openpyxl (classeur chargé en
+mémoire, puis en lecture seule) et lecture_rapide.ClasseurXml, après avoir
+vérifié que les lignes lues sont les mêmes, sur ce classeur et sur
+exemple-source.xlsx.
+
+    python3 benchmarks/bench_lecture.py [nombre_de_lignes]
+"""
+import os
+import sys
+import time
+
+from bench_nettoyage import RACINE, charger_nettoyage, classeur_sale
+from lecture_rapide import ClasseurXml
+
+def lire(nettoyage, ouvrir, chemin):
+    debut = time.perf_counter()
+    classeur = ouvrir(chemin)
+    donnees = nettoyage.recuperer_donnees(classeur)
+    duree = time.perf_counter() - debut
+    classeur.close()
+    return duree, donnees, getattr(classeur, 'replis', None)
+
+def main():
+    nombre_lignes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    nettoyage = charger_nettoyage()
+    import openpyxl
+    lecteurs = (
+        ('openpyxl', openpyxl.load_workbook),
+        ('openpyxl, lecture seule', lambda chemin: openpyxl.load_workbook(chemin, read_only=True)),
+        ('lecture rapide', ClasseurXml),
+    )
+    for chemin in (os.path.join(RACINE, 'exemple-source.xlsx'), classeur_sale(nombre_lignes)):
+        print(os.path.basename(chemin))
+        reference = attendu = None
+        for libelle, ouvrir in lecteurs:
+            duree, donnees, replis = lire(nettoyage, ouvrir, chemin)
+            if attendu is None:
+                reference, attendu = duree, donnees
+            assert donnees == attendu, 'lignes lues différentes ({})'.format(libelle)
+            print('  {:<30} {:8.2f} s  (x{:.1f}){}'.format(
+                libelle, duree, reference / duree, '  relu avec openpyxl : {}'.format(replis) if replis else ''))
+
+if __name__ == '__main__':
+    main()
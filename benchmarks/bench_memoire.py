@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare la mémoire occupée par les lignes de 'Droits utilisateurs' (lues, puis
+corrigées) rangées comme avant dans des listes de tuples, et dans des objets
+lignes.Lignes, sur un classeur sale synthétique (cf. bench_nettoyage.py), après
+avoir vérifié qu’elles contiennent les mêmes valeurs.
+
+    python3 benchmarks/bench_memoire.py [nombre_de_lignes]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from bench_nettoyage import charger_nettoyage, classeur_sale
+
+def mesurer(libelle, fonction, reference=None):
+    '''
+    Mémoire encore allouée par le résultat de fonction une fois celle-ci terminée
+    (tracemalloc), et durée (mesurée à part : tracemalloc ralentit les allocations).
+    '''
+    gc.collect()
+    debut = time.perf_counter()
+    fonction()
+    duree = time.perf_counter() - debut
+    gc.collect()
+    tracemalloc.start()
+    try:
+        avant = tracemalloc.get_traced_memory()[0]
+        resultat = fonction()
+        gc.collect()
+        taille = tracemalloc.get_traced_memory()[0] - avant
+    finally:
+        tracemalloc.stop()
+    print('{:<45} {:8.1f} Mo {:8.2f} s{}'.format(libelle, taille / 1e6, duree,
+                                                 '' if reference is None else '  (x{:.1f})'.format(reference / taille)))
+    return taille, resultat
+
+def main():
+    nombre_lignes = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    nettoyage = charger_nettoyage()
+    import openpyxl
+    classeur = openpyxl.load_workbook(classeur_sale(nombre_lignes), read_only=True)
+    feuille = classeur['Droits utilisateurs']
+    def lire():
+        return nettoyage.lire_droits_utilisateurs(feuille.iter_rows(min_row = 2, values_only = True))
+    print('{} lignes de \'Droits utilisateurs\''.format(nombre_lignes))
+
+    reference, attendu = mesurer('lues, liste de tuples (avant)', lambda: list(lire()))
+    _, droits_utilisateurs = mesurer('lues, Lignes', lambda: nettoyage.Lignes(4, lire()), reference)
+    assert droits_utilisateurs == attendu, 'valeurs lues différentes'
+    del attendu
+
+    utilisateurs, droits, _ = nettoyage.recuperer_donnees_en_flux(classeur)
+    def corriger(en_flux):
+        return nettoyage.analyser_et_corriger(utilisateurs, droits, droits_utilisateurs, en_flux=en_flux)[2]
+    reference, attendu = mesurer('corrigées, liste de tuples (avant)', lambda: list(corriger(en_flux=True)))
+    _, resultat = mesurer('corrigées, Lignes', lambda: corriger(en_flux=False), reference)
+    assert resultat == attendu, 'valeurs corrigées différentes'
+    classeur.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Mesure chaque étape de nettoyage-exemple.py (chargement, recuperer_donnees,
+analyser_et_corriger, generer_classeur_propre, enregistrement) sur des classeurs
+« sales » synthétiques de la taille voulue : durée, débit (lignes de 'Droits
+utilisateurs' par seconde) et pic de mémoire du processus.
+
+Les classeurs générés ont le même bruit que exemple-source.xlsx : casse, accents
+et ligatures (Œ/OE) différents, tirets, espaces en trop, nom et prénom inversés
+dans 'Utilisateurs', nombres et pourcentages saisis sous forme de texte ('0 ,3',
+'25%', ' 12') dans 'Droits utilisateurs'. Ils sont gardés dans le dossier
+temporaire pour les mesures suivantes.
+
+Chaque taille est mesurée dans un processus neuf, pour que le pic de mémoire de
+l’une ne fausse pas celui de la suivante. Avec --json, les résultats sont ajoutés
+(une ligne JSON par taille) à un fichier, pour comparer les versions entre elles.
+
+    python3 benchmarks/bench_nettoyage.py [nombre_de_lignes ...] [--lecture-en-flux]
+        [--lecture-rapide] [--ecriture-en-flux] [--processus N] [--feuilles-en-parallele N]
+        [--moteur colonnes] [--calculs valeurs]
+        [--json resultats.jsonl]
+"""
+import os
+import sys
+import argparse
+import importlib.util
+import json
+import multiprocessing
+import random
+import resource
+import tempfile
+import time
+
+RACINE = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, RACINE)
+from normalisation import asciifier
+
+# nombre moyen de droits par utilisateur dans 'Droits utilisateurs'
+DROITS_PAR_UTILISATEUR = 5
+NOMBRE_DE_DROITS = 200
+CONSONNES = 'bcdfghjklmnpqrstvwxzç'
+VOYELLES = 'aeiouyéèêëïôœæ'
+PARTICULES = ('VAN DER ', 'DE ', 'D’', 'LE ', '')
+INDICES = ('0 ,3', 0.6, '0.5', 1, '25%', '40 %', '1.00', 0.87, '0,125', 2)
+
+def charger_nettoyage():
+    '''
+    nettoyage-exemple.py n’est pas importable par son nom (tiret) : on le charge par son chemin.
+    '''
+    spec = importlib.util.spec_from_file_location('nettoyage_exemple', os.path.join(RACINE, 'nettoyage-exemple.py'))
+    module = importlib.util.module_from_spec(spec)
+    # enregistré pour que les processus de repartir retrouvent ses fonctions
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def chronometrer(libelle, fonction, reference=None, avant=None):
+    '''
+    Exécute fonction() et affiche sa durée (et le rapport à la durée de référence, si donnée).
+    avant: fonction appelée juste avant, hors de la mesure (ex : vider un cache)
+    retourne: la durée et le résultat de fonction()
+    '''
+    if avant is not None:
+        avant()
+    debut = time.perf_counter()
+    resultat = fonction()
+    duree = time.perf_counter() - debut
+    print('{:<40} {:8.3f} s{}'.format(libelle, duree, '' if reference is None else '  (x{:.1f})'.format(reference / duree)))
+    return duree, resultat
+
+def generer_utilisateurs(nombre, alea):
+    '''
+    Couples (nom, prénom) distincts, y compris une fois asciifiés (sinon le nettoyage ne
+    peut pas les distinguer, ce qui n’est pas ce qu’on veut mesurer ici).
+    '''
+    def mot(min_syllabes, max_syllabes):
+        return ''.join(alea.choice(CONSONNES) + alea.choice(VOYELLES) + (alea.choice('nrsl') if alea.random() < 0.3 else '')
+                       for _ in range(alea.randint(min_syllabes, max_syllabes)))
+    prenoms = [mot(2, 3).capitalize() for _ in range(2000)]
+    prenoms += ['{}-{}'.format(alea.choice(prenoms), alea.choice(prenoms)) for _ in range(500)]
+    utilisateurs = {}
+    while len(utilisateurs) < nombre:
+        nom, prenom = alea.choice(PARTICULES) + mot(2, 4).upper(), alea.choice(prenoms)
+        utilisateurs.setdefault(asciifier(nom + prenom), (nom, prenom))
+    return list(utilisateurs.values())
+
+def saisie_libre(alea, nom, prenom):
+    '''
+    « Nom Prénom » tel qu’il pourrait être saisi dans 'Utilisateurs'.
+    '''
+    if alea.random() < 0.2:
+        nom = nom.replace('Œ', 'OE').replace('Æ', 'AE')
+    if alea.random() < 0.2:
+        prenom = prenom.replace('-', ' ')
+    nom_prenom = '{} {}'.format(prenom, nom) if alea.random() < 0.15 else '{} {}'.format(nom, prenom)
+    nom_prenom = alea.choice((str, str, str.lower, str.upper, str.title))(nom_prenom)
+    if alea.random() < 0.2:
+        nom_prenom = asciifier_partiel(nom_prenom)
+    return espaces_en_trop(alea, nom_prenom)
+
+def asciifier_partiel(chaine):
+    # accents oubliés à la saisie
+    return chaine.translate(str.maketrans('éèêëïôçÉÈÊËÏÔÇ', 'eeeeiocEEEEIOC'))
+
+def espaces_en_trop(alea, chaine):
+    if alea.random() < 0.3:
+        chaine = chaine.replace(' ', '  ', 1)
+    if alea.random() < 0.1:
+        chaine = ' ' + chaine
+    if alea.random() < 0.1:
+        chaine = chaine + ' '
+    return chaine
+
+def generer_classeur_sale(chemin, nombre_lignes, graine=0):
+    '''
+    Écrit un classeur sale de nombre_lignes lignes de 'Droits utilisateurs' (et environ
+    nombre_lignes / DROITS_PAR_UTILISATEUR utilisateurs) avec la même structure que
+    exemple-source.xlsx.
+    '''
+    import openpyxl
+    alea = random.Random(graine)
+    utilisateurs = generer_utilisateurs(max(1, nombre_lignes // DROITS_PAR_UTILISATEUR), alea)
+    wb = openpyxl.Workbook(write_only=True)
+
+    feuille = wb.create_sheet('Utilisateurs')
+    feuille.append(('User ID', 'Nom Prénom'))
+    for num, (nom, prenom) in enumerate(utilisateurs, 1):
+        feuille.append(('U{:07d}'.format(num), saisie_libre(alea, nom, prenom)))
+
+    feuille = wb.create_sheet('Droits')
+    feuille.append(('Code', 'Droit'))
+    for num in range(1, NOMBRE_DE_DROITS + 1):
+        feuille.append(('D{:03d}'.format(num), 'Droit numéro {}'.format(num)))
+
+    feuille = wb.create_sheet('Droits utilisateurs')
+    feuille.append(('Nom utilisateur', 'Prénom utilisateur', 'N° de droit', 'Indice utilisation droit'))
+    for num_ligne in range(nombre_lignes):
+        # chaque utilisateur a au moins un droit (sinon son nom ne serait pas une référence)
+        nom, prenom = utilisateurs[num_ligne] if num_ligne < len(utilisateurs) else alea.choice(utilisateurs)
+        num_droit = alea.randint(1, NOMBRE_DE_DROITS)
+        feuille.append((espaces_en_trop(alea, nom), espaces_en_trop(alea, prenom),
+                        num_droit if alea.random() < 0.7 else ' {} '.format(num_droit), alea.choice(INDICES)))
+    wb.save(chemin)
+
+def classeur_sale(nombre_lignes, graine=0):
+    chemin = os.path.join(tempfile.gettempdir(), 'nettoyage-synthetique-{}-{}.xlsx'.format(nombre_lignes, graine))
+    if not os.path.exists(chemin):
+        debut = time.perf_counter()
+        # dans un processus à part : la mémoire prise par la génération ne doit pas se
+        # retrouver dans le processus forké pour la mesure
+        processus = multiprocessing.get_context('fork').Process(
+            target=generer_classeur_sale, args=(chemin + '.tmp', nombre_lignes, graine))
+        processus.start()
+        processus.join()
+        if processus.exitcode:
+            raise RuntimeError('échec de la génération de {}'.format(chemin))
+        os.replace(chemin + '.tmp', chemin)
+        print('classeur de {} lignes généré en {:.1f} s : {}'.format(nombre_lignes, time.perf_counter() - debut, chemin))
+    return chemin
+
+def pic_memoire_mo():
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def mesurer(chemin, nombre_lignes, options):
+    '''
+    Exécute les étapes de demo_nettoyage sur le classeur chemin et retourne les mesures.
+    En lecture ou en écriture en flux, les lignes de 'Droits utilisateurs' ne sont lues et
+    corrigées qu’au moment de l’écriture : ce travail est alors compté dans l’étape de génération.
+    '''
+    nettoyage = charger_nettoyage()
+    import openpyxl
+    etapes = []
+    def etape(nom, fonction, *args, **kwargs):
+        debut = time.perf_counter()
+        resultat = fonction(*args, **kwargs)
+        duree = time.perf_counter() - debut
+        etapes.append(dict(etape=nom, duree=duree, lignes_par_seconde=nombre_lignes / duree if duree else None,
+                           pic_memoire_mo=pic_memoire_mo()))
+        return resultat
+
+    lecture_en_flux = options['lecture_en_flux']
+    en_parallele = options['feuilles_en_parallele']
+    classeur = None
+    if en_parallele > 1:
+        donnees_sales = etape('recuperer_donnees', nettoyage.recuperer_donnees_en_parallele, chemin,
+                              options['lecture_rapide'], en_parallele)
+    else:
+        if options['lecture_rapide']:
+            classeur = etape('chargement', nettoyage.ouvrir_classeur, chemin)
+        else:
+            classeur = etape('chargement', openpyxl.load_workbook, chemin, read_only=lecture_en_flux)
+        lire = nettoyage.recuperer_donnees_en_flux if lecture_en_flux else nettoyage.recuperer_donnees
+        donnees_sales = etape('recuperer_donnees', lire, classeur)
+    donnees_propres = etape('analyser_et_corriger', nettoyage.analyser_et_corriger, *donnees_sales,
+                            en_flux=lecture_en_flux, processus=options['processus'], moteur=options['moteur'])
+    if en_parallele > 1:
+        classeur_propre = etape('generer_classeur_propre', nettoyage.generer_classeur_propre_en_parallele,
+                                *donnees_propres, calculs=options['calculs'], processus=en_parallele)
+    else:
+        generer = (nettoyage.generer_classeur_propre_en_flux if options['ecriture_en_flux']
+                   else nettoyage.generer_classeur_propre)
+        classeur_propre = etape('generer_classeur_propre', generer, *donnees_propres, calculs=options['calculs'])
+    with tempfile.TemporaryDirectory() as dossier:
+        etape('enregistrement', classeur_propre.save, os.path.join(dossier, 'propre.xlsx'))
+    if classeur is not None and (lecture_en_flux or options['lecture_rapide']):
+        classeur.close()
+    return etapes
+
+def mesurer_dans_un_processus_neuf(chemin, nombre_lignes, options):
+    # pas de Pool : ses processus ne peuvent pas en créer d’autres (cf. --processus) ;
+    # fork : les processus de repartir héritent du module chargé par charger_nettoyage
+    contexte = multiprocessing.get_context('fork')
+    file_resultats = contexte.Queue()
+    processus = contexte.Process(target=_mesurer_et_transmettre, args=(file_resultats, chemin, nombre_lignes, options))
+    processus.start()
+    etapes = file_resultats.get()
+    processus.join()
+    if etapes is None:
+        raise RuntimeError('échec de la mesure sur {} (cf. erreur ci-dessus)'.format(chemin))
+    return etapes
+
+def _mesurer_et_transmettre(file_resultats, chemin, nombre_lignes, options):
+    try:
+        file_resultats.put(mesurer(chemin, nombre_lignes, options))
+    except BaseException:
+        file_resultats.put(None)
+        raise
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('nombres_lignes', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--lecture-en-flux', action='store_true')
+    parser.add_argument('--lecture-rapide', action='store_true')
+    parser.add_argument('--ecriture-en-flux', action='store_true')
+    parser.add_argument('--processus', type=int, default=1)
+    parser.add_argument('--feuilles-en-parallele', type=int, default=1)
+    parser.add_argument('--moteur', default='cellules')
+    parser.add_argument('--calculs', default='formules')
+    parser.add_argument('--json', help='fichier auquel ajouter les résultats (une ligne JSON par taille)')
+    args = parser.parse_args()
+    options = dict(lecture_en_flux=args.lecture_en_flux, lecture_rapide=args.lecture_rapide,
+                   ecriture_en_flux=args.ecriture_en_flux, processus=args.processus, moteur=args.moteur, calculs=args.calculs,
+                   feuilles_en_parallele=args.feuilles_en_parallele)
+    print(options)
+
+    for nombre_lignes in args.nombres_lignes:
+        chemin = classeur_sale(nombre_lignes)
+        etapes = mesurer_dans_un_processus_neuf(chemin, nombre_lignes, options)
+        print('{} lignes de \'Droits utilisateurs\''.format(nombre_lignes))
+        for mesure in etapes:
+            print('  {etape:<25} {duree:8.2f} s {lignes_par_seconde:12.0f} lignes/s   pic {pic_memoire_mo:8.1f} Mo'.format(**mesure))
+        total = sum(mesure['duree'] for mesure in etapes)
+        print('  {:<25} {:8.2f} s {:12.0f} lignes/s'.format('total', total, nombre_lignes / total))
+        if args.json:
+            with open(args.json, 'a', encoding='utf-8') as fichier:
+                fichier.write(json.dumps(dict(date=time.strftime('%Y-%m-%dT%H:%M:%S'), lignes=nombre_lignes,
+                                              options=options, etapes=etapes, total=total)) + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare la normalisation cellule par cellule (supprimer_espaces_en_trop,
+normaliser_nombre) et colonne par colonne (supprimer_espaces_colonne,
+normaliser_nombres_colonne) sur des colonnes synthétiques, après avoir vérifié
+qu’elles donnent les mêmes résultats.
+
+    python3 benchmarks/bench_normalisation.py [nombre_de_lignes]
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+import normalisation
+from bench_nettoyage import chronometrer
+
+def generer_colonnes(nombre, graine=0):
+    alea = random.Random(graine)
+    noms = ['{}{}'.format(alea.choice((' ', '', '  ')), nom).replace(' ', alea.choice((' ', '  ')))
+            for nom in ('APREMONT', 'VAN DER BRŒCK', 'Petrovitch', 'BENOîT') for _ in range(50)]
+    indices = ['0 ,3', '25%', '0.5', '1.00', '40 %', 0.6, 1, '0,123', 2, 0.87]
+    return ([alea.choice(noms) for _ in range(nombre)],
+            [alea.choice(indices) for _ in range(nombre)])
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    noms, indices = generer_colonnes(nombre)
+    print('{} lignes, numpy.strings {}'.format(nombre, 'disponible' if normalisation.numpy_et_strings()[1] else 'absent'))
+
+    _, par_cellule = chronometrer('supprimer_espaces_en_trop (par cellule)',
+                                  lambda: [normalisation.supprimer_espaces_en_trop(nom) for nom in noms])
+    _, par_colonne = chronometrer('supprimer_espaces_colonne', lambda: normalisation.supprimer_espaces_colonne(noms))
+    assert par_cellule == par_colonne
+    _, par_cellule = chronometrer('normaliser_nombre (par cellule)',
+                                  lambda: [normalisation.normaliser_nombre(indice) for indice in indices])
+    _, par_colonne = chronometrer('normaliser_nombres_colonne', lambda: normalisation.normaliser_nombres_colonne(indices))
+    # comparaison stricte, y compris du type (1 et 1.0 ne s’écrivent pas pareil dans le classeur)
+    assert [(type(x), x) for x in par_cellule] == [(type(x), x) for x in par_colonne]
+
+if __name__ == '__main__':
+    main()
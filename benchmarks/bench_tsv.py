@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Compare l’ancien TSV.parseTSV (remplacements de la chaîne entière par des
+tokens) avec l’automate actuel (TSV.parseTSV, et TSV.iterTSV lu par morceaux)
+sur un dump de presse-papier synthétique, après avoir vérifié qu’ils donnent les
+mêmes résultats.
+
+Compare aussi l’ancien TSV.exportTSV (toute la chaîne construite en mémoire) avec
+TSV.writeTSV (écriture au fur et à mesure dans un fichier) : durée et pic de
+mémoire.
+
+    python3 benchmarks/bench_tsv.py [nombre_de_lignes]
+"""
+import gc
+import io
+import os
+import re
+import sys
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+import TSV
+import bench_nettoyage
+
+RE_EMPTY_ROW = re.compile(r'^\s*$')
+DBL2_TOKEN = '[DOUBLEDOUBLEQUOTETOKEN]'
+EOL_TOKEN = '[EOLTOKEN]'
+
+def parseTSV_historique(tsv, sep='\t'):
+    # implémentation d’origine (TSV.py, 2018)
+    RE_INSIDE_DOUBLE_QUOTES = re.compile('"([^%s]*?)"'%sep)
+    def cb(m):
+        return m.group(1).replace('\n', EOL_TOKEN)
+    tsv = tsv.replace('\r\n', '\n').replace('""', DBL2_TOKEN)
+    tsv = RE_INSIDE_DOUBLE_QUOTES.sub(cb, tsv)
+    tsv = tsv.replace(DBL2_TOKEN, '"')
+    return [ row.replace(EOL_TOKEN, '\n').split(sep) for row in tsv.split('\n') if not RE_EMPTY_ROW.match(row) ]
+
+def exportTSV_historique(rows_of_cells, sep='\t'):
+    # implémentation d’origine (TSV.py, 2018)
+    ret = []
+    for row in rows_of_cells:
+        ret.append(sep.join(('"%s"'%cell.replace('"', '""') for cell in row)))
+    return '\n'.join(ret)
+
+def generer_dump(nombre, proportion_quotees, graine=0):
+    # comme un copier depuis Excel : seules les cellules avec une fin de ligne ou un
+    # double quote sont quotées (cas que l’ancienne implémentation sait lire)
+    alea = random.Random(graine)
+    simples = ['APREMONT', 'Christophe', '0,3', '25%', 'D012', 'Jean-Paul', '']
+    quotees = ['"ligne 1\nligne 2"', '"VAN DER BRŒCK\nAnne Carole"', '"12"" (pouces)"']
+    def cellule():
+        return alea.choice(quotees if alea.random() < proportion_quotees else simples)
+    return '\r\n'.join('\t'.join(cellule() for _ in range(6)) for _ in range(nombre))
+
+def par_morceaux_de(texte, taille):
+    # comme la lecture d’un gros fichier par blocs
+    flux = io.StringIO(texte)
+    return iter(lambda: flux.read(taille), '')
+
+def chronometrer(libelle, fonction, reference=None):
+    # comme timeit : ramasse-miettes désactivé pendant la mesure (sinon, le résultat de
+    # la mesure précédente, gardé pour comparaison, ralentit la suivante)
+    gc.collect()
+    gc.disable()
+    try:
+        return bench_nettoyage.chronometrer(libelle, fonction, reference)
+    finally:
+        gc.enable()
+
+def mesurer_export(libelle, fonction, reference=None):
+    # durée mesurée sans tracemalloc (qui ralentit beaucoup les allocations), puis pic
+    # de mémoire mesuré sur une 2e exécution
+    duree, _ = chronometrer(libelle, fonction, reference)
+    tracemalloc.start()
+    try:
+        fonction()
+        pic = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    print('{:<40} {:8.1f} Mo (pic de mémoire)'.format('', pic / 1e6))
+    return duree
+
+def main():
+    nombre = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for proportion_quotees in (0.01, 0.25):
+        dump = generer_dump(nombre, proportion_quotees)
+        print('{} lignes, {:.1f} Mo, {:.0%} de cellules quotées'.format(nombre, len(dump) / 1e6, proportion_quotees))
+
+        reference, attendu = chronometrer('parseTSV historique', lambda: parseTSV_historique(dump))
+        _, resultat = chronometrer('parseTSV (automate)', lambda: TSV.parseTSV(dump), reference)
+        assert resultat == attendu, 'résultats différents de parseTSV historique'
+        del resultat
+        _, resultat = chronometrer('iterTSV (morceaux de 64 Ko)',
+                                   lambda: list(TSV.iterTSV(par_morceaux_de(dump, 65536))), reference)
+        assert resultat == attendu, 'résultats différents de parseTSV historique'
+        del attendu, resultat
+
+    # export : les lignes sont produites par un générateur, comme à la sortie d’un
+    # traitement ; l’ancien exportTSV a besoin de la chaîne entière en mémoire
+    def lignes():
+        return (('APREMONT', 'Christophe', 'D{:03d}'.format(n % 1000), '0.25',
+                 'ligne 1\nligne 2' if n % 100 == 0 else 'Anne Carole')
+                for n in range(nombre))
+    print('export de {} lignes'.format(nombre))
+    with open(os.devnull, 'w') as fichier:
+        reference = mesurer_export('exportTSV historique', lambda: fichier.write(exportTSV_historique(lignes())))
+        mesurer_export('writeTSV', lambda: TSV.writeTSV(lignes(), fichier), reference)
+
+if __name__ == '__main__':
+    main()
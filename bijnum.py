@@ -17,9 +17,19 @@ Utilisation ultra-basique :
 28
 >>> AZ.n2aaa(28)
 'AB'
+>>> AZ.range(26, 30)
+['Z', 'AA', 'AB', 'AC']
 
+Pour AZ, les conversions des colonnes d’Excel (1 à 16384) passent par des
+tables construites au premier appel ; au-delà (et pour les autres
+numérations), elles sont calculées directement, en O(nombre de lettres).
 '''
 
+import itertools
+
+# nombre de colonnes d’une feuille Excel (colonne 'XFD')
+EXCEL_MAX_COLUMNS = 16384
+
 class Bij:
     '''
     Class that helps you convert numbers into their Excel column name
@@ -38,20 +48,45 @@ class Bij:
         ...
         702 = ZZ
         703 = AAA
+
+    table_size: if non-zero, conversions of the numbers 0 to table_size (both
+    directions) are looked up in tables built on first use instead of being
+    computed.
     '''
-    def __init__(self, letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'):
+    def __init__(self, letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', table_size = 0):
         self.LETTERS = letters
         self.LETTER_VALUES = { letter: 1 + letters.find(letter) for letter in letters }
         self.BASE = len(letters)
+        self.table_size = table_size
+        self._aaa_by_n = None
+        self._n_by_aaa = None
     def aaa2n(self, aaa):
+        if self.table_size:
+            n = self._tables()[1].get(aaa)
+            if n is not None:
+                return n
+        # schéma de Horner : une multiplication par lettre
         n = 0
-        positions = len(aaa) - 1
         for letter in aaa:
-            letter_value = self.LETTER_VALUES[letter]
-            n += letter_value * self.BASE ** positions
-            positions -= 1
+            n = n * self.BASE + self.LETTER_VALUES[letter]
         return n
     def n2aaa(self, n):
+        if self.table_size and 0 <= n <= self.table_size:
+            return self._tables()[0][n]
+        return self._n2aaa_closed_form(n)
+    def _n2aaa_closed_form(self, n):
+        # chaque division donne une lettre, de droite à gauche ; le « - 1 » vient de
+        # ce qu’il n’y a pas de chiffre zéro en numération bijective
+        letters = []
+        while n > 0:
+            n, r = divmod(n - 1, self.BASE)
+            letters.append(self.LETTERS[r])
+        return ''.join(reversed(letters))
+    def n2aaa_iterative(self, n):
+        '''
+        Former implementation of n2aaa, quadratic in the number of letters (kept
+        for reference and benchmarks).
+        '''
         aaa = ''
         length = self.length_of_aaa_for_n(n)
         #print n, length
@@ -87,10 +122,48 @@ class Bij:
                 return positions
             positions += 1
     def enumerate(self, iterable):
-        n = 0
-        for item in iterable:
-            yield (n, self.n2aaa(n+1), item)
-            n += 1
+        return zip(itertools.count(), self.iter_aaa(1), iterable)
+    def range(self, start, stop):
+        '''
+        Representations of the numbers start to stop - 1 (like the builtin
+        range), e.g. AZ.range(1, 27) gives the 26 letters of the alphabet.
+        '''
+        start = max(start, 0)
+        if stop <= start:
+            return []
+        if stop - 1 <= self.table_size:
+            return self._tables()[0][start:stop]
+        return list(itertools.islice(self.iter_aaa(start), stop - start))
+    def iter_aaa(self, start = 1):
+        '''
+        Endless iterator over the representations of start, start + 1, etc.
+        Each one is derived from the previous one (usually by changing only the
+        last letter) instead of being converted from scratch.
+        '''
+        aaa = self._n2aaa_closed_form(start)
+        yield aaa
+        last_letter = self.LETTERS[-1]
+        while True:
+            # comme une retenue : les dernières lettres au maximum repassent à la
+            # première lettre, et la lettre qui les précède augmente de 1
+            prefix = aaa.rstrip(last_letter)
+            carried = len(aaa) - len(prefix)
+            if prefix:
+                prefix = prefix[:-1] + self.LETTERS[self.LETTER_VALUES[prefix[-1]]]
+            else:
+                prefix = self.LETTERS[0]
+            aaa = prefix + self.LETTERS[0] * carried
+            yield aaa
+    def _tables(self):
+        '''
+        Tables (list and dict) of the representations of 0 to table_size, built
+        on first use.
+        '''
+        if self._aaa_by_n is None:
+            aaa_by_n = [''] + list(itertools.islice(self.iter_aaa(1), self.table_size))
+            self._n_by_aaa = { aaa: n for n, aaa in enumerate(aaa_by_n) }
+            self._aaa_by_n = aaa_by_n
+        return self._aaa_by_n, self._n_by_aaa
 
     def check_reversible(self, n):
         try:
@@ -99,4 +172,4 @@ class Bij:
             print(n)
             return False
 
-AZ = Bij('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+AZ = Bij('ABCDEFGHIJKLMNOPQRSTUVWXYZ', table_size = EXCEL_MAX_COLUMNS)
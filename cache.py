@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Cache des noms démêlés lors des exécutions précédentes du nettoyage, pour ne
+chercher à nouveau que les noms nouveaux, modifiés ou touchés par un changement
+des noms de référence (mode incrémental).
+
+Pour chaque ligne de 'Utilisateurs' (identifiée par le contenu de ses cellules,
+cf. cle_ligne), le cache garde dans un fichier SQLite le nom et le prénom
+retrouvés et l’éventuelle ambiguïté. Ces résultats dépendent des noms de
+référence (les couples nom/prénom de 'Droits utilisateurs'), gardés eux aussi :
+quand des noms sont ajoutés ou retirés, seules les lignes dont le 'Nom Prénom'
+est proche d’un de ces noms (cf. correspondance.IndexNoms) sont cherchées à
+nouveau, les autres résultats ne pouvant pas changer.
+
+Les lignes de 'Droits utilisateurs' ne sont pas gardées : les normaliser coûte
+moins cher que de les chercher dans le cache.
+
+Le cache n’est pas chargé en mémoire : les lignes sont cherchées dans le fichier
+paquet par paquet ; enregistrer() y écrit les différences (lignes nouvelles,
+lignes disparues, noms de référence).
+
+>>> ligne, autre = (1, 'Apremont Christophe'), (2, 'Dupont Anne')
+>>> with CacheLignes(':memory:') as cache:
+...     for noms_de_reference in ([('APREMONT', 'Christophe'), ('DUPONT', 'Anne')],
+...                               [('APREMONT', 'Christophe'), ('DUPONT', 'Anne')],
+...                               [('APREMONT', 'Christophe'), ('DUPONT', 'Annie')]):
+...         cache.utiliser_noms_de_reference(noms_de_reference)
+...         print(cache.chercher_utilisateurs([ligne, autre]))
+...         cache.ajouter_utilisateurs([ligne, autre], [((1, 'APREMONT', 'Christophe'), None),
+...                                                     ((2, 'DUPONT', 'Anne'), None)])
+...         cache.enregistrer()
+[None, None]
+[((1, 'APREMONT', 'Christophe'), None), ((2, 'DUPONT', 'Anne'), None)]
+[((1, 'APREMONT', 'Christophe'), None), None]
+"""
+import json
+import marshal
+import sqlite3
+import sys
+
+from correspondance import IndexNoms
+from normalisation import asciifier
+
+# à incrémenter quand la recherche des noms change : le cache existant est alors vidé
+VERSION = 2
+
+TABLES = '''
+CREATE TABLE IF NOT EXISTS meta (cle TEXT PRIMARY KEY, valeur TEXT);
+CREATE TABLE IF NOT EXISTS noms_de_reference (nom, prenom, PRIMARY KEY (nom, prenom));
+CREATE TABLE IF NOT EXISTS utilisateurs (
+    cle BLOB PRIMARY KEY, user_id, nom, prenom, ambiguite TEXT, cle_nom TEXT) WITHOUT ROWID;
+CREATE TEMP TABLE IF NOT EXISTS paquet (num INTEGER, cle BLOB);
+CREATE TEMP TABLE IF NOT EXISTS vues (cle BLOB PRIMARY KEY) WITHOUT ROWID;
+'''
+
+def cle_ligne(ligne):
+    '''
+    Clé du contenu d’une ligne (tuple de valeurs de cellules) : sa sérialisation par
+    marshal (version 2, sans références), beaucoup plus rapide qu’une empreinte, ou à
+    défaut (ex : une date) son repr, préfixé par un octet que marshal n’écrit pas en tête.
+
+    >>> cle_ligne((1, 'A')) == cle_ligne([1, 'A']) != cle_ligne((1.0, 'A'))
+    True
+    '''
+    ligne = tuple(ligne)
+    try:
+        return marshal.dumps(ligne, 2)
+    except ValueError:
+        return b'r' + repr(ligne).encode('utf-8')
+
+class CacheLignes:
+    def __init__(self, chemin):
+        self.connexion = sqlite3.connect(chemin)
+        self.connexion.execute('PRAGMA temp_store = MEMORY')
+        self.connexion.executescript(TABLES)
+        if dict(self.connexion.execute('SELECT cle, valeur FROM meta')) != self.meta():
+            # autre version (ou cache vide) : on repart de zéro
+            with self.connexion:
+                for table in ('meta', 'noms_de_reference', 'utilisateurs', 'droits_utilisateurs'):
+                    self.connexion.execute('DROP TABLE IF EXISTS ' + table)
+            self.connexion.executescript(TABLES)
+        self.noms_ajoutes = self.noms_retires = ()
+        self.index_noms_changes = self.longueurs_proches = None
+
+    @staticmethod
+    def meta():
+        # les clés (cf. cle_ligne) dépendent de la version de marshal, donc de Python
+        return {'version': str(VERSION), 'python': '{}.{}'.format(*sys.version_info)}
+
+    def utiliser_noms_de_reference(self, noms_prenoms):
+        '''
+        Les résultats en cache ne valent que pour les noms de référence (et les paramètres
+        par défaut de correspondance.IndexNoms) avec lesquels ils ont été calculés : on note
+        les couples ajoutés et retirés depuis, pour écarter les résultats qu’ils peuvent
+        changer (cf. chercher_utilisateurs).
+        noms_prenoms: les couples (nom, prénom) de référence de cette exécution
+        '''
+        noms_prenoms = set(noms_prenoms)
+        anciens = set(self.connexion.execute('SELECT nom, prenom FROM noms_de_reference'))
+        self.noms_ajoutes = noms_prenoms - anciens
+        self.noms_retires = anciens - noms_prenoms
+        self.index_noms_changes = self.longueurs_proches = None
+
+    def perime(self, cle_nom):
+        '''
+        cle_nom: le 'Nom Prénom' d’une ligne, asciifié
+        retourne: True si un nom ajouté ou retiré est assez proche de cle_nom pour changer
+            le résultat de sa recherche (exacte ou approchée).
+        '''
+        if not (self.noms_ajoutes or self.noms_retires):
+            return False
+        if self.index_noms_changes is None:
+            index = self.index_noms_changes = IndexNoms(self.noms_ajoutes | self.noms_retires)
+            # une clé trop longue ou trop courte ne peut correspondre à aucun de ces noms
+            self.longueurs_proches = {len(cle) + ecart for cle in index.exactes
+                                      for ecart in range(-index.fautes_max, index.fautes_max + 1)}
+        if len(cle_nom) not in self.longueurs_proches:
+            return False
+        return self.index_noms_changes.chercher_cle(cle_nom).nom_prenom is not None
+
+    def chercher_utilisateurs(self, lignes):
+        '''
+        lignes: un paquet de lignes (ID, 'Nom Prénom') de 'Utilisateurs'
+        retourne: pour chaque ligne, le couple (ligne corrigée, ambiguïté) en cache, ou None
+            si elle n’y est pas ou si son résultat a pu changer avec les noms de référence.
+        '''
+        connexion = self.connexion
+        connexion.execute('DELETE FROM temp.paquet')
+        connexion.executemany('INSERT INTO temp.paquet VALUES (?, ?)',
+                              ((num, cle_ligne(ligne)) for num, ligne in enumerate(lignes)))
+        connexion.execute('INSERT OR IGNORE INTO temp.vues SELECT cle FROM temp.paquet')
+        connues = [None] * len(lignes)
+        for num, user_id, nom, prenom, ambiguite, cle_nom in connexion.execute(
+                'SELECT p.num, u.user_id, u.nom, u.prenom, u.ambiguite, u.cle_nom '
+                'FROM temp.paquet AS p JOIN utilisateurs AS u ON u.cle = p.cle'):
+            if not self.perime(cle_nom):
+                connues[num] = ((user_id, nom, prenom), None if ambiguite is None else tuple(json.loads(ambiguite)))
+        return connues
+
+    def ajouter_utilisateurs(self, lignes, resultats):
+        '''
+        lignes: des lignes (ID, 'Nom Prénom') de 'Utilisateurs'
+        resultats: pour chaque ligne, le couple (ligne corrigée, ambiguïté) trouvé
+        '''
+        self.connexion.executemany(
+            'INSERT OR REPLACE INTO utilisateurs VALUES (?, ?, ?, ?, ?, ?)',
+            ((cle_ligne(ligne), *corrigee, None if ambiguite is None else json.dumps(ambiguite), asciifier(ligne[1]))
+             for ligne, (corrigee, ambiguite) in zip(lignes, resultats)))
+
+    def enregistrer(self):
+        '''
+        Écrit dans le fichier les lignes ajoutées et les noms de référence, et supprime les
+        lignes qui n’ont pas été cherchées depuis l’ouverture (modifiées ou disparues de la
+        source).
+        '''
+        with self.connexion:
+            connexion = self.connexion
+            connexion.execute('DELETE FROM utilisateurs WHERE cle NOT IN (SELECT cle FROM temp.vues)')
+            connexion.executemany('DELETE FROM noms_de_reference WHERE nom = ? AND prenom = ?', self.noms_retires)
+            connexion.executemany('INSERT INTO noms_de_reference VALUES (?, ?)', self.noms_ajoutes)
+            connexion.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', self.meta().items())
+            connexion.execute('DELETE FROM temp.vues')
+        self.noms_ajoutes = self.noms_retires = ()
+        self.index_noms_changes = self.longueurs_proches = None
+
+    def close(self):
+        self.connexion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
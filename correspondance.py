@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Recherche d’un couple (nom, prénom) de référence à partir d’un « Nom Prénom »
+saisi librement (ex : la colonne 'Nom Prénom' de la feuille 'Utilisateurs').
+
+Dans l’ordre :
+    * correspondance exacte sur la clé asciifiée (cf. normalisation.asciifier) ;
+    * correspondance exacte avec le nom et le prénom inversés ;
+    * correspondance approchée (fautes de frappe) grâce à un index inversé de
+      4-grammes : la saisie est découpée en tranches de 4 caractères ; avec au
+      plus `fautes_max` fautes, toutes ses tranches sauf `fautes_max` se
+      retrouvent telles quelles dans la bonne clé. On ne compare donc la saisie
+      qu’aux clés qui contiennent assez de ces tranches, ce qui reste rapide
+      même avec des centaines de milliers de noms de référence.
+
+Chaque résultat a un indice de confiance (1 pour une correspondance exacte,
+le coefficient de Dice des trigrammes des deux clés sinon) et la liste des
+autres candidats presque aussi bons, pour signaler les ambiguïtés.
+
+>>> index = IndexNoms([('APREMONT', 'Christophe'), ('VAN DER BRŒCK', 'Anne Carole')])
+>>> index.chercher('apremont  christophe')
+Correspondance(nom_prenom=('APREMONT', 'Christophe'), confiance=1.0, concurrents=[])
+>>> index.chercher('Anne-Carole Van der Broeck').nom_prenom
+('VAN DER BRŒCK', 'Anne Carole')
+>>> index.chercher('APREMOND Christophe').confiance < 1
+True
+>>> index.chercher('Petrovitch Christophe')
+Correspondance(nom_prenom=None, confiance=0.0, concurrents=[])
+"""
+from array import array
+from collections import Counter, namedtuple
+
+from normalisation import asciifier, asciifier_colonne
+
+Correspondance = namedtuple('Correspondance', ('nom_prenom', 'confiance', 'concurrents'))
+
+def ngrammes(cle, n=3):
+    '''
+    n-grammes d’une clé asciifiée, bornée par '$' pour que le début et la fin comptent.
+    '''
+    cle = '$' + cle + '$'
+    return {cle[i:i+n] for i in range(len(cle) - n + 1)}
+
+def tranches(cle, n=4):
+    '''
+    Découpe la clé (bornée par '$') en tranches disjointes de n caractères.
+    '''
+    cle = '$' + cle + '$'
+    return [cle[i:i+n] for i in range(0, len(cle) - n + 1, n)]
+
+class IndexNoms:
+    '''
+    Index des couples (nom, prénom) de référence.
+
+    seuil: confiance minimale d’une correspondance approchée (coefficient de Dice entre
+        les trigrammes de la saisie et ceux de la clé de référence)
+    marge: écart de confiance en dessous duquel un autre candidat est considéré comme
+        concurrent (correspondance ambiguë)
+    fautes_max: nombre de fautes de frappe (caractère remplacé, ajouté ou supprimé) que la
+        recherche approchée est sûre de retrouver
+    '''
+    def __init__(self, noms_prenoms, seuil=0.6, marge=0.05, fautes_max=1):
+        self.seuil = seuil
+        self.marge = marge
+        self.fautes_max = fautes_max
+        # tri pour que le résultat ne dépende pas de l’ordre (ou du hasard d’un set)
+        self.references = sorted(set(noms_prenoms))
+        # une clé asciifiée par (référence, ordre) : nom+prénom puis prénom+nom. Calculées une
+        # seule fois, sans passer par le cache d’asciifier (que tant de clés videraient)
+        self.cles = asciifier_colonne(cle for nom, prenom in self.references for cle in (nom + prenom, prenom + nom))
+        # clé asciifiée -> indices des références (dans l’ordre nom+prénom puis prénom+nom)
+        self.exactes = {}
+        self.inversees = {}
+        for num_reference in range(len(self.references)):
+            self.exactes.setdefault(self.cles[2 * num_reference], []).append(num_reference)
+            self.inversees.setdefault(self.cles[2 * num_reference + 1], []).append(num_reference)
+        # l’index de la recherche approchée (le plus long à construire) n’est construit qu’à
+        # la 1re recherche approchée (cf. preparer_recherche_approchee)
+        self.index_ngrammes = None
+
+    def preparer_recherche_approchee(self):
+        '''
+        Construit l’index de la recherche approchée : pour chaque 4-gramme, la liste
+        (croissante) des numéros de clé (cf. cles) qui le contiennent. À appeler
+        avant de transmettre l’index à d’autres processus, pour qu’il n’y soit pas construit
+        par chacun.
+        '''
+        if self.index_ngrammes is not None:
+            return
+        index_ngrammes = {}
+        for num_cle, cle in enumerate(self.cles):
+            for ngramme in ngrammes(cle, 4):
+                index_ngrammes.setdefault(ngramme, array('I')).append(num_cle)
+        self.index_ngrammes = index_ngrammes
+
+    def __len__(self):
+        return len(self.references)
+
+    def chercher(self, nom_prenom):
+        '''
+        retourne: une Correspondance ; nom_prenom vaut None (et confiance 0) si aucune
+            référence n’atteint le seuil.
+        '''
+        return self.chercher_cle(asciifier(nom_prenom))
+
+    def chercher_cle(self, cle):
+        '''
+        Comme chercher, pour une saisie déjà asciifiée.
+        '''
+        for cles_exactes in (self.exactes, self.inversees):
+            if cle in cles_exactes:
+                meilleure, *autres = cles_exactes[cle]
+                return Correspondance(self.references[meilleure], 1.0, [self.references[n] for n in autres])
+        return self.chercher_approche(cle)
+
+    def chercher_approche(self, cle):
+        self.preparer_recherche_approchee()
+        # chaque faute abîme au plus une tranche : la bonne clé contient donc au moins
+        # (nombre de tranches - fautes_max) des tranches de la saisie. Une clé trop courte
+        # pour ce raisonnement est comparée via tous ses 4-grammes (une faute en abîme 4).
+        morceaux = set(tranches(cle))
+        minimum = len(morceaux) - self.fautes_max
+        if minimum < 1:
+            morceaux = ngrammes(cle, 4)
+            minimum = max(1, len(morceaux) - 4 * self.fautes_max)
+        compteur = Counter()
+        for morceau in morceaux:
+            compteur.update(self.index_ngrammes.get(morceau, ()))
+        # et chaque faute change la longueur d’au plus un caractère
+        longueurs = range(len(cle) - self.fautes_max, len(cle) + self.fautes_max + 1)
+        candidats = [num_cle for num_cle, nb in compteur.items()
+                     if nb >= minimum and len(self.cles[num_cle]) in longueurs]
+
+        trigrammes_cle = ngrammes(cle)
+        scores = {}
+        for num_cle in candidats:
+            trigrammes_candidat = ngrammes(self.cles[num_cle])
+            commun = len(trigrammes_cle & trigrammes_candidat)
+            score = 2.0 * commun / (len(trigrammes_cle) + len(trigrammes_candidat))
+            num_reference = num_cle // 2
+            if score >= self.seuil and score > scores.get(num_reference, 0):
+                scores[num_reference] = score
+        if not scores:
+            return Correspondance(None, 0.0, [])
+        classement = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        meilleure, meilleur_score = classement[0]
+        concurrents = [self.references[n] for n, score in classement[1:] if score >= meilleur_score - self.marge]
+        return Correspondance(self.references[meilleure], meilleur_score, concurrents)
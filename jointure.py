@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Jointure de 'Droits utilisateurs' avec 'Utilisateurs' (par le couple nom, prénom, pour
+retrouver le User ID) et avec 'Droits' (par le code du droit).
+
+Les index (User ID, couple nom/prénom et code du droit → toutes les lignes qui les
+portent) sont construits une seule fois ; chaque ligne de 'Droits utilisateurs' est
+ensuite jointe en O(1), en un seul parcours : le tout reste linéaire en nombre de lignes.
+Comme dans Excel (RECHERCHEV, NB.SI), les User ID et codes sont comparés sans tenir
+compte de la casse. CalculsExcel calcule à partir des mêmes index ce que calculent les
+formules du classeur propre.
+
+Ce qui empêche une jointure sûre n’interrompt pas le nettoyage : c’est listé sous la
+forme de lignes de la feuille 'Ambiguïtés' (feuille, clé, valeur source, problème, valeur
+retenue, confiance) :
+    * doublons : un même couple (nom, prénom) ou User ID pour plusieurs utilisateurs, un
+      même code pour plusieurs droits (c’est la 1re ligne qui compte, comme pour
+      RECHERCHEV) ;
+    * orphelins : un couple (nom, prénom) de 'Droits utilisateurs' qu’aucun utilisateur ne
+      porte (le User ID de ses lignes reste vide) ;
+    * codes inconnus : un code de droit absent de 'Droits' (gardé tel quel).
+
+>>> jointure = JointureDroits([('U1', 'DUPONT', 'Jean'), ('U2', 'DUPONT', 'Jean'), ('U3', 'MARTIN', 'Paul')],
+...                           [('D001', 'Lire')])
+>>> list(jointure.joindre([('DUPONT', 'Jean', 'D001', 1), ('DURAND', 'Marie', 'D002', 0.5)]))
+[('U1', 'D001', 1), (None, 'D002', 0.5)]
+>>> jointure.doublons()
+[('Utilisateurs', 'DUPONT;Jean', 'U1, U2', 'nom et prénom de plusieurs utilisateurs', 'U1', None)]
+>>> jointure.orphelins({('DUPONT', 'Jean'), ('DURAND', 'Marie')})
+[('Droits utilisateurs', 'DURAND;Marie', None, 'aucun utilisateur de ce nom et prénom', None, None)]
+>>> jointure.codes_inconnus({'D001', 'd001', 'D002'})
+[('Droits utilisateurs', 'D002', None, 'code absent de la feuille Droits', 'D002', None)]
+"""
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+def indexer(lignes, cle):
+    '''
+    retourne: un dictionnaire {cle(ligne): [lignes qui ont cette clé, dans leur ordre]}
+    '''
+    index = defaultdict(list)
+    for ligne in lignes:
+        index[cle(ligne)].append(ligne)
+    return dict(index)
+
+def nom_prenom(nom, prenom):
+    return '{};{}'.format(nom, prenom)
+
+def texte_excel(valeur):
+    # comme l’opérateur & d’Excel : une cellule vide donne une chaîne vide
+    return '' if valeur is None else str(valeur)
+
+def cle_excel(valeur):
+    # RECHERCHEV (en correspondance exacte) et NB.SI ne tiennent pas compte de la casse
+    return valeur.lower() if isinstance(valeur, str) else valeur
+
+def premiere_colonne_excel(ligne):
+    return cle_excel(ligne[0])
+
+class JointureDroits:
+    '''
+    utilisateurs: lignes (user_id, nom, prénom) de 'Utilisateurs', nom et prénom démêlés
+    droits: lignes (code, droit) de 'Droits'
+    '''
+    def __init__(self, utilisateurs, droits):
+        self.utilisateurs_par_id = indexer(utilisateurs, premiere_colonne_excel)
+        self.utilisateurs_par_nom = indexer(utilisateurs, itemgetter(1, 2))
+        self.droits_par_code = indexer(droits, premiere_colonne_excel)
+        self.uid_par_nom = {nom: lignes[0][0] for nom, lignes in self.utilisateurs_par_nom.items()}
+
+    def joindre(self, droits_utilisateurs):
+        '''
+        Générateur : (user_id, code_droit, indice_droit) pour chaque ligne (nom, prénom,
+        code_droit, indice_droit) de 'Droits utilisateurs' ; user_id vaut None pour un
+        orphelin.
+        '''
+        uid_par_nom = self.uid_par_nom
+        for nom, prenom, code_droit, indice_droit in droits_utilisateurs:
+            yield uid_par_nom.get((nom, prenom)), code_droit, indice_droit
+
+    def doublons(self):
+        '''
+        retourne: une ligne par couple (nom, prénom), User ID ou code de droit porté par
+            plusieurs lignes
+        '''
+        resultat = []
+        for (nom, prenom), lignes in self.utilisateurs_par_nom.items():
+            if len(lignes) > 1:
+                resultat.append(('Utilisateurs', nom_prenom(nom, prenom), ', '.join(str(ligne[0]) for ligne in lignes),
+                                 'nom et prénom de plusieurs utilisateurs', lignes[0][0], None))
+        for lignes in self.utilisateurs_par_id.values():
+            if len(lignes) > 1:
+                resultat.append(('Utilisateurs', lignes[0][0], ', '.join(nom_prenom(*ligne[1:]) for ligne in lignes),
+                                 'User ID de plusieurs utilisateurs', nom_prenom(*lignes[0][1:]), None))
+        for lignes in self.droits_par_code.values():
+            if len(lignes) > 1:
+                resultat.append(('Droits', lignes[0][0], ', '.join(str(ligne[1]) for ligne in lignes),
+                                 'code de plusieurs droits', lignes[0][1], None))
+        return resultat
+
+    def orphelins(self, noms_droits_utilisateurs):
+        '''
+        noms_droits_utilisateurs: les couples (nom, prénom) distincts de 'Droits utilisateurs'
+        retourne: une ligne par couple qu’aucun utilisateur ne porte (triés, pour que le
+            résultat ne dépende pas du hasard d’un set)
+        '''
+        return [('Droits utilisateurs', nom_prenom(nom, prenom), None, 'aucun utilisateur de ce nom et prénom',
+                 None, None)
+                for nom, prenom in sorted(set(noms_droits_utilisateurs) - self.uid_par_nom.keys())]
+
+    def codes_inconnus(self, codes_droits_utilisateurs):
+        '''
+        codes_droits_utilisateurs: les codes de droit distincts de 'Droits utilisateurs'
+        retourne: une ligne par code absent de 'Droits' (triés)
+        '''
+        return [('Droits utilisateurs', code, None, 'code absent de la feuille Droits', code, None)
+                for code in sorted(set(codes_droits_utilisateurs)) if cle_excel(code) not in self.droits_par_code]
+
+class CalculsExcel(JointureDroits):
+    '''
+    Ce que calculent les formules de 'Qui fait quoi' (RECHERCHEV) et 'Cohérence' (NB.SI),
+    calculé en python avec les index de JointureDroits : chaque ligne coûte O(1) au lieu
+    d’un parcours de toute une plage par Excel. Comme RECHERCHEV, en cas de doublon, c’est
+    la 1re ligne qui compte.
+
+    >>> calculs = CalculsExcel([('U1', 'DUPONT', 'Jean'), ('u1', 'MARTIN', 'Paul')], [('D001', 'Lire')])
+    >>> calculs.qui_fait_quoi('U1', 'd001'), calculs.qui_fait_quoi('U2', 'D001')
+    (('Jean DUPONT', 'peut', 'lire'), ('#N/A', 'peut', 'lire'))
+    >>> calculs.coherence(1)['E'], calculs.indicateurs_globaux()
+    (False, (False, True))
+    '''
+    def __init__(self, utilisateurs, droits):
+        super().__init__(utilisateurs, droits)
+        # colonnes D et F de 'Cohérence' et nombre d’occurrences de chaque nom;prénom (NB.SI ;
+        # celui des User ID est la taille de leur entrée dans utilisateurs_par_id)
+        self.cles_uid = [user_id for user_id, _, _ in utilisateurs]
+        self.cles_noms_prenoms = [nom_prenom(texte_excel(nom), texte_excel(prenom)) for _, nom, prenom in utilisateurs]
+        self.nb_noms_prenoms = Counter(map(cle_excel, self.cles_noms_prenoms))
+
+    def qui_fait_quoi(self, user_id, code_droit):
+        '''
+        Valeurs de ligne_qui_fait_quoi pour une ligne de 'Droits utilisateurs' ('#N/A' si
+        l’utilisateur ou le droit est introuvable, comme dans Excel).
+        '''
+        utilisateurs = self.utilisateurs_par_id.get(cle_excel(user_id))
+        if utilisateurs is None:
+            qui = '#N/A'
+        else:
+            _, nom, prenom = utilisateurs[0]
+            qui = '{} {}'.format(texte_excel(prenom), texte_excel(nom))
+        droits = self.droits_par_code.get(cle_excel(code_droit))
+        quoi = '#N/A' if droits is None else texte_excel(droits[0][1]).lower()
+        return (qui, 'peut', quoi)
+
+    def coherence(self, n):
+        '''
+        Valeurs de formules_coherence pour le n-ième utilisateur (à partir de 0).
+        '''
+        cle_uid, cle_noms_prenoms = self.cles_uid[n], self.cles_noms_prenoms[n]
+        return dict(
+            D = cle_uid,
+            E = len(self.utilisateurs_par_id[cle_excel(cle_uid)]) == 1,
+            F = cle_noms_prenoms,
+            G = self.nb_noms_prenoms[cle_excel(cle_noms_prenoms)] == 1,
+        )
+
+    def indicateurs_globaux(self):
+        return (
+            all(len(lignes) == 1 for lignes in self.utilisateurs_par_id.values()),
+            all(nb == 1 for nb in self.nb_noms_prenoms.values()),
+        )
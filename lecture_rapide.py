@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Lecture rapide des valeurs des feuilles d’un classeur xlsx, sans passer par
+openpyxl : le XML de chaque feuille (xl/worksheets/sheetN.xml) est lu au fil de
+l’eau dans le zip, et les textes partagés (xl/sharedStrings.xml) ne sont décodés
+qu’au fur et à mesure que les cellules y font référence. On obtient directement
+des tuples de valeurs, sans créer d’objets cellules.
+
+ClasseurXml s’utilise comme un classeur openpyxl en lecture seule pour ce dont
+le script a besoin (classeur[titre].iter_rows(min_row=..., values_only=True),
+close()) et donne les mêmes lignes. Ce qu’il ne sait pas lire (formules, dates,
+types de cellules inconnus…) est relu avec openpyxl, à partir de la ligne concernée
+(cf. FeuilleXml.iter_rows) ; cf. ouvrir_classeur pour le classeur entier.
+
+>>> import io, os, openpyxl
+>>> chemin = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exemple-source.xlsx')
+>>> def lignes(classeur):
+...     return {titre: list(classeur[titre].iter_rows(min_row=2, values_only=True)) for titre in classeur.sheetnames}
+>>> classeur, reference = ClasseurXml(chemin), openpyxl.load_workbook(chemin, read_only=True)
+>>> lignes(classeur) == lignes(reference), classeur.replis
+(True, [])
+
+Une formule en 3e ligne : les deux premières sont lues ici, la suite avec openpyxl.
+
+>>> wb = openpyxl.Workbook()
+>>> for ligne in (('a', 1), ('b', 2.5), ('c', '=B2*2'), ('d', True)):
+...     wb.active.append(ligne)
+>>> fichier = io.BytesIO()
+>>> wb.save(fichier)
+>>> classeur, reference = ClasseurXml(fichier), openpyxl.load_workbook(fichier, read_only=True)
+>>> lignes(classeur) == lignes(reference), classeur.replis
+(True, [('Sheet', 3, 'formule en B3')])
+"""
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse, parse
+from xml.parsers import expat
+
+# openpyxl n’est importé que quand on s’en sert (repli, formats de date personnalisés) : son
+# import coûte plus que la lecture d’un petit classeur
+from bijnum import AZ
+
+ESPACE_PRINCIPAL = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS = '{%s}' % ESPACE_PRINCIPAL
+NS_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+ATTR_ID_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# noms des éléments des feuilles tels que les donne expat (espace de noms, espace, nom)
+FEUILLE, LIGNE, CELLULE, VALEUR, FORMULE, EN_LIGNE, TEXTE, PHONETIQUE, DIMENSION = (
+    ESPACE_PRINCIPAL + ' ' + nom for nom in ('worksheet', 'row', 'c', 'v', 'f', 'is', 't', 'rPh', 'dimension'))
+
+# textes partagés, lus avec ElementTree
+SI, SI_TEXTE, SI_MORCEAU = NS + 'si', NS + 't', NS + 'r'
+
+CHIFFRES = '0123456789'
+# formats de nombre intégrés (numFmtId sans numFmt) qui sont des dates ou des durées pour
+# openpyxl (cf. format_date) ; les autres, intégrés ou inconnus, n’en sont pas
+FORMATS_DATES_INTEGRES = frozenset(range(14, 23)) | {45, 46, 47}
+# taille des morceaux du XML d’une feuille donnés à expat
+TAILLE_MORCEAU = 1 << 16
+
+class NonGere(Exception):
+    '''
+    Le classeur ou la feuille utilise quelque chose que ClasseurXml ne sait pas lire : il
+    faut passer par openpyxl.
+    '''
+
+def ouvrir_classeur(chemin):
+    '''
+    retourne: un ClasseurXml, ou, s’il ne sait pas lire ce classeur, le classeur openpyxl
+        en lecture seule : dans les deux cas, à fermer avec close().
+    '''
+    try:
+        return ClasseurXml(chemin)
+    except NonGere:
+        import openpyxl
+        return openpyxl.load_workbook(chemin, read_only=True)
+
+class ClasseurXml:
+    '''
+    chemin: chemin ou fichier (ouvert en binaire) du classeur xlsx
+    replis: (titre, numéro de ligne, raison) de chaque feuille que openpyxl a dû relire à
+        partir de cette ligne
+    '''
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.replis = []
+        self._classeur_openpyxl = None
+        self._chaines = None
+        try:
+            self.zip = zipfile.ZipFile(chemin)
+        except zipfile.BadZipFile as erreur:
+            raise NonGere(str(erreur))
+        try:
+            principal = cible_relation(self.zip, '', '_rels/.rels', 'officeDocument')
+            dossier = posixpath.dirname(principal)
+            relations = relations_par_id(self.zip, principal)
+            feuilles = racine_xml(self.zip, principal).find(NS + 'sheets')
+            if feuilles is None:
+                raise NonGere('pas de liste de feuilles dans {}'.format(principal))
+            self.feuilles = {}
+            for feuille in feuilles:
+                type_relation, cible = relations[feuille.get(ATTR_ID_REL)]
+                if type_relation != 'worksheet':
+                    raise NonGere('feuille {!r} de type {}'.format(feuille.get('name'), type_relation))
+                self.feuilles[feuille.get('name')] = chemin_dans_zip(dossier, cible)
+            self._chemin_chaines = chemin_de_type(relations, dossier, 'sharedStrings')
+            chemin_styles = chemin_de_type(relations, dossier, 'styles')
+            self.styles_dates = styles_dates(self.zip, chemin_styles) if chemin_styles else frozenset()
+        except (KeyError, TypeError) as erreur:
+            self.zip.close()
+            raise NonGere('structure du classeur inattendue ({!r})'.format(erreur))
+        except BaseException:
+            self.zip.close()
+            raise
+
+    @property
+    def sheetnames(self):
+        return list(self.feuilles)
+
+    def __getitem__(self, titre):
+        if titre not in self.feuilles:
+            raise KeyError('Worksheet {0} does not exist.'.format(titre))
+        return FeuilleXml(self, titre, self.feuilles[titre])
+
+    @property
+    def chaines(self):
+        if self._chaines is None:
+            self._chaines = ChainesPartagees(self.zip, self._chemin_chaines)
+        return self._chaines
+
+    def classeur_openpyxl(self):
+        if self._classeur_openpyxl is None:
+            import openpyxl
+            if hasattr(self.chemin, 'seek'):
+                self.chemin.seek(0)
+            self._classeur_openpyxl = openpyxl.load_workbook(self.chemin, read_only=True)
+        return self._classeur_openpyxl
+
+    def close(self):
+        if self._chaines is not None:
+            self._chaines.close()
+        if self._classeur_openpyxl is not None:
+            self._classeur_openpyxl.close()
+        self.zip.close()
+
+class FeuilleXml:
+    def __init__(self, classeur, titre, chemin):
+        self.classeur = classeur
+        self.title = titre
+        self.chemin = chemin
+
+    def iter_rows(self, min_row=1, values_only=True):
+        '''
+        Les lignes à partir de min_row, comme openpyxl en lecture seule : une ligne absente du
+        XML est une ligne de None, chaque ligne a autant de valeurs que la feuille a de
+        colonnes d’après <dimension> (ou, sans dimension, que sa dernière cellule). Valeurs
+        seulement (values_only est toujours vrai).
+
+        Dès qu’une ligne contient quelque chose que lire_lignes ne sait pas lire, la suite de la
+        feuille est lue avec openpyxl à partir de cette ligne.
+        '''
+        num_ligne = min_row
+        try:
+            for ligne in self.lire_lignes(min_row):
+                yield ligne
+                num_ligne += 1
+        except NonGere as raison:
+            self.classeur.replis.append((self.title, num_ligne, str(raison)))
+            feuille = self.classeur.classeur_openpyxl()[self.title]
+            yield from feuille.iter_rows(min_row=num_ligne, values_only=True)
+
+    def lire_lignes(self, min_row=1):
+        '''
+        Lit le XML de la feuille avec expat, morceau par morceau : seules les lignes du
+        morceau en cours sont en mémoire.
+        '''
+        classeur = self.classeur
+        styles_dates = classeur.styles_dates
+        lignes = []
+        nb_colonnes = max_row = None
+        vide = []
+        num_ligne = num_colonne = 0
+        suivante = min_row
+        termine = False
+        cellules = []
+        coordonnee = type_valeur = style = None
+        morceaux = []
+        capture = en_ligne = phonetique = False
+
+        def debut_racine(nom, attributs):
+            if nom != FEUILLE:
+                raise NonGere('élément racine {}'.format(nom))
+            parseur.StartElementHandler = debut
+
+        def debut(nom, attributs):
+            nonlocal num_ligne, num_colonne, coordonnee, type_valeur, style, capture, en_ligne, phonetique, \
+                nb_colonnes, max_row, vide
+            if nom == CELLULE:
+                coordonnee = attributs.get('r')
+                type_valeur = attributs.get('t', 'n')
+                style = attributs.get('s')
+                en_ligne = False
+                morceaux.clear()
+            elif nom == VALEUR or nom == TEXTE and en_ligne and not phonetique:
+                capture = True
+            elif nom == EN_LIGNE:
+                en_ligne = True
+            elif nom == LIGNE:
+                r = attributs.get('r')
+                num_ligne = int(r) if r else num_ligne + 1
+                num_colonne = 0
+                cellules.clear()
+            elif nom == FORMULE:
+                raise NonGere('formule en {}'.format(coordonnee))
+            elif nom == PHONETIQUE:
+                phonetique = True
+            elif nom == DIMENSION:
+                nb_colonnes, max_row = fin_de_plage(attributs['ref'])
+                vide = (None,) * nb_colonnes
+
+        def fin(nom):
+            nonlocal num_colonne, capture, phonetique, suivante, termine
+            if nom == CELLULE:
+                num_colonne = AZ.aaa2n(coordonnee.rstrip(CHIFFRES)) if coordonnee else num_colonne + 1
+                if num_ligne < suivante:
+                    # ligne avant min_row
+                    return
+                if type_valeur == 'inlineStr':
+                    valeur = ''.join(morceaux) if en_ligne else None
+                elif not morceaux:
+                    valeur = None
+                else:
+                    texte = ''.join(morceaux)
+                    if type_valeur == 's':
+                        valeur = classeur.chaines[int(texte)]
+                    elif type_valeur == 'n':
+                        if style is not None and int(style) in styles_dates:
+                            raise NonGere('date en {}'.format(coordonnee))
+                        # comme openpyxl (cf. openpyxl.worksheet._reader._cast_number)
+                        valeur = float(texte) if '.' in texte or 'E' in texte or 'e' in texte else int(texte)
+                    elif type_valeur == 'str' or type_valeur == 'e':
+                        valeur = texte
+                    elif type_valeur == 'b':
+                        valeur = bool(int(texte))
+                    else:
+                        raise NonGere('type de cellule {!r} en {}'.format(type_valeur, coordonnee))
+                cellules.append((num_colonne, valeur))
+            elif nom == VALEUR or nom == TEXTE:
+                capture = False
+            elif nom == LIGNE:
+                if max_row is not None and num_ligne > max_row:
+                    termine = True
+                if termine or num_ligne < suivante:
+                    return
+                # lignes absentes du XML
+                while suivante < num_ligne:
+                    lignes.append(vide)
+                    suivante += 1
+                lignes.append(valeurs_ligne(cellules, nb_colonnes))
+                suivante += 1
+            elif nom == PHONETIQUE:
+                phonetique = False
+
+        def caracteres(donnees):
+            if capture:
+                morceaux.append(donnees)
+
+        parseur = expat.ParserCreate(namespace_separator=' ')
+        parseur.buffer_text = True
+        parseur.StartElementHandler = debut_racine
+        parseur.EndElementHandler = fin
+        parseur.CharacterDataHandler = caracteres
+        with classeur.zip.open(self.chemin) as fichier:
+            while not termine:
+                morceau = fichier.read(TAILLE_MORCEAU)
+                try:
+                    parseur.Parse(morceau, not morceau)
+                except NonGere:
+                    # les lignes complètes qui précèdent la cellule non gérée restent bonnes
+                    yield from lignes
+                    raise
+                yield from lignes
+                lignes.clear()
+                if not morceau:
+                    break
+        if termine:
+            # comme openpyxl : la feuille a plus de lignes que sa dimension n’en annonce
+            while suivante <= max_row:
+                yield vide
+                suivante += 1
+
+def valeurs_ligne(cellules, nb_colonnes):
+    '''
+    cellules: (numéro de colonne, valeur) de chaque cellule de la ligne
+    nb_colonnes: nombre de valeurs de la ligne (None : jusqu’à la dernière cellule)
+    '''
+    if nb_colonnes is None:
+        if not cellules:
+            return ()
+        nb_colonnes = cellules[-1][0]
+    valeurs = [None] * nb_colonnes
+    for num_colonne, valeur in cellules:
+        if num_colonne <= nb_colonnes:
+            valeurs[num_colonne - 1] = valeur
+    return tuple(valeurs)
+
+class ChainesPartagees:
+    '''
+    Textes partagés du classeur, décodés à la demande : chaines[i] lit xl/sharedStrings.xml
+    jusqu’au i-ème texte (inclus) et garde les textes lus pour les appels suivants.
+    '''
+    def __init__(self, zip, chemin):
+        self.chaines = []
+        if chemin is None:
+            self.fichier = None
+            self.evenements = iter(())
+        else:
+            self.fichier = zip.open(chemin)
+            self.evenements = iterparse(self.fichier, events=('start', 'end'))
+        self.racine = None
+
+    def __getitem__(self, indice):
+        chaines = self.chaines
+        while indice >= len(chaines):
+            for evenement, element in self.evenements:
+                if evenement == 'start':
+                    if self.racine is None:
+                        self.racine = element
+                elif element.tag == SI:
+                    # comme openpyxl (cf. openpyxl.reader.strings)
+                    chaines.append(texte_de(element).replace('x005F_', ''))
+                    self.racine.clear()
+                    break
+            else:
+                raise IndexError('pas de texte partagé n° {}'.format(indice))
+        return chaines[indice]
+
+    def close(self):
+        if self.fichier is not None:
+            self.fichier.close()
+
+def texte_de(element):
+    '''
+    Texte d’un élément <si> : le texte simple puis celui des morceaux mis en forme (<r>), sans
+    les indications phonétiques, comme openpyxl sans rich_text.
+    '''
+    morceaux = []
+    for enfant in element:
+        if enfant.tag == SI_TEXTE:
+            morceaux.insert(0, enfant.text or '')
+        elif enfant.tag == SI_MORCEAU:
+            for t in enfant.iterfind(SI_TEXTE):
+                morceaux.append(t.text or '')
+    return ''.join(morceaux)
+
+def racine_xml(zip, chemin):
+    with zip.open(chemin) as fichier:
+        return parse(fichier).getroot()
+
+def relations_par_id(zip, chemin_partie):
+    '''
+    retourne: {id: (type, cible)} des relations de la partie chemin_partie du zip.
+    '''
+    dossier, nom = posixpath.split(chemin_partie)
+    chemin_rels = posixpath.join(dossier, '_rels', nom + '.rels')
+    return {relation.get('Id'): (relation.get('Type').rsplit('/', 1)[-1], relation.get('Target'))
+            for relation in racine_xml(zip, chemin_rels).iter(NS_REL + 'Relationship')}
+
+def cible_relation(zip, dossier, chemin_rels, type_relation):
+    for relation in racine_xml(zip, chemin_rels).iter(NS_REL + 'Relationship'):
+        if relation.get('Type').rsplit('/', 1)[-1] == type_relation:
+            return chemin_dans_zip(dossier, relation.get('Target'))
+    raise NonGere('pas de relation {}'.format(type_relation))
+
+def chemin_de_type(relations, dossier, type_relation):
+    for type_cible, cible in relations.values():
+        if type_cible == type_relation:
+            return chemin_dans_zip(dossier, cible)
+    return None
+
+def chemin_dans_zip(dossier, cible):
+    # les cibles sont relatives au dossier de la partie, ou absolues (depuis la racine du zip)
+    if cible.startswith('/'):
+        return cible[1:]
+    return posixpath.normpath(posixpath.join(dossier, cible))
+
+def styles_dates(zip, chemin_styles):
+    '''
+    retourne: les numéros des styles de cellule (attribut s) dont le format est une date ou
+        une durée : openpyxl en fait des datetime, ce que lire_lignes ne fait pas.
+    '''
+    racine = racine_xml(zip, chemin_styles)
+    formats_perso = racine.find(NS + 'numFmts')
+    formats_perso = {} if formats_perso is None else {
+        int(f.get('numFmtId')): f.get('formatCode') for f in formats_perso}
+    styles = racine.find(NS + 'cellXfs')
+    if styles is None:
+        return frozenset()
+    return frozenset(num for num, style in enumerate(styles)
+                     if format_date(int(style.get('numFmtId', 0)), formats_perso))
+
+def format_date(num_format, formats_perso):
+    '''
+    retourne: vrai si le format num_format (intégré, ou défini dans formats_perso) est une date
+        ou une durée, comme pour openpyxl, qui n’est importé que pour les formats personnalisés
+    >>> from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+    >>> all(format_date(num, {}) == is_date_format(BUILTIN_FORMATS.get(num, 'General')) for num in range(200))
+    True
+    >>> format_date(14, {14: '0.00'}), format_date(164, {164: 'dd/mm/yyyy'})
+    (False, True)
+    '''
+    if num_format not in formats_perso:
+        return num_format in FORMATS_DATES_INTEGRES
+    from openpyxl.styles.numbers import is_date_format
+    return is_date_format(formats_perso[num_format])
+
+def fin_de_plage(ref):
+    '''
+    retourne: le numéro de la dernière colonne et celui de la dernière ligne d’une plage,
+        comme range_boundaries d’openpyxl
+    >>> fin_de_plage('A1:AB12'), fin_de_plage('$B$2')
+    ((28, 12), (2, 2))
+    '''
+    derniere = ref.rpartition(':')[2].replace('$', '')
+    lettres = derniere.rstrip(CHIFFRES)
+    try:
+        return AZ.aaa2n(lettres), int(derniere[len(lettres):])
+    except (KeyError, ValueError):
+        raise NonGere('dimension {}'.format(ref))
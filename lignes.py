@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Stockage compact des lignes d’une feuille (des millions de lignes de 'Droits
+utilisateurs') : au lieu d’une liste de tuples (un objet tuple par ligne, plus un
+objet par valeur), les valeurs sont rangées colonne par colonne, et chaque texte
+ou nombre à virgule n’est gardé qu’une seule fois, quel que soit le nombre de
+lignes où il apparaît (les mêmes codes de droits, indices et noms reviennent sans
+cesse).
+
+Lignes se parcourt et s’indexe comme une liste de tuples : le reste du script
+n’a pas à savoir comment les lignes sont stockées.
+
+>>> lignes = Lignes(3, [('U01', 'D012', 0.3), ('U02', 'D012', 0.3)])
+>>> len(lignes), lignes[1]
+(2, ('U02', 'D012', 0.3))
+>>> list(lignes) == [('U01', 'D012', 0.3), ('U02', 'D012', 0.3)]
+True
+>>> lignes[0][1] is lignes[1][1]
+True
+>>> lignes[-1:]
+[('U02', 'D012', 0.3)]
+>>> lignes.append(('U03', 'D012'))
+Traceback (most recent call last):
+  ...
+ValueError: ligne de 2 valeurs au lieu de 3 : ('U03', 'D012')
+"""
+
+class Lignes:
+    '''
+    nb_colonnes: nombre de valeurs de chaque ligne
+    lignes: lignes (tuples ou listes de nb_colonnes valeurs) à ajouter
+    '''
+    __slots__ = ('colonnes', 'textes', 'flottants')
+
+    def __init__(self, nb_colonnes, lignes=()):
+        self.colonnes = tuple([] for _ in range(nb_colonnes))
+        # une seule copie de chaque valeur (cf. interner) ; textes et nombres sont séparés,
+        # sinon 1 et 1.0 seraient confondus
+        self.textes = {}
+        self.flottants = {}
+        self.extend(lignes)
+
+    def append(self, ligne):
+        if len(ligne) != len(self.colonnes):
+            # zip tronquerait la ligne sans rien dire
+            raise ValueError('ligne de {} valeurs au lieu de {} : {!r}'.format(len(ligne), len(self.colonnes), ligne))
+        textes, flottants = self.textes, self.flottants
+        for colonne, valeur in zip(self.colonnes, ligne):
+            t = type(valeur)
+            if t is str:
+                valeur = textes.setdefault(valeur, valeur)
+            elif t is float:
+                valeur = flottants.setdefault(valeur, valeur)
+            colonne.append(valeur)
+
+    def extend(self, lignes):
+        append = self.append
+        for ligne in lignes:
+            append(ligne)
+
+    def __len__(self):
+        return len(self.colonnes[0])
+
+    def __iter__(self):
+        return zip(*self.colonnes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(zip(*(colonne[index] for colonne in self.colonnes)))
+        return tuple(colonne[index] for colonne in self.colonnes)
+
+    def __eq__(self, autre):
+        try:
+            if len(self) != len(autre):
+                return False
+        except TypeError:
+            return NotImplemented
+        return all(ligne == tuple(autre_ligne) for ligne, autre_ligne in zip(self, autre))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Lignes({}, [{}{}])'.format(len(self.colonnes), ', '.join(map(repr, zip(*(c[:3] for c in self.colonnes)))),
+                                          ', ...' if len(self) > 3 else '')
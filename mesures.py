@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Mesures d’une exécution du nettoyage : durée de chaque étape, compteurs (lignes
+traitées, correspondances de noms, cellules stylées, octets écrits…) et,
+facultativement, pic de mémoire de chaque étape (tracemalloc).
+
+Les fonctions mesurées reçoivent un objet Mesures (ou AUCUNE_MESURE, qui ne fait
+rien) : les compteurs sont incrémentés une fois par paquet ou par feuille, jamais
+par cellule, pour que le coût reste négligeable.
+
+>>> mesures = Mesures()
+>>> with mesures.etape('lecture'):
+...     mesures.compter('lignes', 3)
+>>> mesures.compter('lignes')
+>>> rapport = mesures.rapport()
+>>> rapport['compteurs']
+{'lignes': 4}
+>>> [etape['etape'] for etape in rapport['etapes']]
+['lecture']
+"""
+import collections
+import contextlib
+import json
+import time
+import tracemalloc
+
+class Mesures:
+    '''
+    memoire: si vrai, le pic de mémoire allouée par python pendant chaque étape est
+        mesuré avec tracemalloc (démarré au besoin ; ralentit nettement l’exécution).
+    '''
+    def __init__(self, memoire=False):
+        self.memoire = memoire
+        self.etapes = []
+        self.compteurs = collections.Counter()
+        self.debut = time.perf_counter()
+
+    @contextlib.contextmanager
+    def etape(self, nom):
+        if self.memoire:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            mesure = dict(etape=nom, duree=time.perf_counter() - debut)
+            if self.memoire:
+                mesure['pic_memoire_mo'] = tracemalloc.get_traced_memory()[1] / 1e6
+            self.etapes.append(mesure)
+
+    def compter(self, nom, nombre=1):
+        self.compteurs[nom] += nombre
+
+    def ajouter(self, compteurs):
+        '''
+        Ajoute des compteurs calculés ailleurs (ex : dans un processus de repartir).
+        '''
+        self.compteurs.update(compteurs)
+
+    def rapport(self):
+        return dict(
+            etapes=self.etapes,
+            compteurs=dict(self.compteurs),
+            duree_totale=time.perf_counter() - self.debut,
+        )
+
+    def json(self):
+        return json.dumps(self.rapport(), ensure_ascii=False, indent=2)
+
+class _SansMesures:
+    '''
+    Mesures désactivées : mêmes méthodes que Mesures, qui ne font rien.
+    '''
+    _etape = contextlib.nullcontext()
+
+    def etape(self, nom):
+        return self._etape
+
+    def compter(self, nom, nombre=1):
+        pass
+
+    def ajouter(self, compteurs):
+        pass
+
+AUCUNE_MESURE = _SansMesures()
@@ -22,131 +22,601 @@ les structures de données « de confort ».
 
 import os
 import sys
-import re
+import argparse
+import collections
+import copy
+import functools
+import glob
+import itertools
+import json
+import shutil
+import tempfile
+import time
+import traceback
+import warnings
+import zipfile
 
-# j’utilise unicodedata pour asciifier des chaînes unicode
-import unicodedata
-
-# openpyxl est la bibliothèque de gestion du format xlsx
-import openpyxl
-from openpyxl.formatting import Rule
-from openpyxl.formatting.rule import CellIsRule, FormulaRule
-from openpyxl.styles import Font, Color, Alignment, PatternFill, Border
-try: from openpyxl.styles import NamedStyle
-except: from openpyxl.styles import Style as NamedStyle
-from openpyxl.styles.differential import DifferentialStyle
-from openpyxl.worksheet.table import Table, TableStyleInfo
+# normalisation des valeurs saisies, cellule par cellule ou colonne par colonne
+from normalisation import (asciifier, supprimer_espaces_en_trop, normaliser_nombre,
+                           supprimer_espaces_colonne, normaliser_nombres_colonne)
+# index des noms de référence pour retrouver nom et prénom malgré les différences de saisie
+from correspondance import IndexNoms
+# jointure de 'Droits utilisateurs' avec 'Utilisateurs' et 'Droits', doublons et orphelins compris, et
+# ce que calculent les formules du classeur propre à partir des mêmes index
+from jointure import JointureDroits, CalculsExcel
+# durée des étapes et compteurs d’une exécution (cf. main, --mesures)
+from mesures import Mesures, AUCUNE_MESURE
+# noms démêlés lors des exécutions précédentes (cf. main, --incremental)
+from cache import CacheLignes
+# lignes des feuilles rangées colonne par colonne (bien plus compact qu’une liste de tuples)
+from lignes import Lignes
+# lecture des valeurs directement dans le XML du classeur, sans openpyxl (cf. main, --lecture-rapide)
+from lecture_rapide import ouvrir_classeur, ClasseurXml
+# écriture des données propres en TSV, CSV, SQLite, Parquet ou Arrow (cf. main, --format)
+import sorties
 
+# openpyxl est la bibliothèque de gestion du format xlsx. Elle n’est importée (comme
+# multiprocessing) que dans les fonctions qui s’en servent : son import prend plus de temps
+# que tout le reste du démarrage, pour rien quand il n’y a aucun classeur à lire avec elle ni
+# à écrire (ex : un lot déjà à jour, --lecture-rapide --format sqlite).
 
 # constantes liées aux fichiers de travail
-IN_DIR = os.path.realpath(sys.path[0])
+IN_DIR = os.path.dirname(os.path.realpath(__file__))
 IN_FILEPATH = os.path.join(IN_DIR, 'exemple-source.xlsx')
 OUT_DIR = os.path.join(IN_DIR, 'out')
 OUT_FILEPATH = os.path.join(OUT_DIR, 'exemple-cible.xlsx')
 
-# créer le répertoire de sortie si inexistant
-if not os.path.exists(OUT_DIR):
-    os.mkdir(OUT_DIR)
+# nombre de lignes envoyées à la fois à un processus (cf. analyser_et_corriger)
+TAILLE_PAQUET = 10000
 
-def demo_nettoyage():
-    classeur_sale = openpyxl.load_workbook(IN_FILEPATH)
-    donnees_sales = recuperer_donnees(classeur_sale)
-    donnees_propres = analyser_et_corriger(*donnees_sales)
-    classeur_propre = generer_classeur_propre(*donnees_propres)
-    classeur_propre.save(OUT_FILEPATH)
+def demo_nettoyage(lecture_en_flux=False, ecriture_en_flux=False, processus=1, moteur='cellules',
+                   calculs='formules', mesures=AUCUNE_MESURE, chemin_source=IN_FILEPATH,
+                   chemin_cible=OUT_FILEPATH, chemin_cache=None, lecture_rapide=False, formats=('xlsx',),
+                   feuilles_en_parallele=1):
+    '''
+    lecture_en_flux: si vrai, le classeur source est ouvert en lecture seule et la feuille
+        'Droits utilisateurs' est lue ligne à ligne au lieu d’être chargée en mémoire
+        (utile pour les très gros fichiers).
+    ecriture_en_flux: si vrai, le classeur propre est écrit en écriture seule, ligne à ligne
+        (cf. generer_classeur_propre_en_flux).
+    processus: nombre de processus utilisés pour corriger les données (cf. analyser_et_corriger).
+    moteur: 'cellules' ou 'colonnes', façon de normaliser les données (cf. analyser_et_corriger).
+    calculs: 'formules', 'valeurs' ou 'valeurs et formules', contenu des feuilles 'Qui fait quoi'
+        et 'Cohérence' (cf. CALCULS).
+    mesures: un objet mesures.Mesures qui reçoit la durée de chaque étape et les compteurs
+        (lignes traitées, correspondances de noms, cellules stylées, octets écrits).
+        En lecture en flux, 'Droits utilisateurs' n’est lue et corrigée qu’au moment de
+        l’écriture : ce travail est alors compté dans l’étape generer_classeur_propre.
+    chemin_source, chemin_cible: le classeur à nettoyer et le classeur propre à écrire
+        (cf. nettoyer_lot pour en traiter plusieurs).
+    chemin_cache: si donné, fichier SQLite où garder les noms démêlés de 'Utilisateurs' d’une
+        exécution à l’autre : seules les lignes nouvelles ou modifiées depuis la précédente,
+        ou proches d’un nom de référence ajouté ou retiré, sont démêlées à nouveau
+        (cf. cache.py).
+    lecture_rapide: si vrai, les valeurs du classeur source sont lues directement dans son XML
+        (cf. lecture_rapide.py), bien plus vite qu’avec openpyxl ; ce que ce lecteur ne gère
+        pas (formules, dates…) est relu avec openpyxl.
+    formats: formats dans lesquels écrire les données propres (cf. FORMATS) : le classeur
+        propre chemin_cible pour 'xlsx', des fichiers à côté pour les autres (cf.
+        chemins_sorties et sorties.py).
+    feuilles_en_parallele: si > 1, nombre de processus qui lisent chacun une feuille du
+        classeur source (cf. recuperer_donnees_en_parallele) puis écrivent chacun une feuille
+        du classeur propre (cf. generer_classeur_propre_en_parallele, qui l’écrit toujours en
+        écriture seule). Incompatible avec lecture_en_flux : les données sont en mémoire.
+    '''
+    if feuilles_en_parallele > 1 and lecture_en_flux:
+        raise ValueError('feuilles_en_parallele et lecture_en_flux ne peuvent pas s’utiliser ensemble')
+    classeur_sale = None
+    # créer le répertoire de sortie si inexistant
+    os.makedirs(os.path.dirname(os.path.abspath(chemin_cible)), exist_ok=True)
+    cache = CacheLignes(chemin_cache) if chemin_cache else None
+    try:
+        if feuilles_en_parallele > 1:
+            # chaque processus ouvre lui-même le classeur : pas d’étape de chargement
+            with mesures.etape('recuperer_donnees'):
+                donnees_sales = recuperer_donnees_en_parallele(chemin_source, lecture_rapide, feuilles_en_parallele)
+        else:
+            with mesures.etape('chargement'):
+                if lecture_rapide:
+                    classeur_sale = ouvrir_classeur(chemin_source)
+                else:
+                    import openpyxl
+                    classeur_sale = openpyxl.load_workbook(chemin_source, read_only=lecture_en_flux)
+            with mesures.etape('recuperer_donnees'):
+                if lecture_en_flux:
+                    donnees_sales = recuperer_donnees_en_flux(classeur_sale)
+                else:
+                    donnees_sales = recuperer_donnees(classeur_sale)
+        with mesures.etape('analyser_et_corriger'):
+            donnees_propres = analyser_et_corriger(*donnees_sales, en_flux=lecture_en_flux, processus=processus,
+                                                   moteur=moteur, mesures=mesures, cache=cache)
+        if 'xlsx' in formats:
+            with mesures.etape('generer_classeur_propre'):
+                if feuilles_en_parallele > 1:
+                    classeur_propre = generer_classeur_propre_en_parallele(
+                        *donnees_propres, calculs=calculs, processus=feuilles_en_parallele, mesures=mesures)
+                elif ecriture_en_flux:
+                    classeur_propre = generer_classeur_propre_en_flux(*donnees_propres, calculs=calculs,
+                                                                      mesures=mesures)
+                else:
+                    classeur_propre = generer_classeur_propre(*donnees_propres, calculs=calculs, mesures=mesures)
+            with mesures.etape('enregistrement'), sorties.fichier_partiel(chemin_cible) as chemin_partiel:
+                classeur_propre.save(chemin_partiel)
+            mesures.compter('octets_ecrits', os.path.getsize(chemin_cible))
+        for format_sortie in formats:
+            if format_sortie != 'xlsx':
+                with mesures.etape('ecrire_' + format_sortie):
+                    chemins = sorties.SORTIES[format_sortie].ecrire(tables_propres(*donnees_propres),
+                                                            os.path.splitext(chemin_cible)[0])
+                mesures.compter('octets_ecrits', sum(os.path.getsize(chemin) for chemin in chemins))
+    finally:
+        if cache is not None:
+            cache.close()
+        # en lecture seule (et en lecture rapide), le fichier source reste ouvert : on ne le ferme
+        # qu’une fois toutes les lignes consommées, ou après une erreur (sinon, dans un lot, chaque
+        # classeur en échec laisserait un fichier ouvert)
+        if classeur_sale is not None and (lecture_en_flux or lecture_rapide):
+            mesures.compter('feuilles_relues_avec_openpyxl', len(getattr(classeur_sale, 'replis', ())))
+            classeur_sale.close()
 
 def recuperer_donnees(wb):
     '''
-    wb: Un objet 'Workbook' d’openpyxl (représentant un classeur Excel)
-    retourne: 3 listes de lignes de cellules
+    wb: Un objet 'Workbook' d’openpyxl (représentant un classeur Excel), ou un ClasseurXml
+        (cf. lecture_rapide.py), qui se lit de la même façon
+    retourne: 3 listes de lignes de cellules (des objets Lignes, qui se parcourent comme des
+        listes de tuples)
     '''
-    feuille_utilisateurs = wb['Utilisateurs']
-    feuille_droits = wb['Droits']
-    feuille_droits_utilisateurs = wb['Droits utilisateurs']
-
-    utilisateurs = []
     # on spécifie min_row = 2 pour éviter d’inclure les cellules d’en-tête (première ligne).
-    for user_ID_cell, nom_prenom_cell, *other_cells in feuille_utilisateurs.iter_rows(min_row = 2):
-        # la propriété 'value' de l’objet cellule permet d’avoir le contenu.
-        # pour les cellules de type numérique, le type de 'value' sera int, long ou float.
-        # pour les cellules de type texte ou les formules, ce sera str (python 3) ou unicode (python 2).
-        utilisateurs.append((user_ID_cell.value, nom_prenom_cell.value))
-
-    droits = []
-    for code_cell, droit_cell, *other_cells in feuille_droits.iter_rows(min_row=2):
-        droits.append((code_cell.value, droit_cell.value))
-
-    droits_utilisateurs = []
-    for (
-          nom_cell,
-          prenom_cell,
-          num_droit_cell,
-          indice_droit_cell,
-          *other_cells) in feuille_droits_utilisateurs.iter_rows(min_row = 2):
-        droits_utilisateurs.append((nom_cell.value, prenom_cell.value, num_droit_cell.value, indice_droit_cell.value))
+    # avec values_only=True, on obtient directement le contenu des cellules (la propriété
+    # 'value' de l’objet cellule) :
+    # pour les cellules de type numérique, ce sera int, long ou float.
+    # pour les cellules de type texte ou les formules, ce sera str (python 3) ou unicode (python 2).
+    return tuple(lire_feuille(wb, titre) for titre in FEUILLES_SOURCES)
+
+def lire_feuille(wb, titre):
+    nb_colonnes, lecteur = FEUILLES_SOURCES[titre]
+    return Lignes(nb_colonnes, lecteur(wb[titre].iter_rows(min_row = 2, values_only = True)))
+
+def recuperer_donnees_en_parallele(chemin_source, lecture_rapide=False, processus=3):
+    '''
+    Comme recuperer_donnees, mais chaque feuille est lue par un processus différent, qui ouvre
+    lui-même le classeur (en lecture seule, ou avec lecture_rapide) : la durée est celle de la
+    plus grosse feuille (en général 'Droits utilisateurs') plutôt que la somme des trois.
+    '''
+    return tuple(repartir(lire_feuille_du_classeur, FEUILLES_SOURCES, min(processus, len(FEUILLES_SOURCES)),
+                          (chemin_source, lecture_rapide)))
+
+def lire_feuille_du_classeur(titre, chemin_source, lecture_rapide=False):
+    if lecture_rapide:
+        wb = ouvrir_classeur(chemin_source)
+    else:
+        import openpyxl
+        wb = openpyxl.load_workbook(chemin_source, read_only=True)
+    try:
+        return lire_feuille(wb, titre)
+    finally:
+        wb.close()
+
+def recuperer_donnees_en_flux(wb):
+    '''
+    wb: Un objet 'Workbook' d’openpyxl ouvert en lecture seule (read_only=True), ou un
+        ClasseurXml
+    retourne: les mêmes 3 jeux de lignes que recuperer_donnees, sauf que 'Droits utilisateurs'
+        n’est pas chargée en mémoire : c’est un objet ré-itérable qui relit la feuille à
+        chaque parcours.
+
+    Les feuilles 'Utilisateurs' et 'Droits' sont des tables de référence (petites) : on les
+    charge quand même en mémoire.
+    '''
+    utilisateurs = lire_feuille(wb, 'Utilisateurs')
+    droits = lire_feuille(wb, 'Droits')
+    droits_utilisateurs = FeuilleEnFlux(wb['Droits utilisateurs'], lire_droits_utilisateurs)
     return utilisateurs, droits, droits_utilisateurs
 
-def analyser_et_corriger(utilisateurs, droits, droits_utilisateurs):
+class FeuilleEnFlux:
+    '''
+    Lignes d’une feuille lues à la demande : chaque itération relit la feuille depuis le début
+    (en lecture seule, openpyxl relit le XML au lieu de garder les cellules en mémoire).
+    '''
+    def __init__(self, feuille, lecteur):
+        self.feuille = feuille
+        self.lecteur = lecteur
+    def __iter__(self):
+        return self.lecteur(self.feuille.iter_rows(min_row = 2, values_only = True))
+
+class CalculEnFlux:
+    '''
+    Lignes calculées à la demande : chaque itération rappelle fonction() (ex : relit et
+    corrige à nouveau 'Droits utilisateurs', cf. analyser_et_corriger), sans rien garder en
+    mémoire d’un parcours à l’autre.
+    '''
+    def __init__(self, fonction):
+        self.fonction = fonction
+    def __iter__(self):
+        return iter(self.fonction())
+
+def lire_utilisateurs(lignes):
+    for user_ID, nom_prenom, *autres in lignes_non_vides(lignes):
+        yield user_ID, nom_prenom
+
+def lire_droits(lignes):
+    for code, droit, *autres in lignes_non_vides(lignes):
+        yield code, droit
+
+def lire_droits_utilisateurs(lignes):
+    for nom, prenom, num_droit, indice_droit, *autres in lignes_non_vides(lignes):
+        yield nom, prenom, num_droit, indice_droit
+
+def lignes_non_vides(lignes):
+    '''
+    Ignore les lignes entièrement vides : openpyxl renvoie des lignes de None jusqu’à la
+    dernière ligne « utilisée » de la feuille (ex : une cellule mise en forme mais vide).
+    '''
+    for ligne in lignes:
+        if any(valeur is not None for valeur in ligne):
+            yield ligne
+
+# feuilles lues dans le classeur source : nombre de colonnes gardées et fonction de lecture
+FEUILLES_SOURCES = {
+    'Utilisateurs': (2, lire_utilisateurs),
+    'Droits': (2, lire_droits),
+    'Droits utilisateurs': (4, lire_droits_utilisateurs),
+}
+
+def analyser_et_corriger(utilisateurs, droits, droits_utilisateurs, en_flux=False,
+                         processus=1, taille_paquet=TAILLE_PAQUET, moteur='cellules', mesures=AUCUNE_MESURE,
+                         cache=None):
     '''
     utilisateurs: la liste de lignes de cellules de la feuille 'Utilisateurs' (sans la 1re ligne)
     droits: idem pour la feuille 'Droits'
-    droits_utilisateurs: idem pour la feuille 'Droits utilisateurs'
+    droits_utilisateurs: idem pour la feuille 'Droits utilisateurs' (ou n’importe quel
+        itérable qui peut être parcouru deux fois, cf. FeuilleEnFlux)
+    en_flux: si vrai, les lignes corrigées de 'Droits utilisateurs' ne sont pas gardées en
+        mémoire : elles sont calculées au fur et à mesure de leur consommation, à nouveau à
+        chaque parcours (cf. CalculEnFlux).
+    processus: nombre de processus entre lesquels répartir les lignes de 'Utilisateurs' et
+        de 'Droits utilisateurs', par paquets de taille_paquet lignes (cf. repartir). Le
+        résultat est identique quel que soit le nombre de processus.
+    moteur: 'cellules' pour normaliser 'Droits utilisateurs' cellule par cellule,
+        'colonnes' pour normaliser chaque paquet colonne par colonne (cf. normalisation.py).
+        Le résultat est le même.
+    mesures: reçoit le nombre de lignes lues et les compteurs de la recherche des noms
+        (cf. demeler_utilisateurs).
+    cache: un cache.CacheLignes : les lignes de 'Utilisateurs' déjà démêlées lors d’une
+        exécution précédente sont reprises du cache, seules les autres sont démêlées (puis
+        ajoutées au cache, enregistré avant le 2e parcours). Le résultat est le même.
 
-    Homogénéise les données.
+    Homogénéise les données. Retourne les 3 feuilles corrigées (des objets Lignes, sauf
+    'Droits utilisateurs' en flux) et la liste des ambiguïtés rencontrées
+    (cf. EN_TETES['Ambiguïtés']), dont les doublons, orphelins et codes de droit inconnus
+    trouvés par la jointure (cf. jointure.py) : le User ID d’un orphelin reste vide.
     '''
     ## 'Droits' est déjà OK
     droits_ok = droits
 
     ## on part de 'Droits utilisateurs' pour obtenir une liste normalisée des noms et prénoms
-    droits_utilisateurs_ok = []
-    noms_utilisateurs_ok = []
+    ## (1er parcours : on ne garde que les couples nom/prénom et les codes de droit distincts,
+    ## bornés par le nombre d’utilisateurs et de droits et non par le nombre de lignes)
+    noms_utilisateurs_ok = set()
+    codes_droits = set()
+    paquets_droits_utilisateurs = par_paquets(droits_utilisateurs, taille_paquet)
+    for noms, codes in repartir(cles_distinctes, paquets_droits_utilisateurs, processus, contexte=(moteur,)):
+        noms_utilisateurs_ok.update(noms)
+        codes_droits.update(codes)
+    mesures.compter('noms_distincts', len(noms_utilisateurs_ok))
+
+    ## dans 'Utilisateurs', il faut séparer les noms et les prénoms
+    utilisateurs_ok = Lignes(3)
+    ambiguites = []
+    if cache is None:
+        index_noms = IndexNoms(noms_utilisateurs_ok)
+        if processus > 1:
+            index_noms.preparer_recherche_approchee()
+        paquets_utilisateurs = par_paquets(utilisateurs, taille_paquet)
+        paquets_demeles = repartir(demeler_utilisateurs, paquets_utilisateurs, processus, contexte=(index_noms,))
+    else:
+        paquets_demeles = [demeler_utilisateurs_avec_cache(utilisateurs, noms_utilisateurs_ok, cache, processus,
+                                                           taille_paquet, mesures)]
+    for utilisateurs_paquet, ambiguites_paquet, compteurs_paquet in paquets_demeles:
+        utilisateurs_ok.extend(utilisateurs_paquet)
+        ambiguites.extend(ambiguite for ambiguite in ambiguites_paquet if ambiguite is not None)
+        mesures.ajouter(compteurs_paquet)
+    mesures.compter('lignes_utilisateurs', len(utilisateurs_ok))
+    mesures.compter('lignes_droits', len(droits_ok))
+    if cache is not None:
+        # toutes les lignes ont été vues : le 2e parcours ne trouvera rien de nouveau
+        cache.enregistrer()
+
+    ## index de jointure, construits une fois ; ce qui empêche une jointure sûre est listé
+    ## avec les ambiguïtés (avant le 2e parcours, qui peut être refait en flux)
+    jointure = JointureDroits(utilisateurs_ok, droits_ok)
+    for compteur, lignes in (('doublons', jointure.doublons()),
+                             ('orphelins', jointure.orphelins(noms_utilisateurs_ok)),
+                             ('codes_inconnus', jointure.codes_inconnus(codes_droits))):
+        ambiguites.extend(lignes)
+        mesures.compter(compteur, len(lignes))
+
+    ## on revient sur 'Droits utilisateurs' (2e parcours) pour remplacer Nom et Prénom par un ID
+    ## d’utilisateur
+    def corriger_droits_utilisateurs_par_paquets():
+        paquets_droits_utilisateurs = par_paquets(droits_utilisateurs, taille_paquet)
+        paquets_corriges = repartir(corriger_paquet_droits_utilisateurs, paquets_droits_utilisateurs, processus,
+                                    contexte=(moteur,))
+        return jointure.joindre(ligne for paquet in paquets_corriges for ligne in paquet)
+    if en_flux:
+        droits_utilisateurs_ok = CalculEnFlux(corriger_droits_utilisateurs_par_paquets)
+    else:
+        droits_utilisateurs_ok = Lignes(3, corriger_droits_utilisateurs_par_paquets())
+    return utilisateurs_ok, droits_ok, droits_utilisateurs_ok, ambiguites
+
+def corriger_droits_utilisateurs(droits_utilisateurs):
+    '''
+    Générateur : normalise chaque ligne de 'Droits utilisateurs' (espaces, numéro et indice
+    du droit) sans rien garder en mémoire.
+    '''
     for nom, prenom, num_droit, indice_droit in droits_utilisateurs:
         nom, prenom = map(supprimer_espaces_en_trop, (nom, prenom))
         code_droit = 'D{:03d}'.format(normaliser_nombre(num_droit))
         indice_droit = normaliser_nombre(indice_droit)
-        droits_utilisateurs_ok.append((nom, prenom, code_droit, indice_droit))
-        noms_utilisateurs_ok.append((nom, prenom))
-    dict_noms_prenoms = map_nom_prenom_pour_comparaison(noms_utilisateurs_ok)
+        yield nom, prenom, code_droit, indice_droit
 
-    ## dans 'Utilisateurs', il faut séparer les noms et les prénoms
+def corriger_colonnes_droits_utilisateurs(paquet):
+    '''
+    Même résultat que corriger_droits_utilisateurs, mais le paquet de lignes est traité
+    colonne par colonne.
+    '''
+    noms, prenoms, nums_droits, indices_droits = zip(*paquet)
+    noms = supprimer_espaces_colonne(noms)
+    prenoms = supprimer_espaces_colonne(prenoms)
+    codes_droits = ['D{:03d}'.format(num_droit) for num_droit in normaliser_nombres_colonne(nums_droits)]
+    indices_droits = normaliser_nombres_colonne(indices_droits)
+    return list(zip(noms, prenoms, codes_droits, indices_droits))
+
+def corriger_paquet_droits_utilisateurs(paquet, moteur='cellules'):
+    if moteur == 'colonnes':
+        return corriger_colonnes_droits_utilisateurs(paquet)
+    return list(corriger_droits_utilisateurs(paquet))
+
+def cles_distinctes(paquet, moteur='cellules'):
+    '''
+    retourne: les couples (nom, prénom) normalisés distincts d’un paquet de lignes de
+        'Droits utilisateurs' et ses codes de droit distincts (dans l’ordre de 1re
+        apparition)
+    '''
+    lignes = corriger_paquet_droits_utilisateurs(paquet, moteur)
+    return (list(dict.fromkeys((nom, prenom) for nom, prenom, _, _ in lignes)),
+            list(dict.fromkeys(code_droit for _, _, code_droit, _ in lignes)))
+
+def demeler_utilisateurs(paquet, index_noms):
+    '''
+    Sépare nom et prénom pour un paquet de lignes de 'Utilisateurs'.
+    retourne: les lignes corrigées, l’ambiguïté rencontrée pour chaque ligne (None si
+        aucune) et les compteurs de la
+        recherche (correspondances exactes, approchées, ambiguës, noms introuvables et
+        utilisation du cache d’asciifier, dans le processus qui a traité le paquet)
+    '''
     utilisateurs_ok = []
-    for user_id, nom_prenom in utilisateurs:
+    ambiguites = []
+    compteurs = collections.Counter()
+    cache_avant = asciifier.cache_info()
+    for user_id, nom_prenom in paquet:
         try:
-            nom, prenom = demeler_nom_prenom(dict_noms_prenoms, nom_prenom)
+            correspondance = demeler_nom_prenom(index_noms, nom_prenom)
         except KeyError:
             nom, prenom = nom_prenom, ''
+            ambiguite = ('Utilisateurs', user_id, nom_prenom, 'nom introuvable', None, None)
+        else:
+            nom, prenom = correspondance.nom_prenom
+            ambiguite = ambiguite_nom_prenom(user_id, nom_prenom, correspondance)
+        compter_correspondance(compteurs, ambiguite)
+        ambiguites.append(ambiguite)
         utilisateurs_ok.append((user_id, nom, prenom))
+    cache_apres = asciifier.cache_info()
+    compteurs['cache_asciifier_succes'] += cache_apres.hits - cache_avant.hits
+    compteurs['cache_asciifier_echecs'] += cache_apres.misses - cache_avant.misses
+    return utilisateurs_ok, ambiguites, compteurs
+
+def compter_correspondance(compteurs, ambiguite):
+    '''
+    Compte une recherche de nom d’après l’ambiguïté qu’elle a donnée (cf. demeler_utilisateurs,
+    ambiguite_nom_prenom) : correspondance exacte ou approchée, ambiguë, ou nom introuvable.
+    '''
+    if ambiguite is None:
+        compteurs['noms_exacts'] += 1
+        return
+    _, _, _, probleme, _, confiance = ambiguite
+    if probleme == 'nom introuvable':
+        compteurs['noms_introuvables'] += 1
+        return
+    compteurs['noms_exacts' if confiance == 1 else 'noms_approches'] += 1
+    if probleme.startswith('correspondance ambiguë'):
+        compteurs['noms_ambigus'] += 1
 
-    ## on revient sur 'Droits utilisateurs' pour remplacer Nom et Prénom par un ID d’utilisateur
-    uid_by_contact = {(nom, prenom): user_id for (user_id, nom, prenom) in utilisateurs_ok}
-    droits_utilisateurs_ok = [
-        (uid_by_contact[(nom, prenom)], code_droit, indice_droit)
-        for (nom, prenom, code_droit, indice_droit) in droits_utilisateurs_ok
-    ]
-    return utilisateurs_ok, droits_ok, droits_utilisateurs_ok
+def demeler_utilisateurs_avec_cache(utilisateurs, noms_de_reference, cache, processus=1,
+                                    taille_paquet=TAILLE_PAQUET, mesures=AUCUNE_MESURE):
+    '''
+    Comme demeler_utilisateurs sur toutes les lignes de 'Utilisateurs', mais les lignes sont
+    d’abord cherchées dans le cache, paquet par paquet : seules celles qui n’y sont pas (ou
+    plus, cf. cache.CacheLignes.chercher_utilisateurs) sont démêlées, puis ajoutées au cache.
+    L’index des noms n’est construit que s’il y en a.
+    noms_de_reference: les couples (nom, prénom) distincts de 'Droits utilisateurs'
+    retourne: comme demeler_utilisateurs ; les compteurs de correspondances portent sur
+        toutes les lignes (celles du cache aussi), ceux du cache d’asciifier sur les seules
+        lignes démêlées à nouveau.
+    '''
+    cache.utiliser_noms_de_reference(noms_de_reference)
+    connues = []
+    absentes = []
+    for paquet in par_paquets(utilisateurs, taille_paquet):
+        connues_paquet = cache.chercher_utilisateurs(paquet)
+        connues.extend(connues_paquet)
+        absentes.extend(ligne for ligne, connue in zip(paquet, connues_paquet) if connue is None)
+    mesures.compter('lignes_en_cache', len(connues) - len(absentes))
+    mesures.compter('lignes_hors_cache', len(absentes))
+    demelees = []
+    compteurs = collections.Counter()
+    if absentes:
+        index_noms = IndexNoms(noms_de_reference)
+        if processus > 1:
+            index_noms.preparer_recherche_approchee()
+        for utilisateurs_ok, ambiguites, compteurs_paquet in repartir(
+                demeler_utilisateurs, par_paquets(absentes, taille_paquet), processus, contexte=(index_noms,)):
+            demelees.extend(zip(utilisateurs_ok, ambiguites))
+            compteurs.update(compteurs_paquet)
+        cache.ajouter_utilisateurs(absentes, demelees)
+    for connue in connues:
+        if connue is not None:
+            # les compteurs valent pour toutes les lignes, comme sans cache
+            compter_correspondance(compteurs, connue[1])
+    demelees = iter(demelees)
+    demelees = [connue if connue is not None else next(demelees) for connue in connues]
+    return [ligne for ligne, _ in demelees], [ambiguite for _, ambiguite in demelees], compteurs
+
+def par_paquets(lignes, taille_paquet):
+    '''
+    Découpe un itérable en listes d’au plus taille_paquet lignes (sans le charger entièrement).
+    '''
+    lignes = iter(lignes)
+    while True:
+        paquet = list(itertools.islice(lignes, taille_paquet))
+        if not paquet:
+            return
+        yield paquet
+
+def repartir(fonction, paquets, processus=1, contexte=()):
+    '''
+    Générateur : produit fonction(paquet, *contexte) pour chaque paquet, dans l’ordre des paquets.
+
+    Avec processus > 1, les paquets sont traités par un pool de processus :
+    - le contexte (ex : l’index des noms) est construit une seule fois, par le processus
+      principal, et transmis à chaque processus à son démarrage plutôt qu’avec chaque paquet ;
+    - au plus 2 paquets par processus sont en cours à un instant donné, pour que la mémoire ne
+      dépende pas de la taille de l’entrée quand les paquets sont lus en flux ;
+    - les résultats sont produits dans l’ordre des paquets : le résultat final est le même
+      qu’en série.
+    Le pool n’est créé qu’au premier résultat demandé et fermé une fois tous les paquets traités.
+    '''
+    if processus <= 1:
+        for paquet in paquets:
+            yield fonction(paquet, *contexte)
+        return
+    import multiprocessing
+    with multiprocessing.Pool(processus, initializer=_initialiser_processus, initargs=(contexte,)) as pool:
+        en_cours = collections.deque()
+        for paquet in paquets:
+            en_cours.append(pool.apply_async(_executer_dans_processus, (fonction, paquet)))
+            if len(en_cours) >= 2 * processus:
+                yield en_cours.popleft().get()
+        while en_cours:
+            yield en_cours.popleft().get()
+
+# contexte transmis à chaque processus du pool par repartir
+_contexte_processus = ()
+
+def _initialiser_processus(contexte):
+    global _contexte_processus
+    _contexte_processus = contexte
+
+def _executer_dans_processus(fonction, paquet):
+    return fonction(paquet, *_contexte_processus)
+
+# en-têtes et largeurs de colonnes des feuilles générées (communs aux deux façons de générer le classeur)
+EN_TETES = {
+    'Utilisateurs': ('User ID', 'Nom', 'Prénom'),
+    'Droits': ('Code', 'Droit'),
+    'Droits utilisateurs': ('User ID', 'Code Droit', 'Indice d’utilisation du droit'),
+    'Qui fait quoi': ('Qui', 'peut', 'Quoi',),
+    'Cohérence': ('Indicateurs globaux', '', '', 'UID', 'unicité UID', 'Nom;Prénom', 'unicité Noms'),
+    'Ambiguïtés': ('Feuille', 'Clé', 'Valeur source', 'Problème', 'Valeur retenue', 'Confiance'),
+}
+LARGEURS_COLONNES = {
+    'Utilisateurs': dict(A=8, B=24, C=24),
+    'Droits': dict(A=8, B=40),
+    'Droits utilisateurs': dict(A=8, B=12, C=27),
+    'Qui fait quoi': dict(A=30, B=7, C=30),
+    'Cohérence': dict(A=30, B=10, C=4, D=9, E=17, F=31, G=19),
+    'Ambiguïtés': dict(A=20, B=10, C=30, D=50, E=30, F=11),
+}
+# tables écrites dans les formats autres que xlsx (cf. sorties.py) : feuille, nom de la table,
+# colonnes (nom, type) et colonnes indexées (jointures sur l’ID utilisateur et le code du droit)
+TABLES = (
+    ('Utilisateurs', 'utilisateurs', (('user_id', str), ('nom', str), ('prenom', str)), ('user_id',)),
+    ('Droits', 'droits', (('code', str), ('droit', str)), ('code',)),
+    ('Droits utilisateurs', 'droits_utilisateurs', (('user_id', str), ('code_droit', str), ('indice_droit', float)),
+     ('user_id', 'code_droit')),
+    ('Ambiguïtés', 'ambiguites', (('feuille', str), ('cle', str), ('valeur_source', str), ('probleme', str),
+                                  ('valeur_retenue', str), ('confiance', float)), ()),
+)
+FORMATS = ('xlsx',) + tuple(sorties.SORTIES)
+# indicateurs globaux de la feuille 'Cohérence' (colonnes A et B, lignes 2 et 3)
+INDICATEURS_GLOBAUX = (
+    ('User ID uniques ?', '=COUNTIF(cles_uid_ok,FALSE) = 0'),
+    ('Noms+Prénoms uniques ?', '=COUNTIF(cles_noms_prenoms_ok,FALSE) = 0'),
+)
 
-def generer_classeur_propre(utilisateurs, droits, droits_utilisateurs):
+# contenu possible des feuilles 'Qui fait quoi' et 'Cohérence' :
+# - 'formules' : une RECHERCHEV par ligne dans 'Qui fait quoi' et deux NB.SI sur toute la plage
+#   par ligne dans 'Cohérence', recalculés par Excel à l’ouverture (coût quadratique) ;
+# - 'valeurs' : les mêmes résultats, calculés en python à la génération (cf. jointure.CalculsExcel) ;
+# - 'valeurs et formules' : les valeurs, plus les formules dans des colonnes supplémentaires
+#   (cf. EN_TETES_FORMULES) pour pouvoir vérifier les valeurs.
+CALCULS = ('formules', 'valeurs', 'valeurs et formules')
+# colonnes supplémentaires en mode 'valeurs et formules' (à droite des colonnes habituelles)
+EN_TETES_FORMULES = {
+    'Qui fait quoi': ('Qui (formule)', 'Quoi (formule)'),
+    'Cohérence': ('unicité UID (formule)', 'unicité Noms (formule)'),
+}
+LARGEURS_COLONNES_FORMULES = {
+    'Qui fait quoi': dict(D=30, E=30),
+    'Cohérence': dict(H=23, I=24),
+}
+
+def en_tetes(titre, calculs='formules'):
+    if calculs == 'valeurs et formules':
+        return EN_TETES[titre] + EN_TETES_FORMULES.get(titre, ())
+    return EN_TETES[titre]
+
+def largeurs_colonnes(titre, calculs='formules'):
+    if calculs == 'valeurs et formules':
+        return dict(LARGEURS_COLONNES[titre], **LARGEURS_COLONNES_FORMULES.get(titre, {}))
+    return LARGEURS_COLONNES[titre]
+
+def generer_classeur_propre(utilisateurs, droits, droits_utilisateurs, ambiguites=(), calculs='formules',
+                            mesures=AUCUNE_MESURE):
+    '''
+    calculs: contenu des feuilles 'Qui fait quoi' et 'Cohérence' (cf. CALCULS).
+    mesures: reçoit le nombre de lignes de 'Droits utilisateurs' et de cellules stylées.
+    '''
+    import openpyxl
     wb = openpyxl.Workbook()
+    jointures = CalculsExcel(utilisateurs, droits) if calculs != 'formules' else None
 
     # 1) remplir les feuilles avec les données propres
+    #    (les styles sont posés sur les cellules au moment où on les ajoute : en-têtes en gras,
+    #    format "pourcentage" pour la colonne C de 'Droits utilisateurs')
     feuille_utilisateurs = wb.active
     feuille_utilisateurs.title = 'Utilisateurs'
-    feuille_utilisateurs.append(('User ID', 'Nom', 'Prénom'))
+    feuille_utilisateurs.append(cellules_en_tete(feuille_utilisateurs, EN_TETES['Utilisateurs']))
     for ligne in utilisateurs:
         feuille_utilisateurs.append(ligne)
 
     feuille_droits = wb.create_sheet(title='Droits')
-    feuille_droits.append(('Code', 'Droit'))
+    feuille_droits.append(cellules_en_tete(feuille_droits, EN_TETES['Droits']))
     for ligne in droits:
         feuille_droits.append(ligne)
 
     feuille_droits_utilisateurs = wb.create_sheet(title='Droits utilisateurs')
-    feuille_droits_utilisateurs.append(('User ID', 'Code Droit', 'Indice d’utilisation du droit'))
-    for ligne in droits_utilisateurs:
-        feuille_droits_utilisateurs.append(ligne)
+    feuille_droits_utilisateurs.append(cellules_en_tete(feuille_droits_utilisateurs, EN_TETES['Droits utilisateurs']))
+    pourcentage = StyleResolu(feuille_droits_utilisateurs, 'Percent')
+    # droits_utilisateurs peut être recalculé à chaque parcours (cf. CalculEnFlux) : on compte
+    # les lignes au passage plutôt que d’utiliser len()
+    nb_droits_utilisateurs = 0
+    for user_id, code_droit, indice_droit in droits_utilisateurs:
+        feuille_droits_utilisateurs.append((user_id, code_droit, pourcentage.cellule(indice_droit)))
+        nb_droits_utilisateurs += 1
 
     # 2) créer la feuille 'Qui fait quoi' avec une formule pour indiquer qui a quel droit de façon lisible
-    #    Note : Dans le format xlsx, les formules et les conventions suivent toujours le format anglais.
+    #    Note : Dans le format xlsx, les formules et les conventions suivent toujours le format anglais.
     #           C’est Excel qui se charge de les traduire selon la configuration.
     #           Du coup, dans openpyxl, tout est en anglais. 
     #           Si j’ouvre avec Excel (configuré en français) un classeur créé par openpyxl, je verrai bien
@@ -154,221 +624,810 @@ def generer_classeur_propre(utilisateurs, droits, droits_utilisateurs):
     #           avec des virgules et non des points, etc.
 
     feuille_qui_fait_quoi = wb.create_sheet(title='Qui fait quoi')
-    feuille_qui_fait_quoi.append(('Qui', 'peut', 'Quoi',))
-
-    plage_utilisateurs = '$A$2:$C${derniere_ligne}'.format(derniere_ligne = len(utilisateurs) + 1)
-    plage_droits = '$A$2:$B${derniere_ligne}'.format(derniere_ligne = len(droits) + 1)
-
-    wb.create_named_range('utilisateurs', feuille_utilisateurs, plage_utilisateurs)
-    wb.create_named_range('droits', feuille_droits, plage_droits)   
-
-    droits_utilisateurs_code_utilisateur = ''''Droits utilisateurs'!A{num_ligne:d}'''
-    droits_utilisateurs_code_droit = ''''Droits utilisateurs'!B{num_ligne:d}'''
-    formule_nom_par_id = '''VLOOKUP(%s,utilisateurs,2)'''%droits_utilisateurs_code_utilisateur
-    formule_prenom_par_id = '''VLOOKUP(%s,utilisateurs,3)'''%droits_utilisateurs_code_utilisateur
-    formule_prenom_nom_par_id = '''={} & " " & {}'''.format(formule_prenom_par_id, formule_nom_par_id)
-    formule_droit_par_id = '''=LOWER(VLOOKUP(%s,droits,2))'''%droits_utilisateurs_code_droit
-    for n in range(len(droits_utilisateurs)):
+    feuille_qui_fait_quoi.append(cellules_en_tete(feuille_qui_fait_quoi, en_tetes('Qui fait quoi', calculs)))
+    # (les lignes de 'Droits utilisateurs' sont relues dans la feuille : droits_utilisateurs a
+    # déjà été parcouru)
+    lignes_droits_utilisateurs = feuille_droits_utilisateurs.iter_rows(min_row = 2, values_only = True)
+    for n, (user_id, code_droit, _) in enumerate(lignes_droits_utilisateurs):
         num_ligne = n + 2 # +1 car une énumération python commence à 0 alors qu’Excel commence à 1, et +1 encore car saute l’en-tête
-        aX = formule_prenom_nom_par_id.format(num_ligne = num_ligne)
-        bX = 'peut'
-        cX = formule_droit_par_id.format(num_ligne = num_ligne)
-        feuille_qui_fait_quoi.append((aX, bX, cX))
+        feuille_qui_fait_quoi.append(cellules_qui_fait_quoi(num_ligne, user_id, code_droit, calculs, jointures))
 
     # 3) créer la feuille 'Cohérence' avec une formule pour détecter les doublons
     feuille_coherence = wb.create_sheet(title='Cohérence')
-    feuille_coherence.append(('Indicateurs globaux', '', '', 'UID', 'unicité UID', 'Nom;Prénom', 'unicité Noms'))
+    feuille_coherence.append(cellules_en_tete(feuille_coherence, en_tetes('Cohérence', calculs)))
     # 3.1) fusionner A1 et B1 dans la feuille de cohérence (cellule de titre)
     feuille_coherence.merge_cells('A1:B1')
     # 3.2) unicité de l’ID utilisateur et du prénom
     for n in range(len(utilisateurs)):
         num_ligne = n + 2
-        valeurs = dict(
-            D = '''='Utilisateurs'!A{X}'''.format(X=num_ligne),
-            E = '=COUNTIF(cles_uid,D{X}) = 1'.format(X=num_ligne),
-            F = '''='Utilisateurs'!B{X} & ";" & 'Utilisateurs'!C{X}'''.format(X=num_ligne),
-            G = '=COUNTIF(cles_noms_prenoms,F{X}) = 1'.format(X=num_ligne)
-        )
+        valeurs = cellules_coherence(num_ligne, calculs, jointures)
         for col in valeurs:
             feuille_coherence['{}{}'.format(col, num_ligne)].value = valeurs[col]
-    # 3.3) création des plages nommées pour faciliter les formules
-    plage_D = '$D$2:$D${max}'.format(max=len(utilisateurs)+1)
-    plage_E = '$E$2:$E${max}'.format(max=len(utilisateurs)+1)
-    plage_F = '$F$2:$F${max}'.format(max=len(utilisateurs)+1)
-    plage_G = '$G$2:$G${max}'.format(max=len(utilisateurs)+1)
-    wb.create_named_range('cles_uid', feuille_coherence, plage_D)
-    wb.create_named_range('cles_uid_ok', feuille_coherence, plage_E)
-    wb.create_named_range('cles_noms_prenoms', feuille_coherence, plage_F)
-    wb.create_named_range('cles_noms_prenoms_ok', feuille_coherence, plage_G)
-
-    # 3.4) ajout des formules de "cohérence globale"
-    feuille_coherence['A2'].value = 'User ID uniques ?'
-    feuille_coherence['B2'].value = '=COUNTIF(cles_uid_ok,FALSE) = 0'
-    feuille_coherence['A3'].value = 'Noms+Prénoms uniques ?'
-    feuille_coherence['B3'].value = '=COUNTIF(cles_noms_prenoms_ok,FALSE) = 0'
-    plage_indicateurs_globaux = '$B$2:$B$3'
+    # 3.3) ajout des formules de "cohérence globale"
+    for num_ligne, (libelle, formule) in enumerate(indicateurs_globaux(calculs, jointures), 2):
+        feuille_coherence['A%d'%num_ligne].value = libelle
+        feuille_coherence['B%d'%num_ligne].value = formule
 
-    # 4) après le contenu, la forme (styles, formatage, etc.) :
+    # 3bis) lister les ambiguïtés rencontrées pendant la correction
+    feuille_ambiguites = wb.create_sheet(title='Ambiguïtés')
+    feuille_ambiguites.append(cellules_en_tete(feuille_ambiguites, EN_TETES['Ambiguïtés']))
+    for ligne in ambiguites:
+        feuille_ambiguites.append(ligne)
+
+    # 4) après le contenu, le reste de la forme (largeurs, formatage, etc.) :
     # 4.1) ajuster la largeur des colonnes
-    definir_largeur_colonnes(feuille_utilisateurs, dict(A=8, B=24, C=24))
-    definir_largeur_colonnes(feuille_droits, dict(A=8, B=40))
-    definir_largeur_colonnes(feuille_droits_utilisateurs, dict(A=8, B=12, C=27))
-    definir_largeur_colonnes(feuille_qui_fait_quoi, dict(A=30, B=7, C=30))
-    definir_largeur_colonnes(feuille_coherence, dict(A=30, B=10, C=4, D=9, E=17, F=31, G=19))
-    # 4.2) en-têtes en gras
-    def mettre_style_en_tete(cellule):
-        cellule.style = STYLES.HEADER
-    appliquer_a_plage(mettre_style_en_tete, feuille_utilisateurs['A1:C1'])
-    appliquer_a_plage(mettre_style_en_tete, feuille_droits['A1:B1'])
-    appliquer_a_plage(mettre_style_en_tete, feuille_droits_utilisateurs['A1:C1'])
-    appliquer_a_plage(mettre_style_en_tete, feuille_qui_fait_quoi['A1:C1'])
-    appliquer_a_plage(mettre_style_en_tete, feuille_coherence['A1:G1'])
-    # 4.3) appliquer le format "pourcentage" aux nombres de la colonne C dans 'Droits utilisateurs'
-    def format_pourcentage(cellule):
-        cellule.style = 'Percent'
-    derniere_ligne_de_droits_utilisateurs = len(droits_utilisateurs) + 1
-    appliquer_a_plage(format_pourcentage, feuille_droits_utilisateurs['C2:C%d'%derniere_ligne_de_droits_utilisateurs])
-    # 4.4) formatage conditionnel
-    feuille_coherence.conditional_formatting.add('$E$2:$E${max}'.format(max=len(utilisateurs)+1), STYLES.HIGHLIGHT_FALSE_IN_RED)
-    feuille_coherence.conditional_formatting.add('$G$2:$G${max}'.format(max=len(utilisateurs)+1), STYLES.HIGHLIGHT_FALSE_IN_RED)
-    feuille_coherence.conditional_formatting.add(plage_indicateurs_globaux, STYLES.HIGHLIGHT_FALSE_IN_RED)
-    feuille_coherence.conditional_formatting.add(plage_indicateurs_globaux, STYLES.HIGHLIGHT_TRUE_IN_GREEN)
-    # 4.5) mise sous forme de tableau de la plage de vérifications de la feuille 'Cohérence'
-    table_qui_fait_quoi = Table(displayName='Tableau_Qui_fait_quoi',
-                                ref='$A$1:$C${max}'.format(max=len(droits_utilisateurs)+1),
-                                tableStyleInfo=STYLES.PURPLE_TABLE)
-    feuille_qui_fait_quoi.add_table(table_qui_fait_quoi)
-    # 4.6) mise sous forme de tableau de la plage de vérifications de la feuille 'Cohérence'
-    table_verifications = Table(displayName='Tableau_Vérifications',
-                                ref='$D$1:$G${max}'.format(max=len(utilisateurs)+1),
-                                tableStyleInfo=STYLES.BLUE_TABLE)
-    feuille_coherence.add_table(table_verifications)
+    feuilles = (feuille_utilisateurs, feuille_droits, feuille_droits_utilisateurs, feuille_qui_fait_quoi, feuille_coherence,
+                feuille_ambiguites)
+    for feuille in feuilles:
+        definir_largeur_colonnes(feuille, largeurs_colonnes(feuille.title, calculs))
+    # 4.2) format "pourcentage" par défaut pour la colonne C de 'Droits utilisateurs' (valeurs
+    #      saisies plus tard dans Excel)
+    pourcentage.appliquer_a_colonne('C')
+    compter_lignes_et_styles(mesures, nb_droits_utilisateurs, calculs)
+    # 4.3) plages nommées, formatage conditionnel et tableaux
+    declarer_plages_et_tableaux(wb, len(utilisateurs), len(droits), nb_droits_utilisateurs, calculs)
     wb.active = feuille_coherence
     return wb
 
-def supprimer_espaces_en_trop(valeur_brute):
-    return re.sub('  +', ' ', valeur_brute).strip()
-
-def normaliser_nombre(valeur_brute):
-    t = type(valeur_brute)
-    if t not in (int, float, str):
-        raise TypeError('valeur_brute should be either int, float or str')
-    if t is str:
-        valeur_brute = valeur_brute.replace(' ', '')
-        valeur_brute = valeur_brute.replace(',', '.')
-
-        # gérer le cas des pourcentages
-        multiplier_par = 1
-        if valeur_brute.endswith('%'):
-            multiplier_par = 0.01
-            valeur_brute = valeur_brute[:-1]
-        if re.match('\d+$', valeur_brute):
-            return multiplier_par * int(valeur_brute)
-        return multiplier_par * float(valeur_brute)
-    elif t in (int, float):
-        return valeur_brute
-
-def asciifier(chaine):
-    '''
-    Supprime les diacritiques (accents, points, cédilles, etc.) et défait les ligatures.
-    Passe le tout en minuscules.
-    Note : cette fonction ne latinisera pas les systèmes d’écriture non latins
-    (cyrillique, CJK, etc.) – ce serait beaucoup plus compliqué
-    '''
-    return (
-        unicodedata.normalize(
-            'NFKD',
-            (
-                chaine.lower()
-                .replace('œ', 'oe') # ligatures et autres non gérés par unicodedata
-                .replace('æ', 'ae')
-                .replace('ĳ', 'ij')
-                .replace('ß', 'ss')
-                .replace('ǉ', 'lj')
-                .replace('ǌ', 'nj')
-                .replace('ﬆ', 'st')
-                .replace('ﬅ', 'ft')
-                .replace('ǳ', 'dz')
-                .replace('ﬀ', 'ff')
-                .replace('ſ', 's') # s long
-                .replace(' ', ' ') # espace insécable fine
-                .replace(' ', ' ') # espace insécable normale
-                .replace('\t', ' ') # tabulation
-                .replace(' ', '')
-                .replace('—', '') # tiret cadratin
-                .replace('–', '') # tiret
-                .replace('-', '') # signe moins
-                .replace('’', '') # apostrophe courbe
-                .replace("'", '') # apostrophe droite
-            ))
-        .encode('ascii', 'ignore') # supprime les caractères non ascii
-        .decode('ascii') # retransforme l’objet 'bytes' en 'str'
+def generer_classeur_propre_en_flux(utilisateurs, droits, droits_utilisateurs, ambiguites=(), calculs='formules',
+                                    mesures=AUCUNE_MESURE):
+    '''
+    Produit le même classeur que generer_classeur_propre, mais avec un classeur openpyxl en
+    écriture seule (write_only=True) : chaque ligne est écrite dans un fichier temporaire dès
+    qu’elle est ajoutée, la mémoire utilisée ne dépend donc pas du nombre de lignes.
+
+    Contraintes de ce mode :
+    - les largeurs et styles de colonnes doivent être déclarés avant d’écrire la moindre
+      ligne (cf. preparer_classeur_en_flux) ;
+    - on ne peut pas revenir sur une cellule déjà écrite : les styles sont posés sur les
+      cellules au moment où on les ajoute, et les feuilles 'Droits utilisateurs' et
+      'Qui fait quoi' sont remplies dans la même boucle (droits_utilisateurs peut être
+      recalculé à chaque parcours, cf. CalculEnFlux : on ne le parcourt qu’une fois) ;
+    - les plages nommées, tableaux et formats conditionnels ne sont écrits qu’à
+      l’enregistrement : on les déclare une fois le nombre de lignes connu.
+    '''
+    # 1) la forme qui doit précéder le contenu
+    wb, pourcentage = preparer_classeur_en_flux(calculs)
+    jointures = CalculsExcel(utilisateurs, droits) if calculs != 'formules' else None
+    donnees = (utilisateurs, droits, droits_utilisateurs, ambiguites)
+
+    # 2) le contenu, ligne par ligne
+    for titre in ('Utilisateurs', 'Droits'):
+        for ligne in lignes_feuille_propre(titre, donnees, pourcentage, calculs, jointures):
+            wb[titre].append(ligne)
+    nb_droits_utilisateurs = 0
+    for user_id, code_droit, indice_droit in droits_utilisateurs:
+        wb['Droits utilisateurs'].append((user_id, code_droit, pourcentage.cellule(indice_droit)))
+        wb['Qui fait quoi'].append(
+            cellules_qui_fait_quoi(nb_droits_utilisateurs + 2, user_id, code_droit, calculs, jointures))
+        nb_droits_utilisateurs += 1
+    for titre in ('Cohérence', 'Ambiguïtés'):
+        for ligne in lignes_feuille_propre(titre, donnees, pourcentage, calculs, jointures):
+            wb[titre].append(ligne)
+    compter_lignes_et_styles(mesures, nb_droits_utilisateurs, calculs)
+
+    # 3) ce qui n’est écrit qu’à l’enregistrement
+    terminer_classeur_en_flux(wb, len(utilisateurs), len(droits), nb_droits_utilisateurs, calculs)
+    return wb
+
+def preparer_classeur_en_flux(calculs='formules'):
+    '''
+    Classeur en écriture seule avec la forme qui doit précéder le contenu : ses feuilles,
+    les largeurs de colonnes, le format "pourcentage" par défaut de la colonne C de
+    'Droits utilisateurs' (écrit avec la 1re ligne de la feuille) et les en-têtes.
+    retourne: le classeur et le style "pourcentage" (cf. StyleResolu) de ses cellules
+    '''
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    for titre in EN_TETES:
+        wb.create_sheet(title=titre)
+    pourcentage = StyleResolu(wb['Droits utilisateurs'], 'Percent')
+    pourcentage.appliquer_a_colonne('C')
+    for feuille in wb.worksheets:
+        definir_largeur_colonnes(feuille, largeurs_colonnes(feuille.title, calculs))
+        feuille.append(cellules_en_tete(feuille, en_tetes(feuille.title, calculs)))
+    wb['Cohérence'].merged_cells.add('A1:B1')
+    return wb, pourcentage
+
+def terminer_classeur_en_flux(wb, nb_utilisateurs, nb_droits, nb_droits_utilisateurs, calculs='formules'):
+    declarer_plages_et_tableaux(wb, nb_utilisateurs, nb_droits, nb_droits_utilisateurs, calculs)
+    wb.active = wb.sheetnames.index('Cohérence')
+
+def lignes_feuille_propre(titre, donnees, pourcentage, calculs='formules', jointures=None):
+    '''
+    Générateur : les lignes (sans l’en-tête) de la feuille titre du classeur propre.
+    donnees: les données propres (cf. analyser_et_corriger)
+    '''
+    utilisateurs, droits, droits_utilisateurs, ambiguites = donnees
+    if titre == 'Utilisateurs':
+        yield from utilisateurs
+    elif titre == 'Droits':
+        yield from droits
+    elif titre == 'Droits utilisateurs':
+        for user_id, code_droit, indice_droit in droits_utilisateurs:
+            yield user_id, code_droit, pourcentage.cellule(indice_droit)
+    elif titre == 'Qui fait quoi' and calculs == 'formules':
+        # les formules ne dépendent que du numéro de ligne
+        for num_ligne in range(2, len(droits_utilisateurs) + 2):
+            yield ligne_qui_fait_quoi(num_ligne)
+    elif titre == 'Qui fait quoi':
+        for num_ligne, (user_id, code_droit, _) in enumerate(droits_utilisateurs, 2):
+            yield cellules_qui_fait_quoi(num_ligne, user_id, code_droit, calculs, jointures)
+    elif titre == 'Cohérence':
+        # les lignes 2 et 3 portent aussi les indicateurs globaux (colonnes A et B)
+        indicateurs = indicateurs_globaux(calculs, jointures)
+        for n in range(max(len(utilisateurs), len(indicateurs))):
+            num_ligne = n + 2
+            ligne = [None] * len(en_tetes('Cohérence', calculs))
+            if n < len(indicateurs):
+                ligne[0:2] = indicateurs[n]
+            if n < len(utilisateurs):
+                ligne[3:] = cellules_coherence(num_ligne, calculs, jointures).values()
+            yield ligne
+    else:
+        yield from ambiguites
+
+def generer_classeur_propre_en_parallele(utilisateurs, droits, droits_utilisateurs, ambiguites=(),
+                                         calculs='formules', processus=6, mesures=AUCUNE_MESURE):
+    '''
+    Produit le même classeur que generer_classeur_propre_en_flux, mais chaque feuille est
+    écrite par un processus différent (cf. generer_feuille_en_flux) : la durée est celle de
+    la plus grosse feuille plutôt que la somme des six.
+
+    Chaque processus enregistre un classeur complet où seule sa feuille est remplie (les
+    autres n’ont que leur en-tête) ; le classeur propre est assemblé à l’enregistrement (cf.
+    ClasseurAssemble). Les données doivent être en mémoire : leur nombre de lignes est
+    connu d’avance, chaque processus peut donc déclarer les plages, tableaux et formats
+    conditionnels du classeur entier.
+
+    Chaque processus ne reçoit que les données de sa feuille (cf. donnees_de_la_feuille) et
+    le nombre de lignes de chacune.
+    '''
+    donnees = (utilisateurs, droits, droits_utilisateurs, ambiguites)
+    feuilles = [(titre, donnees_de_la_feuille(titre, donnees, calculs)) for titre in EN_TETES]
+    nombres_lignes = (len(utilisateurs), len(droits), len(droits_utilisateurs))
+    dossier = tempfile.mkdtemp(prefix='nettoyage-')
+    try:
+        chemins = list(repartir(generer_feuille_en_flux, feuilles, min(processus, len(EN_TETES)),
+                                (nombres_lignes, calculs, dossier)))
+    except BaseException:
+        shutil.rmtree(dossier)
+        raise
+    compter_lignes_et_styles(mesures, len(droits_utilisateurs), calculs)
+    return ClasseurAssemble(dict(zip(EN_TETES, chemins)), dossier)
+
+def donnees_de_la_feuille(titre, donnees, calculs='formules'):
+    '''
+    retourne: les données propres (cf. analyser_et_corriger) dont lignes_feuille_propre a
+        besoin pour la feuille titre ; les autres sont remplacées par () et, quand seul leur
+        nombre de lignes compte (formules de 'Qui fait quoi' et 'Cohérence'), par un range.
+    '''
+    utilisateurs, droits, droits_utilisateurs, ambiguites = donnees
+    if titre == 'Utilisateurs':
+        return utilisateurs, (), (), ()
+    if titre == 'Droits':
+        return (), droits, (), ()
+    if titre == 'Droits utilisateurs':
+        return (), (), droits_utilisateurs, ()
+    if titre == 'Qui fait quoi':
+        if calculs == 'formules':
+            return (), (), range(len(droits_utilisateurs)), ()
+        return utilisateurs, droits, droits_utilisateurs, ()
+    if titre == 'Cohérence':
+        if calculs == 'formules':
+            return range(len(utilisateurs)), (), (), ()
+        return utilisateurs, droits, (), ()
+    return (), (), (), ambiguites
+
+def generer_feuille_en_flux(feuille, nombres_lignes, calculs, dossier):
+    '''
+    Dans un processus de generer_classeur_propre_en_parallele : enregistre dans dossier le
+    classeur propre où seule la feuille est remplie.
+    feuille: son titre et ses données (cf. donnees_de_la_feuille)
+    nombres_lignes: les nombres de lignes de 'Utilisateurs', 'Droits' et 'Droits utilisateurs'
+    retourne: le chemin du classeur
+    '''
+    titre, donnees = feuille
+    utilisateurs, droits, _, _ = donnees
+    wb, pourcentage = preparer_classeur_en_flux(calculs)
+    jointures = None
+    if calculs != 'formules' and titre in ('Qui fait quoi', 'Cohérence'):
+        jointures = CalculsExcel(utilisateurs, droits)
+    for ligne in lignes_feuille_propre(titre, donnees, pourcentage, calculs, jointures):
+        wb[titre].append(ligne)
+    terminer_classeur_en_flux(wb, *nombres_lignes, calculs)
+    chemin = os.path.join(dossier, '{}.xlsx'.format(wb.sheetnames.index(titre)))
+    wb.save(chemin)
+    return chemin
+
+class ClasseurAssemble:
+    '''
+    Classeur propre écrit par generer_classeur_propre_en_parallele : un classeur par feuille,
+    dans un dossier temporaire. save() écrit le classeur propre, qui reprend tous les
+    fichiers du 1er classeur sauf le XML des feuilles, pris chacun dans le classeur où la
+    feuille est remplie, puis supprime le dossier temporaire (save ne sert donc qu’une
+    fois).
+
+    Les cellules font référence aux styles du classeur par leur numéro : on vérifie que tous
+    les classeurs ont les mêmes (ils déclarent les mêmes styles dans le même ordre, cf.
+    preparer_classeur_en_flux).
+    '''
+    def __init__(self, classeurs_par_feuille, dossier):
+        self.classeurs_par_feuille = classeurs_par_feuille
+        self.dossier = dossier
+
+    def save(self, chemin):
+        try:
+            classeurs = {titre: ClasseurXml(chemin_classeur)
+                         for titre, chemin_classeur in self.classeurs_par_feuille.items()}
+            try:
+                self.assembler(classeurs, chemin)
+            finally:
+                for classeur in classeurs.values():
+                    classeur.close()
+        finally:
+            shutil.rmtree(self.dossier)
+
+    def assembler(self, classeurs, chemin):
+        base = next(iter(classeurs.values()))
+        styles = base.zip.read('xl/styles.xml')
+        for titre, classeur in classeurs.items():
+            if classeur.zip.read('xl/styles.xml') != styles:
+                raise ValueError('les styles du classeur de la feuille {!r} diffèrent des autres'.format(titre))
+        origines = {classeur.feuilles[titre]: classeur for titre, classeur in classeurs.items()}
+        with zipfile.ZipFile(chemin, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as sortie:
+            for info in base.zip.infolist():
+                origine = origines.get(info.filename, base)
+                with origine.zip.open(info.filename) as source, sortie.open(info.filename, 'w') as destination:
+                    shutil.copyfileobj(source, destination, 1 << 20)
+
+def tables_propres(utilisateurs, droits, droits_utilisateurs, ambiguites=()):
+    '''
+    retourne: les données propres (cf. analyser_et_corriger) sous forme de sorties.Table
+    '''
+    lignes = (utilisateurs, droits, droits_utilisateurs, ambiguites)
+    return [sorties.Table(nom, colonnes, lignes_table, index)
+            for (_, nom, colonnes, index), lignes_table in zip(TABLES, lignes)]
+
+def compter_lignes_et_styles(mesures, nb_droits_utilisateurs, calculs='formules'):
+    # cellules stylées : les en-têtes de chaque feuille et la colonne C de 'Droits utilisateurs'
+    mesures.compter('lignes_droits_utilisateurs', nb_droits_utilisateurs)
+    mesures.compter('cellules_stylees', sum(len(en_tetes(titre, calculs)) for titre in EN_TETES)
+                    + nb_droits_utilisateurs)
+
+def ligne_qui_fait_quoi(num_ligne):
+    '''
+    Formules de la ligne num_ligne de 'Qui fait quoi' : prénom, nom et libellé du droit
+    retrouvés à partir de la même ligne de 'Droits utilisateurs'.
+    '''
+    droits_utilisateurs_code_utilisateur = ''''Droits utilisateurs'!A{num_ligne:d}'''.format(num_ligne = num_ligne)
+    droits_utilisateurs_code_droit = ''''Droits utilisateurs'!B{num_ligne:d}'''.format(num_ligne = num_ligne)
+    # correspondance exacte (4e argument FALSE) : sans lui, RECHERCHEV suppose la 1re colonne
+    # triée et retourne la ligne de la plus grande valeur inférieure ou égale à celle cherchée
+    formule_nom_par_id = '''VLOOKUP(%s,utilisateurs,2,FALSE)'''%droits_utilisateurs_code_utilisateur
+    formule_prenom_par_id = '''VLOOKUP(%s,utilisateurs,3,FALSE)'''%droits_utilisateurs_code_utilisateur
+    formule_prenom_nom_par_id = '''={} & " " & {}'''.format(formule_prenom_par_id, formule_nom_par_id)
+    formule_droit_par_id = '''=LOWER(VLOOKUP(%s,droits,2,FALSE))'''%droits_utilisateurs_code_droit
+    return (formule_prenom_nom_par_id, 'peut', formule_droit_par_id)
+
+def formules_coherence(num_ligne):
+    '''
+    Formules des colonnes D à G de la ligne num_ligne de 'Cohérence' (unicité de l’ID
+    utilisateur et du couple nom/prénom de la même ligne de 'Utilisateurs').
+    '''
+    return dict(
+        D = '''='Utilisateurs'!A{X}'''.format(X=num_ligne),
+        E = '=COUNTIF(cles_uid,D{X}) = 1'.format(X=num_ligne),
+        F = '''='Utilisateurs'!B{X} & ";" & 'Utilisateurs'!C{X}'''.format(X=num_ligne),
+        G = '=COUNTIF(cles_noms_prenoms,F{X}) = 1'.format(X=num_ligne)
     )
 
-def map_nom_prenom_pour_comparaison(liste_noms_prenoms):
-    return {asciifier(nom + prenom): (nom, prenom) for (nom, prenom) in set(liste_noms_prenoms)}
+def cellules_qui_fait_quoi(num_ligne, user_id, code_droit, calculs='formules', jointures=None):
+    '''
+    Ligne num_ligne de 'Qui fait quoi' selon calculs (cf. CALCULS).
+    '''
+    formules = ligne_qui_fait_quoi(num_ligne)
+    if calculs == 'formules':
+        return formules
+    valeurs = jointures.qui_fait_quoi(user_id, code_droit)
+    if calculs == 'valeurs':
+        return valeurs
+    return valeurs + (formules[0], formules[2])
+
+def cellules_coherence(num_ligne, calculs='formules', jointures=None):
+    '''
+    Colonnes D à G (et H, I en mode 'valeurs et formules') de la ligne num_ligne de
+    'Cohérence' selon calculs (cf. CALCULS).
+    '''
+    formules = formules_coherence(num_ligne)
+    if calculs == 'formules':
+        return formules
+    valeurs = jointures.coherence(num_ligne - 2)
+    if calculs == 'valeurs et formules':
+        valeurs.update(H = formules['E'], I = formules['G'])
+    return valeurs
+
+def indicateurs_globaux(calculs='formules', jointures=None):
+    '''
+    Libellés et contenus des indicateurs globaux de 'Cohérence' (cf. INDICATEURS_GLOBAUX).
+    '''
+    if calculs == 'formules':
+        return INDICATEURS_GLOBAUX
+    return tuple(zip((libelle for libelle, _ in INDICATEURS_GLOBAUX), jointures.indicateurs_globaux()))
 
-def demeler_nom_prenom(dict_reference, nom_prenom):
-    cle = asciifier(nom_prenom)
-    if cle in dict_reference:
-        return dict_reference[cle]
+def declarer_plages_et_tableaux(wb, nb_utilisateurs, nb_droits, nb_droits_utilisateurs, calculs='formules'):
+    '''
+    Plages nommées, formatage conditionnel et tableaux du classeur propre. Ne dépend que du
+    nombre de lignes de chaque feuille (et des colonnes ajoutées selon calculs), pas de leur
+    contenu.
+    '''
+    from openpyxl.worksheet.table import Table
+    styles = styles_excel()
+    feuille_utilisateurs = wb['Utilisateurs']
+    feuille_droits = wb['Droits']
+    feuille_qui_fait_quoi = wb['Qui fait quoi']
+    feuille_coherence = wb['Cohérence']
+
+    # plages nommées utilisées par les formules de 'Qui fait quoi'
+    plage_utilisateurs = '$A$2:$C${derniere_ligne}'.format(derniere_ligne = nb_utilisateurs + 1)
+    plage_droits = '$A$2:$B${derniere_ligne}'.format(derniere_ligne = nb_droits + 1)
+    nommer_plage(wb, 'utilisateurs', feuille_utilisateurs, plage_utilisateurs)
+    nommer_plage(wb, 'droits', feuille_droits, plage_droits)
+
+    # plages nommées pour faciliter les formules de 'Cohérence'
+    plage_D = '$D$2:$D${max}'.format(max=nb_utilisateurs+1)
+    plage_E = '$E$2:$E${max}'.format(max=nb_utilisateurs+1)
+    plage_F = '$F$2:$F${max}'.format(max=nb_utilisateurs+1)
+    plage_G = '$G$2:$G${max}'.format(max=nb_utilisateurs+1)
+    nommer_plage(wb, 'cles_uid', feuille_coherence, plage_D)
+    nommer_plage(wb, 'cles_uid_ok', feuille_coherence, plage_E)
+    nommer_plage(wb, 'cles_noms_prenoms', feuille_coherence, plage_F)
+    nommer_plage(wb, 'cles_noms_prenoms_ok', feuille_coherence, plage_G)
+
+    # formatage conditionnel
+    plage_indicateurs_globaux = '$B$2:$B$3'
+    feuille_coherence.conditional_formatting.add(plage_E, styles.HIGHLIGHT_FALSE_IN_RED)
+    feuille_coherence.conditional_formatting.add(plage_G, styles.HIGHLIGHT_FALSE_IN_RED)
+    if calculs == 'valeurs et formules':
+        plage_formules = '$H$2:$I${max}'.format(max=nb_utilisateurs+1)
+        feuille_coherence.conditional_formatting.add(plage_formules, styles.HIGHLIGHT_FALSE_IN_RED)
+    feuille_coherence.conditional_formatting.add(plage_indicateurs_globaux, styles.HIGHLIGHT_FALSE_IN_RED)
+    feuille_coherence.conditional_formatting.add(plage_indicateurs_globaux, styles.HIGHLIGHT_TRUE_IN_GREEN)
+
+    # mise sous forme de tableau de la feuille 'Qui fait quoi'
+    derniere_colonne = 'E' if calculs == 'valeurs et formules' else 'C'
+    table_qui_fait_quoi = Table(displayName='Tableau_Qui_fait_quoi',
+                                ref='$A$1:${col}${max}'.format(col=derniere_colonne, max=nb_droits_utilisateurs+1),
+                                tableStyleInfo=styles.PURPLE_TABLE)
+    declarer_colonnes_tableau(table_qui_fait_quoi, en_tetes('Qui fait quoi', calculs))
+    ajouter_tableau(feuille_qui_fait_quoi, table_qui_fait_quoi)
+    # mise sous forme de tableau de la plage de vérifications de la feuille 'Cohérence'
+    derniere_colonne = 'I' if calculs == 'valeurs et formules' else 'G'
+    table_verifications = Table(displayName='Tableau_Vérifications',
+                                ref='$D$1:${col}${max}'.format(col=derniere_colonne, max=nb_utilisateurs+1),
+                                tableStyleInfo=styles.BLUE_TABLE)
+    declarer_colonnes_tableau(table_verifications, en_tetes('Cohérence', calculs)[3:])
+    ajouter_tableau(feuille_coherence, table_verifications)
+
+def nommer_plage(wb, nom, feuille, plage):
+    '''
+    Comme wb.create_named_range(nom, feuille, plage), obsolète depuis openpyxl 3.1 (son
+    avertissement ferait échouer le nettoyage avec -W error).
+    '''
+    from openpyxl.utils import quote_sheetname
+    from openpyxl.workbook.defined_name import DefinedName
+    definition = DefinedName(name=nom, attr_text='{}!{}'.format(quote_sheetname(feuille.title), plage))
+    if hasattr(wb.defined_names, 'add'):
+        wb.defined_names.add(definition)
     else:
-        raise KeyError("'nom_prenom' ({}) introuvable dans dict_reference.".format(repr(nom_prenom)))
+        # openpyxl < 3.1
+        wb.defined_names.append(definition)
+
+def declarer_colonnes_tableau(table, titres):
+    '''
+    En écriture seule, openpyxl ne peut pas relire les en-têtes d’un tableau dans la feuille :
+    on déclare ses colonnes nous-mêmes (c’est aussi ce qu’il ferait à partir des en-têtes).
+    '''
+    from openpyxl.worksheet.table import TableColumn
+    table.tableColumns = [TableColumn(id=num, name=titre) for num, titre in enumerate(titres, 1)]
+
+def ajouter_tableau(feuille, table):
+    '''
+    Ajoute à la feuille le tableau, dont les colonnes sont déjà déclarées (cf.
+    declarer_colonnes_tableau) : en écriture seule, l’avertissement d’openpyxl qui demande de
+    les déclarer n’a donc pas lieu d’être (et ferait échouer le nettoyage avec -W error).
+    '''
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', 'In write-only mode you must add table columns manually', UserWarning)
+        feuille.add_table(table)
+
+def demeler_nom_prenom(index_reference, nom_prenom):
+    '''
+    index_reference: un IndexNoms des couples (nom, prénom) connus (cf. correspondance.py)
+    retourne: la Correspondance trouvée : couple (nom, prénom), confiance, concurrents.
+    '''
+    correspondance = index_reference.chercher(nom_prenom)
+    if correspondance.nom_prenom is None:
+        raise KeyError("'nom_prenom' ({}) introuvable dans index_reference.".format(repr(nom_prenom)))
+    return correspondance
+
+def ambiguite_nom_prenom(user_id, nom_prenom, correspondance):
+    '''
+    retourne: la ligne à ajouter à la feuille 'Ambiguïtés' si la correspondance n’est pas
+        certaine (approchée ou avec des concurrents), None sinon.
+    '''
+    if correspondance.concurrents:
+        probleme = 'correspondance ambiguë (autres candidats : {})'.format(
+            ', '.join('{};{}'.format(*concurrent) for concurrent in correspondance.concurrents))
+    elif correspondance.confiance < 1:
+        probleme = 'correspondance approchée'
+    else:
+        return None
+    return ('Utilisateurs', user_id, nom_prenom, probleme,
+            '{};{}'.format(*correspondance.nom_prenom), correspondance.confiance)
 
 def definir_largeur_colonnes(feuille, dict_colonnes):
     for lettre_col, largeur in dict_colonnes.items():
         feuille.column_dimensions[lettre_col].width = largeur
 
-def appliquer_a_plage(predicat, iter_plage):
-    for ligne in iter_plage:
-        for cellule in ligne:
-            predicat(cellule)
-
-class STYLES:
-    '''
-    Classe de stockage de mes styles Excel.
-    '''
-    # Création de styles Excel qu’on pourra appliquer à des cellules
-    BIG_BOLD = Font(bold=True, size=12)
-    UNDERLINE = Font(underline="single")
-
-    CENTERED = Alignment(horizontal='center')
-    WRAP = Alignment(wrap_text=True)
-
-    HEADER = NamedStyle(name='header_cell', font=BIG_BOLD, alignment=CENTERED)
-
-    # styles pour le formatage conditionnel
-    GREEN_BG = DifferentialStyle(
-        font=Font(color='FF006100'),
-        fill=PatternFill(bgColor='FFC6EFCE'))
-    RED_BG = DifferentialStyle(
-        font=Font(color='FF9C0006'),
-        fill=PatternFill(bgColor='FFFFC7CE'))
-
-    # Règles de formatage conditionnel : VRAI = vert, FAUX = rouge.
-    HIGHLIGHT_FALSE_IN_RED = Rule(
-        type='cellIs',
-        dxf=RED_BG,
-        operator='equal',
-        formula=['FALSE'])
-    HIGHLIGHT_TRUE_IN_GREEN = Rule(
-        type='cellIs',
-        dxf=GREEN_BG,
-        operator='equal',
-        formula=['TRUE'])
-
-    # Ces 2 styles de tableau (ainsi que d’autres) sont incorporés à Excel par défaut.
-    PURPLE_TABLE = TableStyleInfo(
-        name="TableStyleMedium5",
-        showRowStripes=True,
-        showColumnStripes=False)
-    BLUE_TABLE = TableStyleInfo(
-        name="TableStyleMedium2",
-        showRowStripes=True,
-        showColumnStripes=False)
+class StyleResolu:
+    '''
+    Un style (nom d’un style prédéfini comme 'Percent', ou NamedStyle) résolu une seule fois
+    pour les cellules d’une feuille : affecter cellule.style fait chercher le style nommé
+    dans le classeur (et l’y ajoute au besoin) à chaque cellule ; ici, c’est fait une fois
+    pour toutes, sur une cellule modèle, et chaque cellule en reçoit une copie (cf.
+    copier_style).
+
+    Les cellules sont créées déjà stylées (cf. cellule) et ajoutées à la feuille avec les
+    autres valeurs de la ligne, en écriture seule comme en mode normal : pas de 2e passage
+    sur les cellules pour les styler.
+    '''
+    def __init__(self, feuille, style):
+        from openpyxl.cell import Cell, WriteOnlyCell
+        self.feuille = feuille
+        self.modele = WriteOnlyCell(feuille)
+        self.modele.style = style
+        self.classe_cellule = Cell
+
+    def cellule(self, valeur):
+        '''
+        Cellule à ajouter à la feuille (ex : feuille.append((valeur1, style.cellule(valeur2)))).
+        '''
+        cellule = self.classe_cellule(self.feuille, row=1, column=1, value=valeur)
+        copier_style(self.modele, cellule)
+        return cellule
+
+    def appliquer_a_colonne(self, lettre_col):
+        '''
+        Style par défaut de la colonne (pour les cellules vides ou saisies plus tard dans
+        Excel ; les cellules écrites ont leur propre style). En écriture seule, à faire avant
+        d’ajouter la 1re ligne.
+        '''
+        copier_style(self.modele, self.feuille.column_dimensions[lettre_col])
+
+def copier_style(modele, cible):
+    '''
+    Donne à cible (une cellule ou une colonne, cf. column_dimensions) le style de la
+    cellule modele.
+
+    Repose sur l’API privée d’openpyxl : le style résolu d’une cellule (attribut _style, un
+    StyleArray : identifiants de police, format, style nommé, etc.) est copié tel quel,
+    sans chercher à nouveau chaque élément dans le classeur. openpyxl n’a pas d’équivalent
+    public pour une colonne (column_dimensions[...].style n’y est qu’un alias en lecture
+    seule de style_id). Si une version d’openpyxl n’a plus cet attribut, on se replie sur
+    les attributs publics, un par un (plus lent, et sans le lien vers le style nommé : le
+    format affiché reste le même).
+    '''
+    tableau = getattr(modele, '_style', None)
+    if tableau is not None and hasattr(cible, '_style'):
+        cible._style = copy.copy(tableau)
+        return
+    for attribut in ('font', 'fill', 'border', 'alignment', 'protection', 'number_format'):
+        # (copy : les attributs de style d’une cellule sont des StyleProxy non modifiables)
+        setattr(cible, attribut, copy.copy(getattr(modele, attribut)))
+
+def cellules_en_tete(feuille, titres):
+    style = StyleResolu(feuille, styles_excel().HEADER)
+    return [style.cellule(titre) for titre in titres]
+
+@functools.lru_cache(maxsize=None)
+def styles_excel():
+    '''
+    retourne: la classe STYLES, créée (avec l’import d’openpyxl) au premier appel
+    '''
+    from openpyxl.formatting import Rule
+    from openpyxl.styles import Font, Alignment, PatternFill
+    try: from openpyxl.styles import NamedStyle
+    except: from openpyxl.styles import Style as NamedStyle
+    from openpyxl.styles.differential import DifferentialStyle
+    from openpyxl.worksheet.table import TableStyleInfo
+
+    class STYLES:
+        '''
+        Classe de stockage de mes styles Excel.
+        '''
+        # Création de styles Excel qu’on pourra appliquer à des cellules
+        BIG_BOLD = Font(bold=True, size=12)
+        UNDERLINE = Font(underline="single")
+
+        CENTERED = Alignment(horizontal='center')
+        WRAP = Alignment(wrap_text=True)
+
+        HEADER = NamedStyle(name='header_cell', font=BIG_BOLD, alignment=CENTERED)
+
+        # styles pour le formatage conditionnel
+        GREEN_BG = DifferentialStyle(
+            font=Font(color='FF006100'),
+            fill=PatternFill(bgColor='FFC6EFCE'))
+        RED_BG = DifferentialStyle(
+            font=Font(color='FF9C0006'),
+            fill=PatternFill(bgColor='FFFFC7CE'))
+
+        # Règles de formatage conditionnel : VRAI = vert, FAUX = rouge.
+        HIGHLIGHT_FALSE_IN_RED = Rule(
+            type='cellIs',
+            dxf=RED_BG,
+            operator='equal',
+            formula=['FALSE'])
+        HIGHLIGHT_TRUE_IN_GREEN = Rule(
+            type='cellIs',
+            dxf=GREEN_BG,
+            operator='equal',
+            formula=['TRUE'])
+
+        # Ces 2 styles de tableau (ainsi que d’autres) sont incorporés à Excel par défaut.
+        PURPLE_TABLE = TableStyleInfo(
+            name="TableStyleMedium5",
+            showRowStripes=True,
+            showColumnStripes=False)
+        BLUE_TABLE = TableStyleInfo(
+            name="TableStyleMedium2",
+            showRowStripes=True,
+            showColumnStripes=False)
+    return STYLES
+
+def lister_classeurs(sources, dossier_exclu=None):
+    '''
+    sources: chemins de classeurs, de dossiers (tous les .xlsx qu’ils contiennent) ou motifs
+        glob (ex : 'extractions/**/*.xlsx') ; un motif qui ne correspond à rien n’ajoute
+        aucun classeur (comme un dossier vide)
+    dossier_exclu: dossier dont les classeurs trouvés par un motif glob sont ignorés (le
+        dossier des classeurs propres, pour qu’un 2e lot ne les reprenne pas comme sources)
+    retourne: la liste triée des classeurs, sans doublons ni fichiers de verrouillage
+        d’Excel ('~$…')
+    '''
+    exclu = os.path.join(os.path.realpath(dossier_exclu), '') if dossier_exclu else None
+    classeurs = set()
+    for source in sources:
+        if os.path.isdir(source):
+            chemins = glob.glob(os.path.join(source, '*.xlsx'))
+        elif glob.has_magic(source):
+            chemins = [chemin for chemin in glob.glob(source, recursive=True)
+                       if exclu is None or not os.path.realpath(chemin).startswith(exclu)]
+        else:
+            chemins = [source]
+        classeurs.update(os.path.realpath(chemin) for chemin in chemins
+                         if not os.path.basename(chemin).startswith('~$'))
+    return sorted(classeurs)
+
+def dossier_de_base(source):
+    '''
+    retourne: le dossier d’où part une source de lister_classeurs : le dossier lui-même, celui
+        du classeur, ou pour un motif glob, son début sans caractère spécial (ex :
+        'extractions/**/*.xlsx' → 'extractions')
+    '''
+    if os.path.isdir(source):
+        return os.path.realpath(source)
+    if glob.has_magic(source):
+        while glob.has_magic(source):
+            source = os.path.dirname(source)
+        return os.path.realpath(source or os.curdir)
+    return os.path.dirname(os.path.realpath(source))
+
+def racine_des_sources(sources, classeurs=()):
+    '''
+    retourne: le dossier commun aux sources (cf. dossier_de_base) et aux classeurs trouvés :
+        chaque classeur propre est rangé dans le dossier de sortie au même chemin relatif
+        (cf. nettoyer_lot). La racine ne dépend que des sources, pas des classeurs qu’elles
+        contiennent ce jour-là : un nouveau sous-dossier ne déplace pas les classeurs propres
+        déjà à jour.
+    '''
+    return os.path.commonpath([dossier_de_base(source) for source in sources]
+                              + [os.path.dirname(classeur) for classeur in classeurs])
+
+def a_jour(chemin_source, chemins_cibles):
+    return all(os.path.exists(chemin_cible) and os.path.getmtime(chemin_cible) >= os.path.getmtime(chemin_source)
+               for chemin_cible in chemins_cibles)
+
+def chemins_sorties(chemin_cible, formats=('xlsx',)):
+    '''
+    retourne: les fichiers écrits par demo_nettoyage pour ces formats : chemin_cible pour
+        'xlsx', et pour les autres, des fichiers de même nom sans l’extension .xlsx (ex :
+        'propre.xlsx' → 'propre.sqlite', 'propre.utilisateurs.tsv', etc.)
+    '''
+    base = os.path.splitext(chemin_cible)[0]
+    chemins = []
+    for format_sortie in formats:
+        if format_sortie == 'xlsx':
+            chemins.append(chemin_cible)
+        else:
+            chemins.extend(sorties.SORTIES[format_sortie].chemins(base, [nom for _, nom, _, _ in TABLES]))
+    return chemins
+
+def chemin_cache(chemin_cible):
+    # le cache du mode incrémental est gardé à côté du classeur propre
+    return chemin_cible + '.cache.sqlite'
+
+def nettoyer_fichier(chemin_source, chemin_cible, options, forcer=False, mesurer=False, memoire=False,
+                     incremental=False):
+    '''
+    Nettoie un classeur du lot (cf. nettoyer_lot) sans jamais lever d’exception : une
+    erreur est retournée dans le résultat, pour ne pas interrompre le reste du lot.
+    Chaque fichier est écrit à côté puis renommé (cf. sorties.fichier_partiel) : un
+    fichier à moitié écrit ne peut pas passer pour à jour au lot suivant.
+    incremental: si vrai, les noms démêlés sont gardés d’un nettoyage à l’autre
+        (cf. chemin_cache).
+    retourne: un dictionnaire source, cible, statut ('nettoyé', 'à jour' ou 'échec'),
+        durée, erreur et mesures (cf. mesures.Mesures.rapport)
+    '''
+    resultat = dict(source=chemin_source, cible=chemin_cible, statut='à jour', duree=0.0, erreur=None, mesures=None)
+    debut = time.perf_counter()
+    try:
+        if forcer or not a_jour(chemin_source, chemins_sorties(chemin_cible, options.get('formats', ('xlsx',)))):
+            mesures = Mesures(memoire=memoire) if mesurer else AUCUNE_MESURE
+            demo_nettoyage(chemin_source=chemin_source, chemin_cible=chemin_cible, mesures=mesures,
+                           chemin_cache=chemin_cache(chemin_cible) if incremental else None, **options)
+            resultat.update(statut='nettoyé', mesures=mesures.rapport() if mesurer else None)
+    except Exception as erreur:
+        resultat.update(statut='échec', erreur=''.join(traceback.format_exception_only(type(erreur), erreur)).strip(),
+                        trace=traceback.format_exc())
+    resultat['duree'] = time.perf_counter() - debut
+    return resultat
+
+def _nettoyer_fichier_du_lot(arguments):
+    return nettoyer_fichier(*arguments)
+
+def nettoyer_lot(chemins_sources, dossier_cible, options, fichiers_simultanes=1, forcer=False, mesurer=False,
+                 memoire=False, incremental=False, racine=None):
+    '''
+    Générateur : nettoie chaque classeur de chemins_sources dans dossier_cible et produit le
+    résultat de nettoyer_fichier pour chacun, dans l’ordre où ils se terminent.
+
+    racine: dossier des sources (par défaut, le dossier commun aux classeurs) : chaque
+        classeur propre a dans dossier_cible le chemin relatif de sa source dans racine
+        (ex : racine/a/extrait.xlsx → dossier_cible/a/extrait.xlsx), pour que deux sources de
+        même nom dans des dossiers différents n’aient pas le même classeur propre.
+
+    fichiers_simultanes: nombre de classeurs nettoyés en même temps, chacun dans un
+        processus d’un pool. Les processus d’un pool ne peuvent pas en créer d’autres :
+        options['processus'] et options['feuilles_en_parallele'] doivent alors valoir 1.
+    forcer: si faux, les classeurs dont le classeur propre est plus récent que la source
+        ne sont pas traités à nouveau.
+    '''
+    os.makedirs(dossier_cible, exist_ok=True)
+    if racine is None and chemins_sources:
+        racine = os.path.commonpath([os.path.dirname(os.path.realpath(chemin)) for chemin in chemins_sources])
+    chemins_cibles = [os.path.join(dossier_cible, os.path.relpath(os.path.realpath(chemin), racine))
+                      for chemin in chemins_sources]
+    doublons = [chemin for chemin, nombre in collections.Counter(map(os.path.normcase, chemins_cibles)).items()
+                if nombre > 1]
+    if doublons:
+        raise ValueError('plusieurs sources pour le même classeur propre : {}'.format(', '.join(doublons)))
+    taches = [(chemin, chemin_cible, options, forcer, mesurer, memoire, incremental)
+              for chemin, chemin_cible in zip(chemins_sources, chemins_cibles)]
+    if fichiers_simultanes <= 1 or len(taches) <= 1:
+        for tache in taches:
+            yield _nettoyer_fichier_du_lot(tache)
+        return
+    if options.get('processus', 1) > 1 or options.get('feuilles_en_parallele', 1) > 1:
+        raise ValueError('processus et feuilles_en_parallele doivent valoir 1 quand plusieurs fichiers sont '
+                         'nettoyés en même temps')
+    import multiprocessing
+    with multiprocessing.Pool(min(fichiers_simultanes, len(taches))) as pool:
+        # un classeur à la fois par processus : les gros ne bloquent pas les petits
+        yield from pool.imap_unordered(_nettoyer_fichier_du_lot, taches, chunksize=1)
 
 def main():
-    demo_nettoyage()
+    parser = argparse.ArgumentParser(description='Nettoie {} dans {}, ou chaque classeur des sources dans le '
+                                                 'dossier --sortie.'.format(IN_FILEPATH, OUT_FILEPATH))
+    parser.add_argument('sources', nargs='*',
+                        help='classeurs, dossiers ou motifs glob (ex : \'extractions/**/*.xlsx\')')
+    parser.add_argument('--sortie', metavar='DOSSIER', default=OUT_DIR,
+                        help='dossier des classeurs propres (même chemin que la source relativement au dossier '
+                             'commun des sources ; défaut : %(default)s)')
+    parser.add_argument('--fichiers-simultanes', type=int, default=1, metavar='N',
+                        help='nombre de classeurs nettoyés en même temps (processus séparés)')
+    parser.add_argument('--forcer', action='store_true',
+                        help='nettoie aussi les classeurs dont le classeur propre est à jour')
+    parser.add_argument('--incremental', action='store_true',
+                        help='ne démêle que les noms de \'Utilisateurs\' nouveaux ou modifiés depuis le '
+                             'nettoyage précédent (cache SQLite à côté du classeur propre)')
+    parser.add_argument('--format', dest='formats', action='append', choices=FORMATS,
+                        help='format des données propres, à répéter pour en écrire plusieurs (défaut : xlsx ; '
+                             'les autres sont écrits à côté du classeur propre, cf. sorties.py)')
+    parser.add_argument('--lecture-en-flux', action='store_true')
+    parser.add_argument('--lecture-rapide', action='store_true',
+                        help='lit les valeurs du classeur source directement dans son XML, sans openpyxl '
+                             '(avec repli sur openpyxl pour les formules, dates…)')
+    parser.add_argument('--ecriture-en-flux', action='store_true')
+    parser.add_argument('--processus', type=int, default=1)
+    parser.add_argument('--feuilles-en-parallele', type=int, default=1, metavar='N',
+                        help='lit les feuilles du classeur source et écrit celles du classeur propre dans N '
+                             'processus (une feuille par processus)')
+    parser.add_argument('--moteur', choices=('cellules', 'colonnes'), default='cellules')
+    parser.add_argument('--calculs', choices=CALCULS, default='formules')
+    parser.add_argument('--mesures', metavar='FICHIER',
+                        help='écrit la durée de chaque étape et les compteurs en JSON (- : sortie standard)')
+    parser.add_argument('--memoire', action='store_true',
+                        help='ajoute aux mesures le pic de mémoire de chaque étape (tracemalloc, plus lent)')
+    parser.add_argument('--profil', metavar='FICHIER',
+                        help='profile l’exécution avec cProfile et enregistre les statistiques (cf. pstats)')
+    args = parser.parse_args()
+    args.formats = tuple(dict.fromkeys(args.formats or ('xlsx',)))
+    if {'parquet', 'arrow'} & set(args.formats) and not sorties.SortieColonnes.disponible():
+        parser.error('les formats parquet et arrow nécessitent pyarrow (pip3 install pyarrow)')
+    if args.feuilles_en_parallele > 1 and args.lecture_en_flux:
+        parser.error('--feuilles-en-parallele ne s’utilise pas avec --lecture-en-flux')
+    if args.sources:
+        if args.fichiers_simultanes > 1 and max(args.processus, args.feuilles_en_parallele) > 1:
+            parser.error('--fichiers-simultanes ne peut pas dépasser 1 en même temps que --processus ou '
+                         '--feuilles-en-parallele')
+        if args.profil:
+            parser.error('--profil ne s’utilise qu’avec le classeur d’exemple (sans sources)')
+        sys.exit(main_lot(args))
+
+    mesures = Mesures(memoire=args.memoire) if args.mesures or args.memoire else AUCUNE_MESURE
+    options = dict(lecture_en_flux=args.lecture_en_flux, ecriture_en_flux=args.ecriture_en_flux,
+                   lecture_rapide=args.lecture_rapide, processus=args.processus, moteur=args.moteur,
+                   calculs=args.calculs, formats=args.formats, feuilles_en_parallele=args.feuilles_en_parallele,
+                   mesures=mesures,
+                   chemin_cache=chemin_cache(OUT_FILEPATH) if args.incremental else None)
+    if args.profil:
+        # importé ici : inutile de charger le profileur quand on ne s’en sert pas
+        import cProfile
+        cProfile.runctx('demo_nettoyage(**options)', globals(), dict(options=options), args.profil)
+    else:
+        demo_nettoyage(**options)
+
+    if mesures is not AUCUNE_MESURE:
+        if args.mesures in (None, '-'):
+            print(mesures.json())
+        else:
+            with open(args.mesures, 'w', encoding='utf-8') as fichier:
+                fichier.write(mesures.json() + '\n')
+
+def main_lot(args):
+    '''
+    Nettoie les classeurs des sources (cf. main) : une ligne par classeur sur la sortie
+    d’erreur, et avec --mesures, un résultat JSON par ligne (cf. nettoyer_fichier).
+    retourne: le code de sortie (1 si au moins un classeur est en échec)
+    '''
+    chemins = lister_classeurs(args.sources, args.sortie)
+    options = dict(lecture_en_flux=args.lecture_en_flux, ecriture_en_flux=args.ecriture_en_flux,
+                   lecture_rapide=args.lecture_rapide, processus=args.processus, moteur=args.moteur,
+                   calculs=args.calculs, formats=args.formats, feuilles_en_parallele=args.feuilles_en_parallele)
+    mesurer = bool(args.mesures or args.memoire)
+    rapport = sys.stdout if args.mesures in (None, '-') else open(args.mesures, 'w', encoding='utf-8')
+    compteur = collections.Counter()
+    debut = time.perf_counter()
+    try:
+        for resultat in nettoyer_lot(chemins, args.sortie, options, args.fichiers_simultanes, args.forcer,
+                                     mesurer, args.memoire, args.incremental,
+                                     racine_des_sources(args.sources, chemins) if chemins else None):
+            compteur[resultat['statut']] += 1
+            print('{statut:<8} {duree:8.2f} s  {source}'.format(**resultat), file=sys.stderr)
+            if resultat['erreur']:
+                print(resultat['trace'], file=sys.stderr)
+            if mesurer:
+                rapport.write(json.dumps(resultat, ensure_ascii=False) + '\n')
+    finally:
+        if rapport is not sys.stdout:
+            rapport.close()
+    print('{} classeur(s) en {:.2f} s : {}'.format(
+        len(chemins), time.perf_counter() - debut,
+        ', '.join('{} {}'.format(nombre, statut) for statut, nombre in sorted(compteur.items())) or 'aucun'),
+        file=sys.stderr)
+    return 1 if compteur['échec'] else 0
 
 if __name__ == '__main__':
     main()
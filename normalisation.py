@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Normalisation des valeurs saisies à la main dans les classeurs :
+    * noms, pour les comparer malgré les différences de saisie (casse, accents,
+      ligatures, espaces, tirets, apostrophes) ;
+    * espaces en trop ;
+    * nombres saisis sous forme de texte ('0 ,3', '25%').
+
+Chaque normalisation existe en deux versions : une fonction qui traite une
+cellule, et une fonction « _colonne » qui traite toute une colonne d’un coup.
+Les mêmes valeurs reviennent très souvent dans les données (un utilisateur a
+plusieurs droits) : les versions colonne ne calculent chaque valeur distincte
+qu’une seule fois (avec les opérations de numpy.strings si numpy >= 2 est
+installé), et asciifier garde ses derniers résultats en cache.
+
+>>> asciifier('VAN DER BRŒCK Anne-Carole')
+'vanderbroeckannecarole'
+>>> asciifier_colonne(['Benoît Jean-Paul', 'benoit jean paul', 'Benoît Jean-Paul'])
+['benoitjeanpaul', 'benoitjeanpaul', 'benoitjeanpaul']
+>>> supprimer_espaces_colonne([' APREMONT  ', 'Anne   Carole'])
+['APREMONT', 'Anne Carole']
+>>> normaliser_nombres_colonne(['0 ,3', 0.6, '25%', '1.00', 1, '40%'])
+[0.3, 0.6, 0.25, 1.0, 1, 0.4]
+
+Les versions colonne donnent le même résultat que les versions cellule, y compris
+l’erreur sur une valeur du mauvais type (avec ou sans numpy) :
+>>> valeurs = ['  DUPONT', 'Anne  Carole ', '', 'Anne  Carole ']
+>>> supprimer_espaces_colonne(valeurs) == [supprimer_espaces_en_trop(valeur) for valeur in valeurs]
+True
+>>> nombres = [' 12', 12, 0.5, '0,5', '5%']
+>>> normaliser_nombres_colonne(nombres) == [normaliser_nombre(valeur) for valeur in nombres]
+True
+>>> supprimer_espaces_en_trop(None) # doctest: +IGNORE_EXCEPTION_DETAIL
+Traceback (most recent call last):
+TypeError: expected string or bytes-like object
+>>> supprimer_espaces_colonne(['DUPONT', None, 12])
+Traceback (most recent call last):
+TypeError: valeurs should be str
+>>> normaliser_nombre(None)
+Traceback (most recent call last):
+TypeError: valeur_brute should be either int, float or str
+>>> normaliser_nombres_colonne(['12', None])
+Traceback (most recent call last):
+TypeError: valeurs should be either int, float or str
+"""
+
+import re
+# j’utilise unicodedata pour asciifier des chaînes unicode
+import unicodedata
+from functools import lru_cache
+
+RE_ESPACES_MULTIPLES = re.compile('  +')
+RE_ENTIER = re.compile(r'\d+$')
+TYPES_NOMBRE = (int, float, str)
+
+# nombre de chaînes distinctes gardées en cache par asciifier
+TAILLE_CACHE_ASCIIFIER = 2**16
+
+@lru_cache(maxsize=None)
+def numpy_et_strings():
+    '''
+    numpy (facultatif) : numpy.strings (numpy >= 2) applique les opérations de chaînes à
+    tout un tableau d’un coup. numpy n’est importé qu’au premier appel (par les fonctions
+    « _colonne ») : son import est long, pour rien quand on ne s’en sert pas.
+    retourne: numpy et numpy.strings, ou (None, None) si numpy >= 2 n’est pas installé
+    '''
+    try:
+        import numpy
+        return numpy, numpy.strings
+    except (ImportError, AttributeError):
+        return None, None
+
+# une seule table de traduction (appliquée en une passe par str.translate) au
+# lieu d’une série de str.replace
+TABLE_ASCIIFIER = str.maketrans({
+    'œ': 'oe', # ligatures et autres non gérés par unicodedata
+    'æ': 'ae',
+    'ĳ': 'ij',
+    'ß': 'ss',
+    'ǉ': 'lj',
+    'ǌ': 'nj',
+    'ﬆ': 'st',
+    'ﬅ': 'ft',
+    'ǳ': 'dz',
+    'ﬀ': 'ff',
+    'ſ': 's', # s long
+    '\u202f': None, # espace insécable fine
+    '\xa0': None, # espace insécable normale
+    '\t': None, # tabulation
+    ' ': None,
+    '—': None, # tiret cadratin
+    '–': None, # tiret
+    '-': None, # signe moins
+    '’': None, # apostrophe courbe
+    "'": None, # apostrophe droite
+})
+
+# pour les chaînes déjà en ASCII (cas le plus fréquent), il n’y a rien à décomposer et
+# bytes.translate supprime les caractères ignorés bien plus vite que str.translate
+CARACTERES_IGNORES_ASCII = bytes(
+    code for code, remplacement in TABLE_ASCIIFIER.items() if code < 128 and remplacement is None)
+
+def _asciifier(chaine):
+    chaine = chaine.lower()
+    if chaine.isascii():
+        return chaine.encode('ascii').translate(None, CARACTERES_IGNORES_ASCII).decode('ascii')
+    return (
+        unicodedata.normalize('NFKD', chaine.translate(TABLE_ASCIIFIER))
+        .encode('ascii', 'ignore') # supprime les caractères non ascii
+        .decode('ascii') # retransforme l’objet 'bytes' en 'str'
+    )
+
+@lru_cache(maxsize=TAILLE_CACHE_ASCIIFIER)
+def asciifier(chaine):
+    '''
+    Supprime les diacritiques (accents, points, cédilles, etc.) et défait les ligatures.
+    Supprime les espaces, tirets et apostrophes. Passe le tout en minuscules.
+    Note : cette fonction ne latinisera pas les systèmes d’écriture non latins
+    (cyrillique, CJK, etc.) – ce serait beaucoup plus compliqué
+
+    Les résultats sont gardés en cache (cf. asciifier.cache_info()).
+    '''
+    return _asciifier(chaine)
+
+def asciifier_colonne(chaines):
+    '''
+    Asciifie toute une colonne de chaînes d’un coup et retourne la liste des résultats
+    (dans le même ordre). Chaque valeur distincte n’est calculée qu’une fois ; le cache
+    d’asciifier n’est pas utilisé (une grosse colonne le viderait).
+    '''
+    chaines = list(chaines)
+    resultats = {chaine: None for chaine in chaines}
+    for chaine in resultats:
+        resultats[chaine] = _asciifier(chaine)
+    return [resultats[chaine] for chaine in chaines]
+
+def supprimer_espaces_en_trop(valeur_brute):
+    return RE_ESPACES_MULTIPLES.sub(' ', valeur_brute).strip()
+
+def supprimer_espaces_colonne(valeurs):
+    '''
+    supprimer_espaces_en_trop appliquée à toute une colonne (liste des résultats, dans le
+    même ordre).
+    '''
+    valeurs = list(valeurs)
+    # numpy.array(..., dtype=str) transformerait n’importe quelle valeur en texte (None en
+    # 'None') : comme supprimer_espaces_en_trop, on n’accepte que du texte
+    if not all(type(valeur) is str for valeur in valeurs):
+        raise TypeError('valeurs should be str')
+    distinctes = list(dict.fromkeys(valeurs))
+    numpy, numpy_strings = numpy_et_strings()
+    if numpy_strings is not None and distinctes:
+        tableau = numpy.array(distinctes, dtype=str)
+        # remplacer '  ' par ' ' jusqu’à ce qu’il n’y en ait plus revient à réduire
+        # chaque suite d’espaces à un seul
+        while numpy_strings.find(tableau, '  ').max() >= 0:
+            tableau = numpy_strings.replace(tableau, '  ', ' ')
+        resultats = numpy_strings.strip(tableau).tolist()
+    else:
+        resultats = [supprimer_espaces_en_trop(valeur) for valeur in distinctes]
+    correspondances = dict(zip(distinctes, resultats))
+    return [correspondances[valeur] for valeur in valeurs]
+
+def normaliser_nombre(valeur_brute):
+    t = type(valeur_brute)
+    if t not in TYPES_NOMBRE:
+        raise TypeError('valeur_brute should be either int, float or str')
+    if t is str:
+        valeur_brute = valeur_brute.replace(' ', '')
+        valeur_brute = valeur_brute.replace(',', '.')
+        return _convertir_texte_nombre(valeur_brute)
+    elif t in (int, float):
+        return valeur_brute
+
+def _convertir_texte_nombre(valeur_brute):
+    # gérer le cas des pourcentages
+    multiplier_par = 1
+    if valeur_brute.endswith('%'):
+        multiplier_par = 0.01
+        valeur_brute = valeur_brute[:-1]
+    if RE_ENTIER.match(valeur_brute):
+        return multiplier_par * int(valeur_brute)
+    return multiplier_par * float(valeur_brute)
+
+def normaliser_nombres_colonne(valeurs):
+    '''
+    normaliser_nombre appliquée à toute une colonne (liste des résultats, dans le même
+    ordre). Les nombres sont conservés tels quels, chaque texte distinct n’est converti
+    qu’une fois.
+    '''
+    valeurs = list(valeurs)
+    if not all(type(valeur) in TYPES_NOMBRE for valeur in valeurs):
+        raise TypeError('valeurs should be either int, float or str')
+    textes = list(dict.fromkeys(valeur for valeur in valeurs if type(valeur) is str))
+    numpy, numpy_strings = numpy_et_strings()
+    if numpy_strings is not None and textes:
+        tableau = numpy.array(textes, dtype=str)
+        textes_nettoyes = numpy_strings.replace(numpy_strings.replace(tableau, ' ', ''), ',', '.').tolist()
+    else:
+        textes_nettoyes = [texte.replace(' ', '').replace(',', '.') for texte in textes]
+    nombres = dict(zip(textes, map(_convertir_texte_nombre, textes_nettoyes)))
+    return [nombres[valeur] if type(valeur) is str else valeur for valeur in valeurs]
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- encoding: utf-8 -*-
+"""
+Écriture des données propres dans d’autres formats que xlsx, pour les programmes
+qui les reprennent (xlsx est le format le plus lent, à écrire comme à relire) :
+    * 'tsv' et 'csv' : un fichier texte UTF-8 par table (<base>.<table>.tsv),
+      écrit au fil de l’eau avec TSV.writeTSV (séparateur tabulation ou
+      virgule, quotes seulement quand il le faut) ;
+    * 'sqlite' : une base <base>.sqlite avec une table SQL par table et des
+      index sur les colonnes de jointure (cf. Table.index) ;
+    * 'parquet' et 'arrow' (si pyarrow est installé) : un fichier par table
+      (<base>.<table>.parquet, ou .arrow au format IPC d’Arrow), écrit par lots
+      de lignes.
+
+Chaque table est une Table(nom, colonnes, lignes, index) : colonnes est une suite
+de (nom, type) où type vaut str ou float, lignes un itérable de tuples, parcouru
+une seule fois. Chaque fichier est écrit à côté puis renommé (cf. fichier_partiel) :
+un fichier à moitié écrit ne remplace jamais le précédent.
+
+>>> import os, tempfile
+>>> tables = [Table('droits', (('code', str), ('droit', str)), [('D001', 'Lire'), ('D002', 'Lire, écrire')])]
+>>> with tempfile.TemporaryDirectory() as dossier:
+...     chemins = SORTIES['csv'].ecrire(tables, os.path.join(dossier, 'propre'))
+...     with open(chemins[0], encoding='utf-8') as fichier:
+...         print(os.path.basename(chemins[0]))
+...         print(fichier.read(), end='')
+propre.droits.csv
+code,droit
+D001,Lire
+D002,"Lire, écrire"
+"""
+import os
+import collections
+import contextlib
+import importlib.util
+import itertools
+import sqlite3
+
+from TSV import writeTSV
+
+# nombre de lignes écrites à la fois en SQLite, Parquet et Arrow
+TAILLE_LOT = 100000
+
+Table = collections.namedtuple('Table', 'nom colonnes lignes index', defaults=((),))
+
+TYPES_SQL = {str: 'TEXT', float: 'REAL'}
+
+@contextlib.contextmanager
+def fichier_partiel(chemin):
+    '''
+    Donne le chemin où écrire le fichier chemin, qui le remplace une fois l’écriture
+    terminée sans erreur (et disparaît sinon).
+    '''
+    partiel = chemin + '.partiel'
+    if os.path.exists(partiel):
+        os.remove(partiel)
+    try:
+        yield partiel
+        os.replace(partiel, chemin)
+    finally:
+        if os.path.exists(partiel):
+            os.remove(partiel)
+
+def par_lots(lignes, taille):
+    lignes = iter(lignes)
+    while True:
+        lot = list(itertools.islice(lignes, taille))
+        if not lot:
+            return
+        yield lot
+
+class SortieTexte:
+    '''
+    Un fichier texte par table, la 1re ligne donnant le nom des colonnes.
+    '''
+    def __init__(self, extension, sep):
+        self.extension = extension
+        self.sep = sep
+
+    def chemins(self, base, noms_tables):
+        return ['{}.{}.{}'.format(base, nom, self.extension) for nom in noms_tables]
+
+    def ecrire(self, tables, base):
+        chemins = self.chemins(base, [table.nom for table in tables])
+        for table, chemin in zip(tables, chemins):
+            with fichier_partiel(chemin) as partiel, open(partiel, 'w', encoding='utf-8', newline='') as fichier:
+                en_tete = [nom for nom, _ in table.colonnes]
+                writeTSV(itertools.chain([en_tete], table.lignes), fichier, sep=self.sep)
+        return chemins
+
+class SortieSQLite:
+    def chemins(self, base, noms_tables):
+        return [base + '.sqlite']
+
+    def ecrire(self, tables, base):
+        chemin, = self.chemins(base, [])
+        with fichier_partiel(chemin) as partiel:
+            connexion = sqlite3.connect(partiel)
+            try:
+                # la base est refaite entièrement à chaque fois (et renommée une fois complète) :
+                # pas besoin de journal
+                connexion.execute('PRAGMA journal_mode = OFF')
+                connexion.execute('PRAGMA synchronous = OFF')
+                for table in tables:
+                    connexion.execute('CREATE TABLE {} ({})'.format(
+                        table.nom, ', '.join('{} {}'.format(nom, TYPES_SQL[type_colonne])
+                                             for nom, type_colonne in table.colonnes)))
+                    insertion = 'INSERT INTO {} VALUES ({})'.format(table.nom, ', '.join('?' * len(table.colonnes)))
+                    for lot in par_lots(table.lignes, TAILLE_LOT):
+                        connexion.executemany(insertion, lot)
+                    # index créés après les insertions : plus rapide que de les tenir à jour
+                    for colonne in table.index:
+                        connexion.execute('CREATE INDEX {0}_{1} ON {0} ({1})'.format(table.nom, colonne))
+                connexion.commit()
+            finally:
+                connexion.close()
+        return [chemin]
+
+class SortieColonnes:
+    '''
+    Parquet ou Arrow (format de fichier IPC) avec pyarrow, importé seulement quand on s’en
+    sert. Les valeurs sont converties dans le type de leur colonne (ex : un User ID saisi
+    comme un nombre devient du texte).
+    '''
+    def __init__(self, extension):
+        self.extension = extension
+
+    def chemins(self, base, noms_tables):
+        return ['{}.{}.{}'.format(base, nom, self.extension) for nom in noms_tables]
+
+    def ecrire(self, tables, base):
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+        types_arrow = {str: pyarrow.string(), float: pyarrow.float64()}
+        chemins = self.chemins(base, [table.nom for table in tables])
+        for table, chemin in zip(tables, chemins):
+            schema = pyarrow.schema([(nom, types_arrow[type_colonne]) for nom, type_colonne in table.colonnes])
+            with fichier_partiel(chemin) as partiel:
+                if self.extension == 'parquet':
+                    ecrivain = pyarrow.parquet.ParquetWriter(partiel, schema)
+                else:
+                    ecrivain = pyarrow.ipc.new_file(partiel, schema)
+                try:
+                    for lot in par_lots(table.lignes, TAILLE_LOT):
+                        colonnes = [pyarrow.array([None if valeur is None else type_colonne(valeur) for valeur in valeurs],
+                                                  type=types_arrow[type_colonne])
+                                    for (_, type_colonne), valeurs in zip(table.colonnes, zip(*lot))]
+                        ecrivain.write_table(pyarrow.Table.from_arrays(colonnes, schema=schema))
+                finally:
+                    ecrivain.close()
+        return chemins
+
+    @staticmethod
+    def disponible():
+        return importlib.util.find_spec('pyarrow') is not None
+
+SORTIES = {
+    'tsv': SortieTexte('tsv', '\t'),
+    'csv': SortieTexte('csv', ','),
+    'sqlite': SortieSQLite(),
+    'parquet': SortieColonnes('parquet'),
+    'arrow': SortieColonnes('arrow'),
+}